@@ -1,8 +1,12 @@
 from django.contrib import admin
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from . import inventory
 from .models import (
     Customer, Vendor, Store, Product, ProductMedia, CartItem, Order, OrderItem,
     OrderStatus, CancelledItem, WishlistItem, Promotion, Review, ClickHistory, RefundRequest,
-    Notification, SearchQuery
+    Notification, NotificationArchive, BroadcastNotification, SearchQuery, StockReservation, CheckoutKey, InventoryMovement,
+    StoreSalesDaily, Job, OutboxEvent
 )
 
 
@@ -11,7 +15,7 @@ from .models import (
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('customerID', 'firstName', 'lastName', 'email', 'phoneNumber', 'createdTime')
     search_fields = ('email', 'firstName', 'lastName')
-    readonly_fields = ('createdTime',)
+    readonly_fields = ('createdTime', 'unreadNotifications')
     list_filter = ('createdTime',)
 
 
@@ -20,7 +24,7 @@ class CustomerAdmin(admin.ModelAdmin):
 class VendorAdmin(admin.ModelAdmin):
     list_display = ('vendorID', 'vendorName', 'email', 'phoneNumber', 'createdTime')
     search_fields = ('email', 'vendorName')
-    readonly_fields = ('createdTime',)
+    readonly_fields = ('createdTime', 'unreadNotifications')
     list_filter = ('createdTime',)
 
 
@@ -43,12 +47,25 @@ class ProductMediaInline(admin.TabularInline):
 # ======================= PRODUCT ADMIN =======================
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('productID', 'productName', 'storeID', 'price', 'stockQuantity', 'availability', 'createdTime')
+    list_display = ('productID', 'productName', 'storeID', 'price', 'stockQuantity', 'reservedQuantity', 'availability', 'createdTime')
     search_fields = ('productName', 'storeID__storeName')
     list_filter = ('availability', 'createdTime')
-    readonly_fields = ('createdTime', 'updatedTime')
+    readonly_fields = ('createdTime', 'updatedTime', 'reservedQuantity')
     inlines = [ProductMediaInline]
 
+    def save_model(self, request, obj, form, change):
+        # Stock changes are recorded in the inventory ledger
+        reference = f'admin:{request.user.pk}'
+        if not change:
+            super().save_model(request, obj, form, change)
+            inventory.log_movements({obj.pk: obj.stockQuantity}, 'opening', reference)
+            return
+        fields = [name for name in form.changed_data if name != 'stockQuantity']
+        if fields:
+            obj.save(update_fields=fields + ['updatedTime'])
+        if 'stockQuantity' in form.changed_data:
+            inventory.set_stock(obj.pk, obj.stockQuantity, reference=reference)
+
 
 # ======================= PRODUCT MEDIA ADMIN =======================
 @admin.register(ProductMedia)
@@ -88,9 +105,10 @@ class OrderAdmin(admin.ModelAdmin):
 # ======================= ORDER ITEM ADMIN =======================
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ('orderItemID', 'orderID', 'productID', 'quantity', 'paidPrice')
+    list_display = ('orderItemID', 'orderID', 'productID', 'quantity', 'paidPrice', 'currentStatus')
+    list_filter = ('currentStatus',)
     search_fields = ('orderID__orderID', 'productID__productName')
-    readonly_fields = ('orderID', 'productID', 'quantity', 'paidPrice')
+    readonly_fields = ('orderID', 'productID', 'quantity', 'paidPrice', 'currentStatus', 'currentStatusAt')
 
 
 # ======================= ORDER STATUS ADMIN =======================
@@ -163,6 +181,24 @@ class NotificationAdmin(admin.ModelAdmin):
     readonly_fields = ('createdTime',)
 
 
+# ======================= BROADCAST NOTIFICATION ADMIN =======================
+@admin.register(BroadcastNotification)
+class BroadcastNotificationAdmin(admin.ModelAdmin):
+    list_display = ('broadcastID', 'notificationType', 'productID', 'promotionID', 'title', 'createdTime')
+    list_filter = ('notificationType', 'createdTime')
+    search_fields = ('title', 'message', 'productID__productName')
+    readonly_fields = ('createdTime',)
+
+
+# ======================= NOTIFICATION ARCHIVE ADMIN =======================
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('notificationID', 'notificationType', 'customerID', 'vendorID', 'title', 'createdTime', 'archivedTime')
+    list_filter = ('notificationType', 'archivedTime')
+    search_fields = ('title', 'message')
+    readonly_fields = ('createdTime', 'archivedTime')
+
+
 # ======================= SEARCH QUERY ADMIN =======================
 @admin.register(SearchQuery)
 class SearchQueryAdmin(admin.ModelAdmin):
@@ -170,3 +206,79 @@ class SearchQueryAdmin(admin.ModelAdmin):
     search_fields = ('query', 'customerID__email')
     list_filter = ('searchedAt',)
     readonly_fields = ('searchedAt',)
+
+
+# ======================= STOCK RESERVATION ADMIN =======================
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('reservationID', 'productID', 'customerID', 'quantity', 'expiresAt', 'createdTime')
+    search_fields = ('customerID__email', 'productID__productName')
+    list_filter = ('expiresAt',)
+    readonly_fields = ('productID', 'customerID', 'quantity', 'expiresAt', 'createdTime')
+
+
+# ======================= CHECKOUT KEY ADMIN =======================
+@admin.register(CheckoutKey)
+class CheckoutKeyAdmin(admin.ModelAdmin):
+    list_display = ('checkoutKeyID', 'customerID', 'key', 'orderID', 'createdTime')
+    search_fields = ('key', 'customerID__email')
+    list_filter = ('createdTime',)
+    readonly_fields = ('customerID', 'key', 'orderID', 'createdTime')
+
+
+# ======================= INVENTORY MOVEMENT ADMIN =======================
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('movementID', 'productID', 'delta', 'reason', 'reference', 'createdTime')
+    search_fields = ('productID__productName', 'reference')
+    list_filter = ('reason', 'createdTime')
+    readonly_fields = ('productID', 'delta', 'reason', 'reference', 'createdTime')
+
+
+# ======================= STORE SALES DAILY ADMIN =======================
+@admin.register(StoreSalesDaily)
+class StoreSalesDailyAdmin(admin.ModelAdmin):
+    list_display = ('storeID', 'day', 'grossAmount', 'cancelledAmount', 'refundedAmount', 'unitsSold')
+    list_filter = ('day',)
+    search_fields = ('storeID__storeName',)
+    readonly_fields = (
+        'storeID', 'day', 'grossAmount', 'cancelledAmount', 'refundedAmount',
+        'unitsSold', 'unitsCancelled', 'unitsRefunded'
+    )
+
+
+# ======================= JOB ADMIN =======================
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('jobID', 'name', 'status', 'priority', 'runAt', 'attempts', 'maxAttempts', 'lockedBy', 'finishedTime')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedupeKey', 'lastError')
+    readonly_fields = ('attempts', 'lastError', 'lockedBy', 'lockedAt', 'createdTime', 'finishedTime')
+    actions = ['retry_now']
+
+    @admin.action(description='Queue selected failed jobs to run again now')
+    def retry_now(self, request, queryset):
+        queued = skipped = 0
+        for job_id in queryset.filter(status='failed').values_list('jobID', flat=True):
+            try:
+                # Savepoint per row: a job whose dedupe key already has a
+                # queued copy (possibly one requeued just above) is skipped
+                with transaction.atomic():
+                    queued += Job.objects.filter(pk=job_id, status='failed').update(
+                        status='queued', runAt=timezone.now(), attempts=0, finishedTime=None
+                    )
+            except IntegrityError:
+                skipped += 1
+        message = f'{queued} job(s) queued again.'
+        if skipped:
+            message += f' {skipped} skipped: a job with the same dedupe key is already queued.'
+        self.message_user(request, message)
+
+
+# ======================= OUTBOX EVENT ADMIN =======================
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('eventID', 'topic', 'attempts', 'createdTime')
+    list_filter = ('topic',)
+    search_fields = ('lastError',)
+    readonly_fields = ('topic', 'payload', 'lastError', 'createdTime')
@@ -0,0 +1,277 @@
+import json
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CartItem, Product
+
+
+# ======================= PRICING =======================
+
+def active_promotion(product):
+    """Return the product's running promotion, using prefetched promotions."""
+    return next((p for p in product.promotions.all() if p.is_active()), None)
+
+
+def effective_price(product):
+    """Product price after any running promotion."""
+    promo = active_promotion(product)
+    if promo:
+        return product.price - promo.get_discount_amount(product.price)
+    return product.price
+
+
+def priced_cart_items(customer_id, item_ids=None):
+    """
+    Load a customer's cart (optionally only item_ids) with per-item prices.
+    Returns (items, total) where each item carries effective_price,
+    subtotal and subtotal_with_promo.
+    """
+    items = CartItem.objects.filter(customerID_id=customer_id).select_related(
+        'productID', 'productID__storeID'
+    ).prefetch_related('productID__promotions')
+    if item_ids is not None:
+        items = items.filter(pk__in=item_ids)
+    return _price_items(list(items))
+
+
+def _price_items(items):
+    """Attach prices to cart lines (anything with .productID and .quantity)."""
+    total = Decimal('0.00')
+    for item in items:
+        price = effective_price(item.productID)
+        item.effective_price = price
+        item.subtotal = item.productID.price * item.quantity
+        item.subtotal_with_promo = price * item.quantity
+        total += item.subtotal_with_promo
+    return items, total
+
+
+# ======================= MUTATIONS =======================
+
+def _cart_columns():
+    qn = connection.ops.quote_name
+    return {
+        'cart': qn(CartItem._meta.db_table),
+        'customer': qn(CartItem._meta.get_field('customerID').column),
+        'product': qn(CartItem._meta.get_field('productID').column),
+        'quantity': qn('quantity'),
+        'added': qn('addedTime'),
+    }
+
+
+def add_item(customer_id, product_id, quantity):
+    """
+    Add quantity of a product to the cart as a single upsert.
+    Inserts the row or increments it with quantity = quantity + n, but only
+    while the resulting cart quantity still fits in stock; the stock check
+    is part of the same statement, so concurrent clicks cannot lose updates.
+    Returns True if the cart changed, False if stock was insufficient.
+    """
+    qn = connection.ops.quote_name
+    cols = _cart_columns()
+    cart, customer_col, product_col, quantity_col = (
+        cols['cart'], cols['customer'], cols['product'], cols['quantity']
+    )
+    product = qn(Product._meta.db_table)
+    pk_col = qn(Product._meta.pk.column)
+    # Available-to-sell: on-hand stock minus checkout holds
+    available = f"({qn('stockQuantity')} - {qn('reservedQuantity')})"
+
+    sql = (
+        f'INSERT INTO {cart} ({customer_col}, {product_col}, {quantity_col}, {cols["added"]}) '
+        f'SELECT %s, {pk_col}, %s, %s FROM {product} '
+        f'WHERE {pk_col} = %s AND {available} >= %s '
+        f'ON CONFLICT ({customer_col}, {product_col}) DO UPDATE '
+        f'SET {quantity_col} = {cart}.{quantity_col} + excluded.{quantity_col} '
+        f'WHERE {cart}.{quantity_col} + excluded.{quantity_col} <= '
+        f'(SELECT {available} FROM {product} WHERE {pk_col} = excluded.{product_col})'
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [customer_id, quantity, now, product_id, quantity])
+        return cursor.rowcount == 1
+
+
+def set_quantity(customer_id, cart_item_id, quantity):
+    """
+    Set a cart line to an absolute quantity in one conditional UPDATE.
+    Returns 'updated', 'insufficient_stock' or 'not_found'.
+    """
+    updated = CartItem.objects.filter(
+        pk=cart_item_id,
+        customerID_id=customer_id,
+        productID__stockQuantity__gte=F('productID__reservedQuantity') + quantity,
+    ).update(quantity=quantity)
+    if updated:
+        return 'updated'
+    if CartItem.objects.filter(pk=cart_item_id, customerID_id=customer_id).exists():
+        return 'insufficient_stock'
+    return 'not_found'
+
+
+def remove_items(customer_id, cart_item_ids):
+    """Delete cart lines in one statement; returns the number removed."""
+    return CartItem.objects.filter(
+        customerID_id=customer_id, pk__in=cart_item_ids
+    ).delete()[0]
+
+
+def apply_batch(customer_id, updates, removals):
+    """
+    Apply many quantity changes and removals in one transaction.
+    updates maps cart item ID -> quantity (< 1 removes the line).
+    Returns a list of {'id', 'status'} results.
+    """
+    results = []
+    removals = set(removals)
+    with transaction.atomic():
+        for item_id, quantity in updates.items():
+            if quantity < 1:
+                removals.add(item_id)
+                continue
+            results.append({'id': item_id, 'status': set_quantity(customer_id, item_id, quantity)})
+        if removals:
+            remove_items(customer_id, removals)
+            results.extend({'id': item_id, 'status': 'removed'} for item_id in sorted(removals))
+    return results
+
+
+# ======================= ANONYMOUS CART =======================
+# Visitors who are not logged in keep their cart in a signed cookie
+# ({product_id: quantity}), so browsing and bots cost no database writes.
+# It is merged into CartItem when the customer logs in.
+
+ANONYMOUS_CART_COOKIE = 'anon_cart'
+ANONYMOUS_CART_SALT = 'store.cart'
+ANONYMOUS_CART_MAX_AGE = 60 * 60 * 24 * 30  # 30 days
+ANONYMOUS_CART_MAX_LINES = 50  # keeps the cookie well under 4 KB
+
+
+class AnonymousCartItem:
+    """Cookie cart line shaped like a CartItem; pk is the product ID."""
+
+    def __init__(self, product, quantity):
+        self.pk = product.productID
+        self.productID = product
+        self.quantity = quantity
+
+
+def read_anonymous_cart(request):
+    """Return the visitor's cookie cart as {product_id: quantity}."""
+    try:
+        raw = request.get_signed_cookie(
+            ANONYMOUS_CART_COOKIE, salt=ANONYMOUS_CART_SALT, max_age=ANONYMOUS_CART_MAX_AGE
+        )
+        lines = {int(pid): int(qty) for pid, qty in json.loads(raw).items()}
+    except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+        return {}
+    return {pid: qty for pid, qty in lines.items() if qty > 0}
+
+
+def write_anonymous_cart(response, lines):
+    """Store the cookie cart on the response (or clear it when empty)."""
+    if not lines:
+        response.delete_cookie(ANONYMOUS_CART_COOKIE)
+        return
+    response.set_signed_cookie(
+        ANONYMOUS_CART_COOKIE,
+        json.dumps({str(pid): qty for pid, qty in lines.items()}, separators=(',', ':')),
+        salt=ANONYMOUS_CART_SALT,
+        max_age=ANONYMOUS_CART_MAX_AGE,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def add_anonymous_item(lines, product, quantity):
+    """Add to the cookie cart in place; returns False if stock or size limits block it."""
+    new_quantity = lines.get(product.productID, 0) + quantity
+    if new_quantity > product.available_quantity():
+        return False
+    if product.productID not in lines and len(lines) >= ANONYMOUS_CART_MAX_LINES:
+        return False
+    lines[product.productID] = new_quantity
+    return True
+
+
+def apply_anonymous_batch(lines, updates, removals):
+    """Cookie-cart counterpart of apply_batch; mutates lines in place."""
+    results = []
+    stock = {
+        product.productID: product.available_quantity()
+        for product in Product.objects.filter(pk__in=updates)
+    }
+    for product_id, quantity in updates.items():
+        if quantity < 1:
+            removals = [*removals, product_id]
+        elif product_id not in lines:
+            results.append({'id': product_id, 'status': 'not_found'})
+        elif quantity > stock.get(product_id, 0):
+            results.append({'id': product_id, 'status': 'insufficient_stock'})
+        else:
+            lines[product_id] = quantity
+            results.append({'id': product_id, 'status': 'updated'})
+    for product_id in sorted(set(removals)):
+        lines.pop(product_id, None)
+        results.append({'id': product_id, 'status': 'removed'})
+    return results
+
+
+def priced_anonymous_items(lines):
+    """Price a cookie cart the same way as priced_cart_items."""
+    products = Product.objects.filter(pk__in=lines).select_related(
+        'storeID'
+    ).prefetch_related('promotions')
+    return _price_items([AnonymousCartItem(p, lines[p.productID]) for p in products])
+
+
+def merge_anonymous_cart(customer_id, lines):
+    """
+    Fold a cookie cart into the customer's CartItem rows with one multi-row
+    upsert; quantities for products already in the cart are added together.
+    Products deleted or disabled since they went into the cookie are
+    dropped, and each line is capped at available stock as in add_item.
+    Returns the number of lines merged.
+    """
+    available = {
+        product.productID: product.available_quantity()
+        for product in Product.objects.filter(pk__in=lines, availability=True)
+    }
+    lines = {
+        product_id: min(quantity, available[product_id])
+        for product_id, quantity in lines.items()
+        if available.get(product_id)
+    }
+    if not lines:
+        return 0
+    qn = connection.ops.quote_name
+    cols = _cart_columns()
+    product = qn(Product._meta.db_table)
+    pk_col = qn(Product._meta.pk.column)
+    stock = (
+        f"(SELECT {qn('stockQuantity')} - {qn('reservedQuantity')} FROM {product} "
+        f"WHERE {pk_col} = excluded.{cols['product']})"
+    )
+    existing = f'{cols["cart"]}.{cols["quantity"]}'
+    combined = f'{existing} + excluded.{cols["quantity"]}'
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(lines))
+    params = []
+    for product_id, quantity in lines.items():
+        params += [customer_id, product_id, quantity, now]
+
+    sql = (
+        f'INSERT INTO {cols["cart"]} ({cols["customer"]}, {cols["product"]}, {cols["quantity"]}, {cols["added"]}) '
+        f'VALUES {values} '
+        f'ON CONFLICT ({cols["customer"]}, {cols["product"]}) DO UPDATE '
+        # Up to available stock, never below what was already in the cart
+        f'SET {cols["quantity"]} = CASE WHEN {combined} <= {stock} THEN {combined} '
+        f'WHEN {stock} > {existing} THEN {stock} ELSE {existing} END'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+    return len(lines)
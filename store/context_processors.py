@@ -1,8 +1,10 @@
-from .models import Customer, CartItem, Notification
+from .cart import read_anonymous_cart
+from . import notifications
+from .models import Customer, CartItem
 
 
 def cart_count(request):
-    """Add cart_item_count to every template context for logged-in customers."""
+    """Add cart_item_count to every template context (cookie cart for visitors)."""
     count = 0
     if request.session.get('user_type') == 'customer' and request.session.get('customer_id'):
         try:
@@ -11,22 +13,18 @@ def cart_count(request):
             ).count()
         except Exception:
             pass
+    elif not request.session.get('user_type'):
+        count = len(read_anonymous_cart(request))
     return {'cart_item_count': count}
 
 
 def unread_notification_count(request):
-    """Add unread_notif_count to every template context."""
+    """Add unread_notif_count (the maintained counter) to every template context."""
     count = 0
-    user_type = request.session.get('user_type')
     try:
-        if user_type == 'customer' and request.session.get('customer_id'):
-            count = Notification.objects.filter(
-                customerID_id=request.session['customer_id'], isRead=False
-            ).count()
-        elif user_type == 'vendor' and request.session.get('vendor_id'):
-            count = Notification.objects.filter(
-                vendorID_id=request.session['vendor_id'], isRead=False
-            ).count()
+        key = notifications.session_recipient(request)
+        if key is not None:
+            count = notifications.unread_count(key)
     except Exception:
         pass
     return {'unread_notif_count': count}
@@ -0,0 +1,137 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+from .models import OrderItem, RefundRequest, StoreSalesDaily
+
+
+# ======================= VENDOR EXPORTS =======================
+# Exports are generators of rows read with QuerySet.iterator(), so a
+# StreamingHttpResponse can send them while they are being read: the
+# header goes out before the query runs and only one chunk of rows is
+# ever held in memory, however many orders a store has.
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (column name, field lookup or expression); None columns are filled in
+# by order_rows/sales_rows. Money arithmetic is done in Python because
+# SQLite returns computed decimals as unrounded floats.
+ORDER_COLUMNS = [
+    ('order_id', 'orderID'),
+    ('order_date', 'orderID__orderDate'),
+    ('customer_name', Concat('orderID__customerID__firstName', Value(' '), 'orderID__customerID__lastName')),
+    ('customer_email', 'orderID__customerID__email'),
+    ('shipping_address', 'orderID__shippingAddress'),
+    ('order_item_id', 'orderItemID'),
+    ('product_id', 'productID'),
+    ('product_name', 'productID__productName'),
+    ('quantity', 'quantity'),
+    ('paid_price', 'paidPrice'),
+    ('subtotal', None),
+    ('status', 'currentStatus'),
+    ('status_date', 'currentStatusAt'),
+    ('refund_status', None),
+    ('refund_requested', None),
+    ('refund_responded', None),
+]
+
+SALES_COLUMNS = [
+    ('day', 'day'),
+    ('gross', 'grossAmount'),
+    ('cancelled', 'cancelledAmount'),
+    ('refunded', 'refundedAmount'),
+    ('net', None),
+    ('units_sold', 'unitsSold'),
+    ('units_cancelled', 'unitsCancelled'),
+    ('units_refunded', 'unitsRefunded'),
+]
+
+
+def _rows(queryset, columns, chunk_size, **extra):
+    """
+    Stream the columns from queryset as dicts keyed by column name.
+    Field lookups are selected as-is, expressions and extra under the
+    column name; None columns without an extra start out as None.
+    """
+    keys = [(name, expression if isinstance(expression, str) else name) for name, expression in columns]
+    fields = [expression for _, expression in columns if isinstance(expression, str)]
+    expressions = {name: expression for name, expression in columns
+                   if expression is not None and not isinstance(expression, str)}
+    for row in queryset.values(*fields, **expressions, **extra).iterator(chunk_size=chunk_size):
+        yield {name: row.get(key) for name, key in keys}
+
+
+def order_rows(store, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    One dict per order item of the store's products, oldest first, with the
+    item's current status and its latest refund request. start/end are
+    datetimes bounding the order date (end exclusive).
+    """
+    items = OrderItem.objects.filter(productID__storeID=store)
+    if start:
+        items = items.filter(orderID__orderDate__gte=start)
+    if end:
+        items = items.filter(orderID__orderDate__lt=end)
+    latest_refund = RefundRequest.objects.filter(
+        orderItemID=OuterRef('pk')
+    ).order_by('-requestDate', '-pk')
+
+    items = items.order_by('orderID__orderDate', 'orderID', 'orderItemID')
+    for row in _rows(
+        items, ORDER_COLUMNS, chunk_size,
+        refund_status=Subquery(latest_refund.values('status')[:1]),
+        refund_requested=Subquery(latest_refund.values('requestDate')[:1]),
+        refund_responded=Subquery(latest_refund.values('responseDate')[:1]),
+    ):
+        row['subtotal'] = row['paid_price'] * row['quantity']
+        yield row
+
+
+def sales_rows(store, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """One dict per day from the store's sales ledger; start/end are dates (end inclusive)."""
+    days = StoreSalesDaily.objects.filter(storeID=store)
+    if start:
+        days = days.filter(day__gte=start)
+    if end:
+        days = days.filter(day__lte=end)
+    for row in _rows(days.order_by('day'), SALES_COLUMNS, chunk_size):
+        row['net'] = row['gross'] - row['cancelled'] - row['refunded']
+        yield row
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    """A value as written to CSV; text that would start a formula is quoted with '."""
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(columns, rows):
+    """Yield a CSV header line, then one line per row dict."""
+    names = [name for name, _ in columns]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow([_csv_cell(row[name]) for name in names])
+
+
+def stream_jsonl(columns, rows):
+    """Yield one JSON object per line."""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
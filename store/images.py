@@ -0,0 +1,267 @@
+import logging
+import multiprocessing
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from . import imaging, jobs
+from .imaging import VARIANT_FORMATS
+from .middleware import invalidate_identity
+from .models import ProductMedia, Review, StoreMedia, Vendor
+
+
+logger = logging.getLogger(__name__)
+
+DECODE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+# ======================= IMAGE VARIANTS =======================
+# Uploaded product, shop and profile images get resized copies in WebP
+# and JPEG at IMAGE_VARIANT_WIDTHS, stored next to the original under
+# variants/ and recorded on the row as {format: {width: storage name}}.
+# Templates emit them as srcset with {% responsive_image %}, so a grid
+# card downloads a few tens of KB instead of the full-size original.
+# Rows without variants (not processed yet, or undecodable) fall back to
+# the original. `manage.py build_image_variants` fills in existing rows.
+
+# model: (image field, variants field)
+IMAGE_FIELDS = {
+    ProductMedia: ('mediaURL', 'variants'),
+    StoreMedia: ('image', 'variants'),
+    Vendor: ('profileImage', 'profileImageVariants'),
+}
+
+REVIEW_PHOTO_SIZE = (800, 800)  # max width × height; aspect ratio preserved
+
+
+def variant_widths():
+    return getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 1024))
+
+
+def save_variants(original_name, encoded):
+    """Store encoded variants beside original_name; returns {format: {"width": storage name}}."""
+    directory, filename = posixpath.split(original_name)
+    stem = filename.rsplit('.', 1)[0]
+    variants = {}
+    for name, by_width in encoded.items():
+        extension = VARIANT_FORMATS[name][1]
+        variants[name] = {
+            str(width): default_storage.save(
+                posixpath.join(directory, 'variants', f'{stem}-{width}.{extension}'), ContentFile(data)
+            )
+            for width, data in by_width.items()
+        }
+    return variants
+
+
+def delete_variants(variants):
+    """Remove variant files from storage."""
+    for by_width in (variants or {}).values():
+        for name in by_width.values():
+            default_storage.delete(name)
+
+
+def build_variants(instance):
+    """
+    Generate and record variants for a ProductMedia, StoreMedia or Vendor
+    row right away, replacing any it had. Returns the variants, or None if
+    the image is missing, cannot be decoded or changed meanwhile.
+    """
+    image_field, _ = IMAGE_FIELDS[type(instance)]
+    image = getattr(instance, image_field)
+    if not image:
+        return None
+    try:
+        encoded = imaging.render_variants(_read(image), variant_widths())
+    except DECODE_ERRORS as e:
+        logger.warning('Could not build variants for %s: %s', image.name, e)
+        return None
+    return record_variants(instance, save_variants(image.name, encoded))
+
+
+def record_variants(instance, variants):
+    """
+    Save variants on the row (one narrow UPDATE) and delete the ones they
+    replace. The UPDATE only applies while the row still has the image and
+    variants instance was read with; if another writer (the pool or the
+    fallback job) got there first, the new files are deleted instead and
+    None is returned.
+    """
+    image_field, variants_field = IMAGE_FIELDS[type(instance)]
+    old = getattr(instance, variants_field)
+    if not type(instance).objects.filter(
+        pk=instance.pk, **{image_field: getattr(instance, image_field).name, variants_field: old}
+    ).update(**{variants_field: variants}):
+        delete_variants(variants)
+        return None
+    setattr(instance, variants_field, variants)
+    delete_variants(old)
+    if isinstance(instance, Vendor):
+        invalidate_identity('vendor', instance.pk)
+    return variants
+
+
+def srcset(variants, image_format):
+    """The "url 320w, url 640w, ..." srcset of one format's variants ('' if none)."""
+    by_width = (variants or {}).get(image_format) or {}
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted(by_width.items(), key=lambda item: int(item[0]))
+    )
+
+
+# ======================= REVIEW PHOTOS =======================
+# A review is saved with the photo as uploaded and photoPending set; the
+# page shows a placeholder until the resized JPEG replaces it.
+
+def _store_review_photo(review, jpeg):
+    """Swap a pending review's original photo for the resized JPEG."""
+    original = review.photo.name
+    name = default_storage.save(
+        posixpath.join('review_photos', posixpath.basename(original).rsplit('.', 1)[0] + '.jpg'),
+        ContentFile(jpeg)
+    )
+    if Review.objects.filter(pk=review.pk, photo=original, photoPending=True).update(photo=name, photoPending=False):
+        default_storage.delete(original)
+    else:
+        default_storage.delete(name)  # review deleted or photo replaced meanwhile
+
+
+def _drop_review_photo(review):
+    """Remove a pending photo that cannot be decoded from its review."""
+    original = review.photo.name
+    if Review.objects.filter(pk=review.pk, photo=original, photoPending=True).update(photo=None, photoPending=False):
+        default_storage.delete(original)
+
+
+# ======================= PROCESSING =======================
+# Decoding and resizing run in one process pool shared by every upload
+# (IMAGE_POOL_WORKERS spawned processes), so CPU-heavy Pillow work never
+# holds a request thread or the serving process's GIL. Uploads are saved
+# as-is, and process_later() hands the row to the pool once the upload
+# commits. The pool takes at most IMAGE_POOL_MAX_PENDING images at a
+# time. Past that, or if this process dies first, the `process_image`
+# job queued with the upload does the work after IMAGE_JOB_DELAY
+# seconds. Whichever finishes first wins; the other finds nothing left.
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(getattr(settings, 'IMAGE_POOL_MAX_PENDING', 8))
+
+
+def pool():
+    """The shared image ProcessPoolExecutor, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                getattr(settings, 'IMAGE_POOL_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _read(field_file):
+    with field_file.open('rb'):
+        return field_file.read()
+
+
+def _pending(instance):
+    """Storage name of the image still waiting to be processed, or None."""
+    if isinstance(instance, Review):
+        return instance.photo.name if instance.photo and instance.photoPending else None
+    image_field, variants_field = IMAGE_FIELDS[type(instance)]
+    image = getattr(instance, image_field)
+    return image.name if image and not getattr(instance, variants_field) else None
+
+
+def _render_call(instance):
+    """(function, args) producing the instance's output; safe to send to the pool."""
+    if isinstance(instance, Review):
+        return imaging.render_review_photo, (_read(instance.photo), REVIEW_PHOTO_SIZE)
+    image_field, _ = IMAGE_FIELDS[type(instance)]
+    return imaging.render_variants, (_read(getattr(instance, image_field)), variant_widths())
+
+
+def _record(instance, source, result):
+    """Save a render result, unless the image changed since it was read."""
+    if _pending(instance) != source:
+        return
+    if isinstance(instance, Review):
+        _store_review_photo(instance, result)
+    else:
+        record_variants(instance, save_variants(source, result))
+
+
+def process_later(instance):
+    """
+    Schedule the image work for a just-saved ProductMedia, StoreMedia,
+    Vendor (profile image) or Review (pending photo). Call in the upload's
+    transaction: the fallback job is written with it, and the pool gets
+    the row once it commits.
+    """
+    label = instance._meta.label_lower
+    jobs.enqueue(
+        'process_image', {'model': label, 'pk': instance.pk},
+        delay=getattr(settings, 'IMAGE_JOB_DELAY', 60), dedupe_key=f'image:{label}:{instance.pk}'
+    )
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: _submit(model, pk))
+
+
+def _submit(model, pk):
+    if not _slots.acquire(blocking=False):
+        return  # pool is full; the queued job takes it
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        source = instance and _pending(instance)
+        if not source:
+            _slots.release()
+            return
+        func, args = _render_call(instance)
+        future = pool().submit(func, *args)
+    except Exception:
+        _slots.release()
+        logger.exception('Could not hand %s #%s to the image pool', model.__name__, pk)
+        return
+    future.add_done_callback(lambda done: _finish(model, pk, source, done))
+
+
+def _finish(model, pk, source, future):
+    """Pool callback, run on the executor's thread: store the result."""
+    try:
+        result = future.result()
+        instance = model.objects.filter(pk=pk).first()
+        if instance:
+            _record(instance, source, result)
+    except Exception:
+        # Undecodable images and storage errors are left to the queued job
+        logger.warning('Image pool failed for %s #%s', model.__name__, pk, exc_info=True)
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+@jobs.task('process_image')
+def process_image(model, pk):
+    """Fallback for process_later(): render in the worker if still pending."""
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    source = instance and _pending(instance)
+    if not source:
+        return
+    func, args = _render_call(instance)
+    try:
+        result = func(*args)
+    except DECODE_ERRORS as e:
+        logger.warning('Could not process %s #%s: %s', model, pk, e)
+        if isinstance(instance, Review):
+            _drop_review_photo(instance)
+        return
+    _record(instance, source, result)
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+# ======================= PILLOW TRANSFORMS =======================
+# Pure functions from image bytes to encoded bytes. They run in the image
+# pool's spawned processes (see store.images), which never set up Django,
+# so this module must not import models, settings or storage.
+
+VARIANT_FORMATS = {
+    # format: (Pillow format, extension, save options)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _flatten(image):
+    """Copy of an RGBA image on a white background, for formats without alpha."""
+    flat = Image.new('RGB', image.size, (255, 255, 255))
+    flat.paste(image, mask=image.split()[3])
+    return flat
+
+
+def _decode(data):
+    """Open image bytes upright, as RGB or (if they have transparency) RGBA."""
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.load()
+    return image
+
+
+def render_variants(data, widths):
+    """
+    Decode image bytes and encode them at each width, never upscaling
+    (widths past the original collapse into one at its own width).
+    Returns {format: {width: bytes}}.
+    """
+    image = _decode(data)
+    targets = sorted({min(width, image.width) for width in widths})
+
+    encoded = {name: {} for name in VARIANT_FORMATS}
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for name, (pil_format, _, options) in VARIANT_FORMATS.items():
+            frame = _flatten(resized) if pil_format == 'JPEG' and resized.mode == 'RGBA' else resized
+            buf = BytesIO()
+            frame.save(buf, format=pil_format, **options)
+            encoded[name][width] = buf.getvalue()
+    return encoded
+
+
+def render_review_photo(data, size):
+    """Fit image bytes within size (width, height), aspect ratio kept; returns JPEG bytes."""
+    image = _decode(data)
+    if image.mode == 'RGBA':
+        image = _flatten(image)
+    image.thumbnail(size, Image.LANCZOS)
+    buf = BytesIO()
+    image.save(buf, format='JPEG', quality=85, optimize=True)
+    return buf.getvalue()
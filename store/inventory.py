@@ -0,0 +1,209 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryMovement, Product, StockReservation
+
+
+# ======================= RESERVATIONS =======================
+# Proceeding to checkout holds the selected quantities for
+# STOCK_RESERVATION_TTL seconds. Product.reservedQuantity caches the sum of
+# holds, so available-to-sell is simply stockQuantity - reservedQuantity.
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 900))
+
+
+def _subtract_reserved(amounts):
+    """Lower reservedQuantity by {product_id: quantity} in one statement."""
+    if not amounts:
+        return
+    Product.objects.filter(pk__in=amounts).update(
+        reservedQuantity=F('reservedQuantity') - Case(
+            *[When(pk=pid, then=Value(qty)) for pid, qty in amounts.items()]
+        )
+    )
+
+
+def _release(reservations):
+    """Delete the given (locked) hold rows and give their quantity back."""
+    amounts = defaultdict(int)
+    for reservation in reservations:
+        amounts[reservation.productID_id] += reservation.quantity
+    StockReservation.objects.filter(pk__in=[r.pk for r in reservations]).delete()
+    _subtract_reserved(amounts)
+    return amounts
+
+
+def own_holds(customer_id, product_ids):
+    """Lock and return {product_id: reservation} for a customer's holds."""
+    return {
+        r.productID_id: r
+        for r in StockReservation.objects.select_for_update().filter(
+            customerID_id=customer_id, productID_id__in=product_ids
+        )
+    }
+
+
+def reserve(customer_id, quantities):
+    """
+    Hold {product_id: quantity} for a customer, replacing any holds they
+    already had on those products. Each hold is a conditional UPDATE that
+    only succeeds while stockQuantity - reservedQuantity covers it.
+    Returns the product IDs that could not be held.
+    """
+    expires_at = timezone.now() + reservation_ttl()
+    short = []
+    with transaction.atomic():
+        _release(list(own_holds(customer_id, quantities).values()))
+
+        held = []
+        for product_id, quantity in quantities.items():
+            updated = Product.objects.filter(
+                pk=product_id,
+                stockQuantity__gte=F('reservedQuantity') + quantity
+            ).update(reservedQuantity=F('reservedQuantity') + quantity)
+            if updated:
+                held.append(StockReservation(
+                    productID_id=product_id,
+                    customerID_id=customer_id,
+                    quantity=quantity,
+                    expiresAt=expires_at
+                ))
+            else:
+                short.append(product_id)
+        StockReservation.objects.bulk_create(held)
+    return short
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Release expired holds in batches of batch_size, one short transaction
+    per batch. Rows locked by an in-flight checkout are skipped and left
+    for that checkout to convert. Returns the number of holds released.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expiresAt__lte=timezone.now())
+                .order_by('expiresAt')[:batch_size]
+            )
+            if not batch:
+                return total
+            _release(batch)
+        total += len(batch)
+
+
+# ======================= LEDGER =======================
+# Stock never changes through Product.save(). Each change is a narrow F()
+# UPDATE of stockQuantity plus InventoryMovement rows in the same
+# transaction, so stockQuantity always equals the sum of the ledger.
+
+def log_movements(deltas, reason, reference=''):
+    """Append one movement per {product_id: delta}; stock is already updated."""
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(productID_id=product_id, delta=delta, reason=reason, reference=reference)
+        for product_id, delta in deltas.items()
+        if delta
+    ])
+
+
+def change_stock(deltas, reason, reference=''):
+    """
+    Apply {product_id: delta} to stockQuantity in one UPDATE and log it.
+    Changes nothing and returns False if any product would drop below zero.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return True
+    condition = Q()
+    for product_id, delta in deltas.items():
+        condition |= Q(pk=product_id, stockQuantity__gte=-delta)
+
+    with transaction.atomic():
+        updated = Product.objects.filter(condition).update(
+            stockQuantity=F('stockQuantity') + Case(
+                *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()]
+            )
+        )
+        if updated != len(deltas):
+            transaction.set_rollback(True)
+            return False
+        log_movements(deltas, reason, reference)
+    return True
+
+
+def set_stock(product_id, quantity, reason='adjustment', reference=''):
+    """Move a product to an absolute stock level; returns the delta recorded."""
+    with transaction.atomic():
+        current = Product.objects.select_for_update().values_list(
+            'stockQuantity', flat=True
+        ).get(pk=product_id)
+        delta = quantity - current
+        change_stock({product_id: delta}, reason, reference)
+    return delta
+
+
+def compact_movements(before, batch_size=500):
+    """
+    Fold each product's movements older than before into a single
+    'compacted' movement with the same total, batch_size products per
+    transaction. Returns the number of movements removed.
+    """
+    removed = 0
+    while True:
+        with transaction.atomic():
+            old = InventoryMovement.objects.filter(createdTime__lt=before)
+            product_ids = list(
+                old.values('productID').annotate(rows=Count('pk')).filter(rows__gt=1)
+                .order_by('productID').values_list('productID', flat=True)[:batch_size]
+            )
+            if not product_ids:
+                return removed
+            old = old.filter(productID__in=product_ids)
+            totals = dict(old.values('productID').annotate(total=Sum('delta')).values_list('productID', 'total'))
+            removed += old.delete()[0]
+            InventoryMovement.objects.bulk_create([
+                InventoryMovement(
+                    productID_id=product_id,
+                    delta=total,
+                    reason='compacted',
+                    reference=f'before:{before:%Y-%m-%d}'
+                )
+                for product_id, total in totals.items()
+            ])
+
+
+def ledger_mismatches():
+    """Products whose stockQuantity differs from their ledger, annotated with ledger_total."""
+    return Product.objects.annotate(
+        ledger_total=Coalesce(Sum('inventory_movements__delta'), 0)
+    ).exclude(stockQuantity=F('ledger_total')).order_by('productID')
+
+
+def reconcile(product_id, reset_stock=False):
+    """
+    Make one product's stock and ledger agree; returns the correction.
+    By default an 'adjustment' movement is appended so the ledger matches
+    the stock, which is what customers have been buying against. With
+    reset_stock, stockQuantity is reset to the ledger total instead.
+    """
+    with transaction.atomic():
+        current = Product.objects.select_for_update().values_list(
+            'stockQuantity', flat=True
+        ).get(pk=product_id)
+        ledger_total = InventoryMovement.objects.filter(productID_id=product_id).aggregate(
+            total=Coalesce(Sum('delta'), 0)
+        )['total']
+        if not reset_stock:
+            log_movements({product_id: current - ledger_total}, 'adjustment', 'reconcile_inventory')
+            return current - ledger_total
+        Product.objects.filter(pk=product_id).update(stockQuantity=ledger_total)
+        return ledger_total - current
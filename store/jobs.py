@@ -0,0 +1,226 @@
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .inventory import release_expired_reservations
+from .notifications import deliver_pending_broadcasts
+from .outbox import relay
+from .models import Job, Promotion
+
+
+logger = logging.getLogger(__name__)
+
+
+# ======================= REGISTRY =======================
+# Jobs name a function registered with @task; the payload is passed to it
+# as keyword arguments, so it must be JSON-serialisable. Tasks given
+# `every` are periodic: the worker keeps exactly one queued copy of each
+# and queues the next run when one finishes.
+
+TASKS = {}
+PERIODIC = {}
+
+DEFAULT_PRIORITY = 100
+
+
+def task(name, every=None):
+    """Register a function as the task `name`, optionally run every `every` seconds."""
+    def register(func):
+        TASKS[name] = func
+        if every:
+            PERIODIC[name] = every
+        return func
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ======================= QUEUE =======================
+
+def enqueue(name, payload=None, priority=DEFAULT_PRIORITY, run_at=None, delay=0,
+            dedupe_key=None, max_attempts=5):
+    """
+    Queue the task `name`, to run at run_at (or `delay` seconds from now).
+    The row is written in the caller's transaction, so a job queued by a
+    request that rolls back is never run. With dedupe_key nothing is
+    queued while a job with the same key is still waiting; returns the
+    new Job, or None when it was deduplicated.
+    """
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    job = Job(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        runAt=run_at or timezone.now() + timedelta(seconds=delay),
+        dedupeKey=dedupe_key,
+        maxAttempts=max_attempts,
+    )
+    try:
+        # Savepoint, so a duplicate key doesn't break the caller's transaction
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        return None
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def claim(limit, worker=None):
+    """
+    Mark up to `limit` due jobs as running for this worker and return
+    their IDs, highest priority first. Rows another worker is claiming
+    are skipped rather than waited for.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', runAt__lte=now)
+            .order_by('priority', 'runAt', 'jobID')
+            .values_list('jobID', flat=True)[:limit]
+        )
+        Job.objects.filter(pk__in=job_ids).update(
+            status='running', lockedBy=worker or worker_name(), lockedAt=now,
+            attempts=F('attempts') + 1
+        )
+    return job_ids
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: base * 2^(attempts - 1), capped."""
+    base = _setting('JOB_RETRY_BASE_DELAY', 10)
+    delay = min(base * 2 ** (attempts - 1), _setting('JOB_RETRY_MAX_DELAY', 3600))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _finish(job, **fields):
+    """Save a running job's outcome. A retry whose dedupe key was queued again meanwhile is dropped."""
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(**fields)
+    except IntegrityError:
+        Job.objects.filter(pk=job.pk).update(
+            status='failed', finishedTime=timezone.now(),
+            lastError=fields.get('lastError', '') + '\nSuperseded by a newer queued job.'
+        )
+
+
+def _fail(job, error):
+    if job.attempts >= job.maxAttempts:
+        _finish(job, status='failed', lastError=error, finishedTime=timezone.now())
+    else:
+        _finish(
+            job, status='queued', lastError=error, lockedBy='', lockedAt=None,
+            runAt=timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        )
+
+
+def run(job_id):
+    """
+    Run one claimed job and record the outcome. Safe to call from pool
+    threads and processes: each uses its own database connection.
+    Returns the job's new status.
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id, status='running')
+    except Job.DoesNotExist:
+        return None
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task: {job.name}')
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts)
+        _fail(job, traceback.format_exc())
+        status = Job.objects.values_list('status', flat=True).get(pk=job.pk)
+    else:
+        _finish(job, status='done', lastError='', finishedTime=timezone.now())
+        status = 'done'
+    if job.name in PERIODIC:
+        schedule_periodic([job.name], delay=PERIODIC[job.name])
+    close_old_connections()
+    return status
+
+
+def schedule_periodic(names=None, delay=0):
+    """Queue a run of each periodic task that has none queued or running."""
+    names = list(names or PERIODIC)
+    pending = set(
+        Job.objects.filter(name__in=names, status__in=['queued', 'running']).values_list('name', flat=True)
+    )
+    for name in names:
+        if name not in pending:
+            enqueue(name, delay=delay, dedupe_key=f'periodic:{name}')
+
+
+def requeue_stale():
+    """
+    Hand back jobs left running by a worker that died, once they have been
+    locked for JOB_LOCK_TIMEOUT seconds. Counts as a failed attempt.
+    Returns the number of jobs requeued or failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=_setting('JOB_LOCK_TIMEOUT', 600))
+    stale = list(Job.objects.filter(status='running', lockedAt__lt=cutoff))
+    for job in stale:
+        _fail(job, f'Worker {job.lockedBy} stopped responding')
+    return len(stale)
+
+
+def purge(before, batch_size=1000):
+    """Delete finished jobs older than before, batch_size per statement. Returns the number deleted."""
+    deleted = 0
+    while True:
+        job_ids = list(
+            Job.objects.filter(status__in=['done', 'failed'], finishedTime__lt=before)
+            .values_list('jobID', flat=True)[:batch_size]
+        )
+        if not job_ids:
+            return deleted
+        deleted += Job.objects.filter(pk__in=job_ids).delete()[0]
+
+
+# ======================= TASKS =======================
+
+@task('expire_promotions', every=60)
+def expire_promotions():
+    """Mark promotions whose endDate has passed as expired."""
+    Promotion.objects.filter(status='active', endDate__lt=timezone.now()).update(status='expired')
+
+
+@task('release_reservations', every=60)
+def release_reservations():
+    release_expired_reservations()
+
+
+@task('relay_outbox', every=10)
+def relay_outbox():
+    relay()
+
+
+@task('deliver_broadcasts', every=30)
+def deliver_broadcasts():
+    deliver_pending_broadcasts()
+
+
+@task('purge_jobs', every=3600)
+def purge_jobs():
+    purge(timezone.now() - timedelta(days=_setting('JOB_RETENTION_DAYS', 7)))
@@ -0,0 +1,28 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.notifications import archive_read
+
+
+class Command(BaseCommand):
+    help = 'Move old read notifications into the archive table, optionally on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=90,
+                            help='Only archive read notifications older than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Notifications moved per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds; 0 runs once and exits')
+
+    def handle(self, *args, **options):
+        while True:
+            before = timezone.now() - timedelta(days=options['older_than_days'])
+            moved = archive_read(before, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Archived {moved} notifications'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
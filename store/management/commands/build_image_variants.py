@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from store.images import IMAGE_FIELDS, build_variants
+from store.models import ProductMedia, StoreMedia, Vendor
+
+
+MODELS = {'product': ProductMedia, 'store': StoreMedia, 'vendor': Vendor}
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image variants for product, shop and profile images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help='Only these image kinds (repeatable); default all')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Rows loaded per query')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants for rows that already have them')
+
+    def handle(self, *args, **options):
+        for kind in options['model'] or sorted(MODELS):
+            model = MODELS[kind]
+            image_field, variants_field = IMAGE_FIELDS[model]
+            rows = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            if not options['force']:
+                rows = rows.filter(**{variants_field: {}})
+
+            built = failed = 0
+            last_pk = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+                if not batch:
+                    break
+                for instance in batch:
+                    if build_variants(instance) is None:
+                        failed += 1
+                    else:
+                        built += 1
+                last_pk = batch[-1].pk
+            self.stdout.write(self.style.SUCCESS(f'{kind}: built {built}, failed {failed}'))
@@ -0,0 +1,28 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.inventory import compact_movements
+
+
+class Command(BaseCommand):
+    help = 'Fold old inventory ledger movements into one row per product, optionally on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=90,
+                            help='Only compact movements older than this many days')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Products compacted per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds; 0 runs once and exits')
+
+    def handle(self, *args, **options):
+        while True:
+            before = timezone.now() - timedelta(days=options['older_than_days'])
+            removed = compact_movements(before, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Compacted {removed} inventory movements'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+DB_BACKED_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete expired session rows in small batches, optionally on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows deleted per statement (keeps SQLite write locks short)')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds; 0 runs once and exits')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in DB_BACKED_ENGINES:
+            self.stdout.write(f'{settings.SESSION_ENGINE} expires sessions itself; nothing to purge.')
+            return
+
+        while True:
+            deleted = self.purge(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired sessions'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def purge(self, batch_size):
+        """Delete expired sessions batch by batch; return the number removed."""
+        total = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=timezone.now())
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return total
+            total += Session.objects.filter(session_key__in=keys).delete()[0]
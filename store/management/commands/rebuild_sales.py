@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.sales import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-store daily sales roll-up from orders and refunds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help='Only rebuild this store ID (repeatable)')
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['stores'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily sales rows'))
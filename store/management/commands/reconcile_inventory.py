@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from store.inventory import ledger_mismatches, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Compare product stock with the inventory ledger and optionally repair differences'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Append adjustment movements so the ledger matches stock')
+        parser.add_argument('--reset-stock', action='store_true',
+                            help='With --fix, reset stockQuantity to the ledger total instead')
+
+    def handle(self, *args, **options):
+        mismatched = 0
+        for product in ledger_mismatches():
+            mismatched += 1
+            self.stdout.write(
+                f'#{product.productID} {product.productName}: '
+                f'stock {product.stockQuantity}, ledger {product.ledger_total}'
+            )
+            if options['fix']:
+                correction = reconcile(product.productID, reset_stock=options['reset_stock'])
+                self.stdout.write(f'  corrected by {correction:+d}')
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Stock matches the inventory ledger'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Reconciled {mismatched} products'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{mismatched} products differ; run with --fix to repair'))
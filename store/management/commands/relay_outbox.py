@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.outbox import RELAY_BATCH_SIZE, relay
+
+
+class Command(BaseCommand):
+    help = 'Dispatch pending outbox events (notifications) in batches, optionally on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=RELAY_BATCH_SIZE,
+                            help='Events dispatched per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every N seconds; 0 runs once and exits')
+
+    def handle(self, *args, **options):
+        while True:
+            dispatched = relay(options['batch_size'])
+            if dispatched or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Dispatched {dispatched} outbox events'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
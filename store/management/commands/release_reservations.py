@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release expired checkout stock holds in batches, optionally on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Holds released per transaction')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds; 0 runs once and exits')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
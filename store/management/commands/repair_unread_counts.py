@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from store.notifications import RECIPIENT_MODELS, repair_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer and vendor unread-notification counters from their notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Recipients updated per transaction')
+
+    def handle(self, *args, **options):
+        total = 0
+        for kind in RECIPIENT_MODELS:
+            fixed = repair_unread_counts(kind, batch_size=options['batch_size'])
+            total += fixed
+            self.stdout.write(f'{kind}: {fixed} counter(s) corrected')
+        if total:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {total} unread counters'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All unread counters are correct'))
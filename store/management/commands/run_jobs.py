@@ -0,0 +1,70 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (see store.jobs) on a pool of threads or processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Jobs running at the same time')
+        parser.add_argument('--processes', action='store_true',
+                            help='Use forked worker processes instead of threads')
+        parser.add_argument('--batch-size', type=int, default=0,
+                            help='Most jobs claimed at once; defaults to --concurrency')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or options['concurrency']
+        if options['processes']:
+            pool = ProcessPoolExecutor(options['concurrency'], mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ThreadPoolExecutor(options['concurrency'])
+        worker = jobs.worker_name()
+        self.stdout.write(
+            f"Worker {worker}: {options['concurrency']} "
+            f"{'processes' if options['processes'] else 'threads'}, "
+            f"{len(jobs.TASKS)} tasks registered"
+        )
+
+        counts = {}
+        running = set()
+        with pool:
+            while True:
+                # Claim only as many jobs as there are free slots, so one slow
+                # job never holds back the rest
+                limit = min(batch_size, options['concurrency'] - len(running))
+                job_ids = []
+                if limit > 0:
+                    jobs.schedule_periodic()
+                    jobs.requeue_stale()
+                    job_ids = jobs.claim(limit, worker)
+                    if job_ids and options['processes']:
+                        # Forked children must not share the parent's database connection
+                        connections.close_all()
+                    running.update(pool.submit(jobs.run, job_id) for job_id in job_ids)
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                if job_ids and len(job_ids) == limit and len(running) < options['concurrency']:
+                    continue  # more may be due right away
+                # Wait for a free slot, or at most --interval for newly due jobs
+                timeout = None if len(running) >= options['concurrency'] else options['interval']
+                done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    status = future.result() or 'skipped'
+                    counts[status] = counts.get(status, 0) + 1
+        self.stdout.write(self.style.SUCCESS(
+            'Ran jobs: ' + (', '.join(f'{status} {count}' for status, count in sorted(counts.items())) or 'none')
+        ))
@@ -4,6 +4,7 @@ from datetime import timedelta
 from decimal import Decimal
 import random
 
+from store.inventory import log_movements
 from store.models import (
     Customer, Vendor, Store, Product, ProductMedia, Promotion, Review
 )
@@ -98,6 +99,7 @@ class Command(BaseCommand):
                 }
             )
             if created:
+                log_movements({product.productID: stock}, 'opening', 'seed_data')
                 self.stdout.write(self.style.SUCCESS(f'Created product: {name}'))
             products.append(product)
 
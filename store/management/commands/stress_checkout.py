@@ -0,0 +1,255 @@
+import multiprocessing
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from http.cookiejar import CookieJar
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Sum
+from django.test import Client
+
+from store.inventory import log_movements
+from store.models import (
+    CartItem, Customer, InventoryMovement, OrderItem, Product, StockReservation, Store, Vendor
+)
+
+
+STRESS_DOMAIN = 'stress.example.com'
+STRESS_PASSWORD = 'stresspass123'
+LOCK_ERROR_HINTS = ('locked', 'deadlock', 'could not serialize', 'lock timeout')
+
+
+# ======================= BUYERS =======================
+# One buyer = add to cart, open checkout (reserves stock), place the order.
+# Buyers run in worker threads or forked processes and only talk to the
+# site through HTTP-shaped calls, either Django's test client or a live
+# server, so the whole request stack (middleware, sessions) is exercised.
+
+class TestClientBuyer:
+    """Drives the site in-process through django.test.Client."""
+
+    def __init__(self, base_url, customer_id):
+        self.client = Client()
+        session = self.client.session
+        session['customer_id'] = customer_id
+        session['user_type'] = 'customer'
+        session.save()
+
+    def get(self, path, params=None):
+        response = self.client.get(path, params or {})
+        return response.status_code, response.get('Location', '')
+
+    def post(self, path, data):
+        response = self.client.post(path, data)
+        return response.status_code, response.get('Location', '')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class LiveBuyer:
+    """Drives a running server over HTTP, logging in with a real session."""
+
+    def __init__(self, base_url, customer_id):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect
+        )
+        email = Customer.objects.values_list('email', flat=True).get(pk=customer_id)
+        self.get('/customer/login/')
+        self.post('/customer/login/', {'email': email, 'password': STRESS_PASSWORD})
+
+    def _csrf_token(self):
+        return next((c.value for c in self.cookies if c.name == 'csrftoken'), '')
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.headers.get('Location', '')
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location', '')
+
+    def get(self, path, params=None):
+        query = f'?{urllib.parse.urlencode(params, doseq=True)}' if params else ''
+        return self._open(urllib.request.Request(f'{self.base_url}{path}{query}'))
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': self._csrf_token()}, doseq=True)
+        request = urllib.request.Request(
+            f'{self.base_url}{path}', data=body.encode(), method='POST',
+            headers={'Referer': f'{self.base_url}{path}'}
+        )
+        return self._open(request)
+
+
+def run_buyer(job):
+    """Run one checkout; returns (outcome, latency in seconds)."""
+    live_url, customer_id, product_id, quantity = job
+    try:
+        buyer = (LiveBuyer if live_url else TestClientBuyer)(live_url, customer_id)
+        start = time.perf_counter()
+        buyer.post(f'/cart/add/{product_id}/', {'quantity': quantity})
+        item_ids = list(CartItem.objects.filter(
+            customerID_id=customer_id, productID_id=product_id
+        ).values_list('pk', flat=True))
+        if not item_ids:
+            return 'sold_out', time.perf_counter() - start
+
+        status, location = buyer.get('/checkout/', {'items': item_ids})
+        if status != 200:
+            return ('sold_out' if status == 302 else 'error'), time.perf_counter() - start
+
+        status, location = buyer.post('/checkout/', {
+            'items': item_ids,
+            'shipping_address': '1 Stress Test Lane',
+            'idempotency_key': f'stress-{customer_id}',
+        })
+        latency = time.perf_counter() - start
+        if status == 302 and '/orders/' in location:
+            return 'ordered', latency
+        if status == 302:
+            return 'sold_out', latency
+        return 'error', latency
+    except OperationalError as e:
+        message = str(e).lower()
+        return ('lock_error' if any(hint in message for hint in LOCK_ERROR_HINTS) else 'error'), 0.0
+    finally:
+        connections.close_all()
+
+
+# ======================= COMMAND =======================
+
+class Command(BaseCommand):
+    help = (
+        'Stress test checkout: many buyers race for one product with limited stock, '
+        'then stock integrity is checked. Works on SQLite and PostgreSQL '
+        '(set VINYL_DB_ENGINE=postgresql).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50,
+                            help='Number of customers trying to check out')
+        parser.add_argument('--stock', type=int, default=20,
+                            help='Units of the contested product')
+        parser.add_argument('--quantity', type=int, default=1,
+                            help='Units each buyer tries to buy')
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='Buyers running at the same time')
+        parser.add_argument('--processes', action='store_true',
+                            help='Use forked worker processes instead of threads')
+        parser.add_argument('--live-url',
+                            help='Drive a running server (e.g. http://127.0.0.1:8000) sharing this database '
+                                 'instead of the in-process test client')
+        parser.add_argument('--keep', action='store_true',
+                            help='Leave the stress customers, store and orders in place')
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        product, customer_ids = self.seed(options['buyers'], options['stock'])
+        jobs = [
+            (options['live_url'], customer_id, product.productID, options['quantity'])
+            for customer_id in customer_ids
+        ]
+
+        self.stdout.write(
+            f"{len(jobs)} buyers x {options['quantity']} unit(s) for {options['stock']} in stock, "
+            f"{options['concurrency']} at a time ({connection.vendor}, "
+            f"{'processes' if options['processes'] else 'threads'}, "
+            f"{options['live_url'] or 'test client'})"
+        )
+        if options['processes']:
+            # Forked children must not share the parent's database connection
+            connections.close_all()
+            pool = ProcessPoolExecutor(options['concurrency'], mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ThreadPoolExecutor(options['concurrency'])
+
+        start = time.perf_counter()
+        with pool:
+            results = list(pool.map(run_buyer, jobs))
+        elapsed = time.perf_counter() - start
+
+        self.report(results, elapsed)
+        violations = self.check_invariants(product.productID, options['stock'])
+        if not options['keep']:
+            self.cleanup()
+        if violations:
+            raise CommandError(f'{len(violations)} invariant violation(s)')
+        self.stdout.write(self.style.SUCCESS('All stock invariants hold'))
+
+    def seed(self, buyers, stock):
+        """Create a vendor, one contested product and the buying customers."""
+        password = make_password(STRESS_PASSWORD)
+        vendor = Vendor.objects.create(vendorName='Stress Test Vendor', email=f'vendor@{STRESS_DOMAIN}', password=password)
+        store = Store.objects.create(vendorID=vendor, storeName='Stress Test Records')
+        product = Product.objects.create(
+            storeID=store,
+            productName='Stress Test Pressing',
+            description='Limited pressing used by manage.py stress_checkout.',
+            price=Decimal('25.00'),
+            stockQuantity=stock,
+        )
+        log_movements({product.productID: stock}, 'opening', 'stress_checkout')
+        Customer.objects.bulk_create([
+            Customer(firstName='Buyer', lastName=str(i), email=f'buyer{i}@{STRESS_DOMAIN}', password=password)
+            for i in range(buyers)
+        ], batch_size=500)
+        customer_ids = list(
+            Customer.objects.filter(email__endswith=f'@{STRESS_DOMAIN}')
+            .order_by('customerID').values_list('customerID', flat=True)
+        )
+        return product, customer_ids
+
+    def cleanup(self):
+        # Customers first: their order items protect the product from deletion
+        Customer.objects.filter(email__endswith=f'@{STRESS_DOMAIN}').delete()
+        Vendor.objects.filter(email__endswith=f'@{STRESS_DOMAIN}').delete()
+
+    def report(self, results, elapsed):
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(latency for outcome, latency in results if outcome in ('ordered', 'sold_out'))
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))] * 1000
+
+        self.stdout.write(f'Wall time:   {elapsed:.2f}s')
+        self.stdout.write(f'Throughput:  {len(results) / elapsed:.1f} checkouts/s '
+                          f"({outcomes.get('ordered', 0) / elapsed:.1f} orders/s)")
+        self.stdout.write(f'Latency:     p50 {percentile(50):.0f} ms, p99 {percentile(99):.0f} ms')
+        self.stdout.write('Outcomes:    ' + ', '.join(f'{name} {count}' for name, count in sorted(outcomes.items())))
+        if outcomes.get('lock_error'):
+            self.stdout.write(self.style.WARNING(f"Lock errors: {outcomes['lock_error']}"))
+
+    def check_invariants(self, product_id, initial_stock):
+        """Return a list of broken stock invariants (empty when all hold)."""
+        product = Product.objects.get(pk=product_id)
+        sold = OrderItem.objects.filter(productID_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+        held = StockReservation.objects.filter(productID_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+        ledger = InventoryMovement.objects.filter(productID_id=product_id).aggregate(total=Sum('delta'))['total'] or 0
+
+        checks = [
+            (product.stockQuantity >= 0, f'negative stock: {product.stockQuantity}'),
+            (sold <= initial_stock, f'oversold: {sold} units sold from {initial_stock}'),
+            (product.stockQuantity + sold == initial_stock,
+             f'lost update: stock {product.stockQuantity} + sold {sold} != {initial_stock}'),
+            (product.reservedQuantity == held,
+             f'reservedQuantity {product.reservedQuantity} != active holds {held}'),
+            (ledger == product.stockQuantity, f'ledger total {ledger} != stock {product.stockQuantity}'),
+        ]
+        self.stdout.write(f'Sold {sold} of {initial_stock}; {product.stockQuantity} left, {held} still held')
+        violations = [message for ok, message in checks if not ok]
+        for message in violations:
+            self.stdout.write(self.style.ERROR(f'VIOLATION: {message}'))
+        return violations
@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import Customer, Vendor
+
+
+# ======================= SESSION MIDDLEWARE =======================
+
+SESSION_REFRESHED_KEY = '_refreshed_at'
+
+
+class SessionExpiryRefreshMiddleware:
+    """
+    Extends a session's expiry only when it is close to running out.
+    Replaces SESSION_SAVE_EVERY_REQUEST, which rewrote the session row on
+    every request (including notification polling).
+    Must be listed after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(
+            settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 4
+        )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, 'session', None)
+        if session is None or session.is_empty():
+            return response
+
+        now = int(time.time())
+        refreshed_at = session.get(SESSION_REFRESHED_KEY, 0)
+        remaining = refreshed_at + session.get_expiry_age() - now
+        if session.modified or remaining < self.threshold:
+            # Touching the session marks it modified, so SessionMiddleware
+            # saves it with a fresh expiry and re-sends the cookie. If the
+            # view already modified it, the stamp rides along for free.
+            session[SESSION_REFRESHED_KEY] = now
+        return response
+
+
+# ======================= IDENTITY MIDDLEWARE =======================
+
+IDENTITY_CACHE_PREFIX = 'store:identity'
+
+
+def _identity_version(kind, pk):
+    """Return the current cache version for a customer/vendor row."""
+    key = f'{IDENTITY_CACHE_PREFIX}:{kind}:{pk}:version'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_identity(kind, pk):
+    """
+    Drop cached copies of a customer/vendor after their profile changes.
+    Only reaches other server processes through a shared cache, which is
+    why IDENTITY_CACHE_TIMEOUT stays 0 with the per-process default.
+    """
+    cache.set(f'{IDENTITY_CACHE_PREFIX}:{kind}:{pk}:version', time.time_ns(), None)
+
+
+def _load_identity(kind, pk, queryset):
+    """Fetch one row, going through the cache when IDENTITY_CACHE_TIMEOUT is set."""
+    timeout = getattr(settings, 'IDENTITY_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return queryset.get(pk=pk)
+    key = f'{IDENTITY_CACHE_PREFIX}:{kind}:{pk}:{_identity_version(kind, pk)}'
+    obj = cache.get(key)
+    if obj is None:
+        obj = queryset.get(pk=pk)
+        cache.set(key, obj, timeout)
+    return obj
+
+
+def load_customer(customer_id):
+    return _load_identity('customer', customer_id, Customer.objects.all())
+
+
+def load_vendor(vendor_id):
+    return _load_identity('vendor', vendor_id, Vendor.objects.select_related('store'))
+
+
+class IdentityMiddleware:
+    """
+    Attaches the logged-in customer/vendor to the request.
+    request.customer_id / request.vendor_id are the raw session IDs (or None).
+    request.customer, request.vendor and request.store are lazy: the row is
+    loaded on first use, at most once per request, and raises DoesNotExist
+    if it has since been deleted. Must be listed after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.customer_id = customer_id = request.session.get('customer_id')
+        request.vendor_id = vendor_id = request.session.get('vendor_id')
+        request.customer = SimpleLazyObject(lambda: load_customer(customer_id)) if customer_id else None
+        if vendor_id:
+            request.vendor = SimpleLazyObject(lambda: load_vendor(vendor_id))
+            request.store = SimpleLazyObject(lambda: request.vendor.store)
+        else:
+            request.vendor = request.store = None
+        return self.get_response(request)
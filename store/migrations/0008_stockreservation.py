@@ -0,0 +1,56 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:54
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_searchquery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="reservedQuantity",
+            field=models.IntegerField(
+                default=0, validators=[django.core.validators.MinValueValidator(0)]
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                ("reservationID", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "quantity",
+                    models.IntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)]
+                    ),
+                ),
+                ("expiresAt", models.DateTimeField(db_index=True)),
+                ("createdTime", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customerID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="store.customer",
+                    ),
+                ),
+                (
+                    "productID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "stock_reservation",
+                "unique_together": {("customerID", "productID")},
+            },
+        ),
+    ]
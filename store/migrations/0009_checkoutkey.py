@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_stockreservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CheckoutKey",
+            fields=[
+                ("checkoutKeyID", models.AutoField(primary_key=True, serialize=False)),
+                ("key", models.CharField(max_length=64)),
+                ("createdTime", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customerID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkout_keys",
+                        to="store.customer",
+                    ),
+                ),
+                (
+                    "orderID",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="checkout_keys",
+                        to="store.order",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "checkout_key",
+                "unique_together": {("customerID", "key")},
+            },
+        ),
+    ]
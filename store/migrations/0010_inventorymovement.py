@@ -0,0 +1,74 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    """Give every existing product an opening movement equal to its stock."""
+    Product = apps.get_model("store", "Product")
+    InventoryMovement = apps.get_model("store", "InventoryMovement")
+    movements = (
+        InventoryMovement(
+            productID_id=product_id,
+            delta=stock,
+            reason="opening",
+            reference="migration",
+        )
+        for product_id, stock in Product.objects.exclude(stockQuantity=0)
+        .values_list("productID", "stockQuantity")
+        .iterator()
+    )
+    InventoryMovement.objects.bulk_create(movements, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_checkoutkey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryMovement",
+            fields=[
+                ("movementID", models.BigAutoField(primary_key=True, serialize=False)),
+                ("delta", models.IntegerField()),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening Balance"),
+                            ("sale", "Sale"),
+                            ("cancellation", "Cancellation"),
+                            ("refund", "Refund"),
+                            ("adjustment", "Manual Adjustment"),
+                            ("reconciliation", "Reconciliation"),
+                            ("compacted", "Compacted History"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("reference", models.CharField(blank=True, max_length=100)),
+                ("createdTime", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "productID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_movements",
+                        to="store.product",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "inventory_movement",
+                "indexes": [
+                    models.Index(
+                        fields=["productID", "createdTime"],
+                        name="inv_movement_product_time",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
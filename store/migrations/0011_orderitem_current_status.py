@@ -0,0 +1,52 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_latest_status(apps, schema_editor):
+    """Fill currentStatus/currentStatusAt from each item's newest OrderStatus."""
+    OrderItem = apps.get_model("store", "OrderItem")
+    OrderStatus = apps.get_model("store", "OrderStatus")
+    latest = OrderStatus.objects.filter(orderItemID=OuterRef("pk")).order_by(
+        "-updatedDate", "-statusID"
+    )
+    OrderItem.objects.update(
+        currentStatus=Coalesce(
+            Subquery(latest.values("status")[:1]), Value("Processing")
+        ),
+        currentStatusAt=Subquery(latest.values("updatedDate")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_inventorymovement"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="currentStatus",
+            field=models.CharField(
+                choices=[
+                    ("Processing", "Processing"),
+                    ("Holding", "Holding"),
+                    ("Shipping", "Shipping"),
+                    ("Completed", "Completed"),
+                    ("Cancelled", "Cancelled"),
+                ],
+                db_index=True,
+                default="Processing",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="currentStatusAt",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_latest_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:03
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_aggregate_status(apps, schema_editor):
+    """Roll each order's item statuses up into Order.aggregateStatus."""
+    Order = apps.get_model("store", "Order")
+    OrderItem = apps.get_model("store", "OrderItem")
+    statuses = defaultdict(set)
+    for order_id, status in (
+        OrderItem.objects.values_list("orderID", "currentStatus").distinct().iterator()
+    ):
+        statuses[order_id].add(status)
+
+    by_status = defaultdict(list)
+    for order_id, item_statuses in statuses.items():
+        active = item_statuses - {"Cancelled"}
+        if not active:
+            by_status["Cancelled"].append(order_id)
+        elif len(active) == 1:
+            by_status[active.pop()].append(order_id)
+        else:
+            by_status["Mixed"].append(order_id)
+
+    for status, order_ids in by_status.items():
+        if status == "Processing":
+            continue  # the column default
+        for start in range(0, len(order_ids), 500):
+            Order.objects.filter(pk__in=order_ids[start : start + 500]).update(
+                aggregateStatus=status
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_orderitem_current_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="aggregateStatus",
+            field=models.CharField(
+                choices=[
+                    ("Processing", "Processing"),
+                    ("Holding", "Holding"),
+                    ("Shipping", "Shipping"),
+                    ("Completed", "Completed"),
+                    ("Cancelled", "Cancelled"),
+                    ("Mixed", "Mixed"),
+                ],
+                default="Processing",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customerID", "-orderDate"], name="order_customer_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["customerID", "aggregateStatus", "-orderDate"],
+                name="order_customer_status_date",
+            ),
+        ),
+        migrations.RunPython(fill_aggregate_status, migrations.RunPython.noop),
+    ]
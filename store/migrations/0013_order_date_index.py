@@ -0,0 +1,17 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0012_order_aggregate_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["-orderDate", "-orderID"], name="order_date_id"),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_sales(apps, schema_editor):
+    """Fill the daily totals from existing orders (as sales.rebuild() does)."""
+    OrderItem = apps.get_model("store", "OrderItem")
+    RefundRequest = apps.get_model("store", "RefundRequest")
+    StoreSalesDaily = apps.get_model("store", "StoreSalesDaily")
+    value = Sum(F("paidPrice") * F("quantity"))
+    rows = {}
+
+    def add(amount_field, units_field, grouped):
+        for entry in grouped:
+            key = (entry["store"], entry["day"])
+            row = rows.setdefault(key, StoreSalesDaily(storeID_id=key[0], day=key[1]))
+            setattr(row, amount_field, entry["amount"])
+            setattr(row, units_field, entry["units"])
+
+    add(
+        "grossAmount",
+        "unitsSold",
+        OrderItem.objects.values(
+            store=F("productID__storeID"), day=TruncDate("orderID__orderDate")
+        )
+        .annotate(amount=value, units=Sum("quantity"))
+        .order_by(),
+    )
+    # Cancelled items count as refunds instead when a refund was approved
+    add(
+        "cancelledAmount",
+        "unitsCancelled",
+        OrderItem.objects.filter(currentStatus="Cancelled")
+        .exclude(refund_requests__status="approved")
+        .values(store=F("productID__storeID"), day=TruncDate("currentStatusAt"))
+        .annotate(amount=value, units=Sum("quantity"))
+        .order_by(),
+    )
+    add(
+        "refundedAmount",
+        "unitsRefunded",
+        RefundRequest.objects.filter(status="approved")
+        .values(
+            store=F("orderItemID__productID__storeID"), day=TruncDate("responseDate")
+        )
+        .annotate(
+            amount=Sum(F("orderItemID__paidPrice") * F("orderItemID__quantity")),
+            units=Sum("orderItemID__quantity"),
+        )
+        .order_by(),
+    )
+    StoreSalesDaily.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0013_order_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoreSalesDaily",
+            fields=[
+                ("salesDayID", models.AutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                (
+                    "grossAmount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "cancelledAmount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "refundedAmount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("unitsSold", models.IntegerField(default=0)),
+                ("unitsCancelled", models.IntegerField(default=0)),
+                ("unitsRefunded", models.IntegerField(default=0)),
+                (
+                    "storeID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_days",
+                        to="store.store",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "store_sales_daily",
+                "unique_together": {("storeID", "day")},
+            },
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
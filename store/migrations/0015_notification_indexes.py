@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0014_storesalesdaily"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["customerID", "-notificationID"], name="notif_customer_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["vendorID", "-notificationID"], name="notif_vendor_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["customerID", "isRead"], name="notif_customer_read"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["vendorID", "isRead"], name="notif_vendor_read"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    """Fill the new counters from existing unread notifications."""
+    Notification = apps.get_model("store", "Notification")
+    for model_name, field in (("Customer", "customerID"), ("Vendor", "vendorID")):
+        model = apps.get_model("store", model_name)
+        unread = (
+            Notification.objects.filter(**{field: OuterRef("pk"), "isRead": False})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        model.objects.update(unreadNotifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0015_notification_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="unreadNotifications",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="vendor",
+            name="unreadNotifications",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
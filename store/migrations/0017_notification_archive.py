@@ -0,0 +1,75 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_unread_notification_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NotificationArchive",
+            fields=[
+                (
+                    "notificationID",
+                    models.IntegerField(primary_key=True, serialize=False),
+                ),
+                (
+                    "notificationType",
+                    models.CharField(
+                        choices=[
+                            ("new_order", "New Order Placed"),
+                            ("refund_request", "Refund Request Submitted"),
+                            ("wishlist_promo", "Wishlist Item On Sale"),
+                            ("order_status", "Order Status Changed"),
+                            ("refund_response", "Refund Response"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("title", models.CharField(max_length=200)),
+                ("message", models.TextField()),
+                ("link", models.CharField(blank=True, max_length=255)),
+                ("isRead", models.BooleanField(default=True)),
+                ("createdTime", models.DateTimeField()),
+                ("archivedTime", models.DateTimeField(auto_now_add=True)),
+                (
+                    "customerID",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_notifications",
+                        to="store.customer",
+                    ),
+                ),
+                (
+                    "vendorID",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_notifications",
+                        to="store.vendor",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "notification_archive",
+                "indexes": [
+                    models.Index(
+                        fields=["customerID", "-notificationID"],
+                        name="notif_archive_customer_id",
+                    ),
+                    models.Index(
+                        fields=["vendorID", "-notificationID"],
+                        name="notif_archive_vendor_id",
+                    ),
+                ],
+            },
+        ),
+    ]
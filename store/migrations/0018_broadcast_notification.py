@@ -0,0 +1,69 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0017_notification_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="lastBroadcastID",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="BroadcastNotification",
+            fields=[
+                ("broadcastID", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "notificationType",
+                    models.CharField(default="wishlist_promo", max_length=30),
+                ),
+                ("title", models.CharField(max_length=200)),
+                ("message", models.TextField()),
+                ("link", models.CharField(blank=True, max_length=255)),
+                ("createdTime", models.DateTimeField(auto_now_add=True)),
+                (
+                    "productID",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="broadcasts",
+                        to="store.product",
+                    ),
+                ),
+                (
+                    "promotionID",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="broadcasts",
+                        to="store.promotion",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "broadcast_notification",
+            },
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="broadcastID",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="deliveries",
+                to="store.broadcastnotification",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="notification",
+            unique_together={("customerID", "broadcastID")},
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0018_broadcast_notification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                ("jobID", models.BigAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=100)),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                ("priority", models.SmallIntegerField(default=100)),
+                ("runAt", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=10,
+                    ),
+                ),
+                ("dedupeKey", models.CharField(blank=True, max_length=200, null=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("maxAttempts", models.PositiveSmallIntegerField(default=5)),
+                ("lastError", models.TextField(blank=True)),
+                ("lockedBy", models.CharField(blank=True, max_length=100)),
+                ("lockedAt", models.DateTimeField(blank=True, null=True)),
+                ("createdTime", models.DateTimeField(auto_now_add=True)),
+                ("finishedTime", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "job",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "priority", "runAt"],
+                        name="job_status_priority",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("status", "queued")),
+                        fields=("dedupeKey",),
+                        name="job_queued_dedupe_key",
+                    )
+                ],
+            },
+        ),
+    ]
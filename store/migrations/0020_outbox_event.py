@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0019_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                ("eventID", models.BigAutoField(primary_key=True, serialize=False)),
+                ("topic", models.CharField(max_length=50)),
+                ("payload", models.JSONField(default=dict)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("lastError", models.TextField(blank=True)),
+                ("createdTime", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "outbox_event",
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0021_notification_coalescing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productmedia",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="storemedia",
+            name="variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="vendor",
+            name="profileImageVariants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
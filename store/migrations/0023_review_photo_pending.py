@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0022_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="review",
+            name="photoPending",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0023_review_photo_pending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="groupItems",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
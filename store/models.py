@@ -18,6 +18,10 @@ class Customer(models.Model):
     phoneNumber = models.CharField(max_length=20, blank=True)
     shippingAddress = models.TextField(blank=True)
     createdTime = models.DateTimeField(auto_now_add=True)
+    # Maintained by store.notifications; repair with `manage.py repair_unread_counts`
+    unreadNotifications = models.IntegerField(default=0)
+    # Newest BroadcastNotification already copied into this customer's notifications
+    lastBroadcastID = models.IntegerField(default=0)
 
     class Meta:
         db_table = 'customer'
@@ -47,7 +51,11 @@ class Vendor(models.Model):
     password = models.CharField(max_length=255)  # Will store hashed password
     phoneNumber = models.CharField(max_length=20, blank=True)
     profileImage = models.ImageField(upload_to='vendor_profiles/', null=True, blank=True)
+    # Resized copies of profileImage, see store.images
+    profileImageVariants = models.JSONField(default=dict, blank=True)
     createdTime = models.DateTimeField(auto_now_add=True)
+    # Maintained by store.notifications; repair with `manage.py repair_unread_counts`
+    unreadNotifications = models.IntegerField(default=0)
 
     class Meta:
         db_table = 'vendor'
@@ -93,6 +101,8 @@ class StoreMedia(models.Model):
     storeMediaID = models.AutoField(primary_key=True)
     storeID = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='shop_photos')
     image = models.ImageField(upload_to='store_photos/')
+    # Resized copies of image, see store.images
+    variants = models.JSONField(default=dict, blank=True)
     caption = models.CharField(max_length=200, blank=True)
     uploadedTime = models.DateTimeField(auto_now_add=True)
 
@@ -116,6 +126,8 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stockQuantity = models.IntegerField(validators=[MinValueValidator(0)])
+    # Sum of active StockReservation holds; maintained with F() updates
+    reservedQuantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     availability = models.BooleanField(default=True)
     createdTime = models.DateTimeField(auto_now_add=True)
     updatedTime = models.DateTimeField(auto_now=True)
@@ -130,6 +142,10 @@ class Product(models.Model):
         """Check if product has inventory."""
         return self.stockQuantity > 0
 
+    def available_quantity(self):
+        """Stock that can still be sold: on hand minus checkout holds."""
+        return max(self.stockQuantity - self.reservedQuantity, 0)
+
 
 # ======================= PRODUCT MEDIA MODEL =======================
 class ProductMedia(models.Model):
@@ -146,6 +162,8 @@ class ProductMedia(models.Model):
     mediaID = models.AutoField(primary_key=True)
     productID = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='media')
     mediaURL = models.ImageField(upload_to='product_images/')
+    # Resized copies of mediaURL, see store.images
+    variants = models.JSONField(default=dict, blank=True)
     mediaType = models.CharField(max_length=10, choices=MEDIA_TYPES, default='image')
     isPrimary = models.BooleanField(default=False)
     sortedOrder = models.IntegerField(default=0)
@@ -182,31 +200,76 @@ class Order(models.Model):
     """
     Represents a customer's order containing one or more items.
     Tracks order date and shipping information.
+    aggregateStatus rolls up the items' statuses ('Mixed' when they differ)
+    and is recomputed by store.ordering.record_status.
     """
+    STATUS_CHOICES = [
+        ('Processing', 'Processing'),
+        ('Holding', 'Holding'),
+        ('Shipping', 'Shipping'),
+        ('Completed', 'Completed'),
+        ('Cancelled', 'Cancelled'),
+        ('Mixed', 'Mixed'),
+    ]
+
     orderID = models.AutoField(primary_key=True)
     customerID = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     orderDate = models.DateTimeField(auto_now_add=True)
     shippingAddress = models.TextField()
     totalAmount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    aggregateStatus = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Processing')
 
     class Meta:
         db_table = 'order'
+        indexes = [
+            models.Index(fields=['customerID', '-orderDate'], name='order_customer_date'),
+            models.Index(fields=['customerID', 'aggregateStatus', '-orderDate'], name='order_customer_status_date'),
+            models.Index(fields=['-orderDate', '-orderID'], name='order_date_id'),
+        ]
 
     def __str__(self):
         return f"Order #{self.orderID} by {self.customerID}"
 
 
+# ======================= CHECKOUT KEY MODEL =======================
+class CheckoutKey(models.Model):
+    """
+    Client-supplied idempotency key for a checkout submission.
+    The unique (customer, key) index lets a retried or double-submitted
+    checkout find the order the first attempt produced instead of placing
+    a second one. orderID is filled in within the same transaction.
+    """
+    checkoutKeyID = models.AutoField(primary_key=True)
+    customerID = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='checkout_keys')
+    key = models.CharField(max_length=64)
+    orderID = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkout_keys')
+    createdTime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'checkout_key'
+        unique_together = ('customerID', 'key')
+
+    def __str__(self):
+        return f"Checkout key {self.key} → order #{self.orderID_id}"
+
+
 # ======================= ORDER ITEM MODEL =======================
 class OrderItem(models.Model):
     """
     Represents individual items within an order.
     Stores the price at time of purchase (paidPrice) for historical accuracy.
+    currentStatus mirrors the latest OrderStatus row; both are written
+    together by store.ordering.record_status.
     """
+    STATUS_CHOICES = [choice for choice in Order.STATUS_CHOICES if choice[0] != 'Mixed']
+
     orderItemID = models.AutoField(primary_key=True)
     orderID = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     productID = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     paidPrice = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    currentStatus = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Processing', db_index=True)
+    currentStatusAt = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'order_item'
@@ -221,13 +284,7 @@ class OrderStatus(models.Model):
     Tracks the status of each order item through its lifecycle.
     Multiple status records can exist per order item (history tracking).
     """
-    STATUS_CHOICES = [
-        ('Processing', 'Processing'),
-        ('Holding', 'Holding'),
-        ('Shipping', 'Shipping'),
-        ('Completed', 'Completed'),
-        ('Cancelled', 'Cancelled'),
-    ]
+    STATUS_CHOICES = OrderItem.STATUS_CHOICES
 
     statusID = models.AutoField(primary_key=True)
     orderItemID = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='statuses')
@@ -265,6 +322,93 @@ class CancelledItem(models.Model):
         return f"Cancelled - {self.get_cancelledReason_display()}"
 
 
+# ======================= STOCK RESERVATION MODEL =======================
+class StockReservation(models.Model):
+    """
+    A time-limited hold on stock, placed when a customer proceeds to checkout.
+    Checkout converts the hold; expired holds are released by the
+    release_reservations command. At most one hold per customer and product.
+    """
+    reservationID = models.AutoField(primary_key=True)
+    productID = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    customerID = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    expiresAt = models.DateTimeField(db_index=True)
+    createdTime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_reservation'
+        unique_together = ('customerID', 'productID')
+
+    def __str__(self):
+        return f"Hold: {self.quantity} × product #{self.productID_id} for customer #{self.customerID_id}"
+
+
+# ======================= INVENTORY MOVEMENT MODEL =======================
+class InventoryMovement(models.Model):
+    """
+    Append-only ledger of stock changes.
+    Product.stockQuantity caches the sum of a product's deltas; every stock
+    write goes through store.inventory so the two move together.
+    reference points at what caused the movement, e.g. "order:12".
+    """
+    REASON_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('sale', 'Sale'),
+        ('cancellation', 'Cancellation'),
+        ('refund', 'Refund'),
+        ('adjustment', 'Manual Adjustment'),
+        ('reconciliation', 'Reconciliation'),
+        ('compacted', 'Compacted History'),
+    ]
+
+    movementID = models.BigAutoField(primary_key=True)
+    productID = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='inventory_movements')
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True)
+    createdTime = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'inventory_movement'
+        indexes = [
+            models.Index(fields=['productID', 'createdTime'], name='inv_movement_product_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_reason_display()}: {self.delta:+d} × product #{self.productID_id}"
+
+
+# ======================= STORE SALES DAILY MODEL =======================
+class StoreSalesDaily(models.Model):
+    """
+    Per-store, per-day sales roll-up maintained by store.sales.
+    Sales count on the day they were ordered; cancellations and approved
+    refunds count on the day they happened. Rebuild with
+    `manage.py rebuild_sales`.
+    """
+    salesDayID = models.AutoField(primary_key=True)
+    storeID = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='sales_days')
+    day = models.DateField()
+    grossAmount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cancelledAmount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refundedAmount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unitsSold = models.IntegerField(default=0)
+    unitsCancelled = models.IntegerField(default=0)
+    unitsRefunded = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'store_sales_daily'
+        unique_together = ('storeID', 'day')
+
+    def __str__(self):
+        return f"{self.storeID_id} sales on {self.day}"
+
+    def net_amount(self):
+        """Gross sales less cancellations and refunds."""
+        return self.grossAmount - self.cancelledAmount - self.refundedAmount
+
+
 # ======================= WISHLIST ITEM MODEL =======================
 class WishlistItem(models.Model):
     """
@@ -337,6 +481,8 @@ class Review(models.Model):
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True)
     photo = models.ImageField(upload_to='review_photos/', blank=True, null=True)
+    # Set while photo is the original upload waiting to be resized (see store.images)
+    photoPending = models.BooleanField(default=False)
     createdDate = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -392,6 +538,32 @@ class RefundRequest(models.Model):
         return f"Refund Request #{self.refundRequestID} - {self.status}"
 
 
+# ======================= BROADCAST NOTIFICATION MODEL =======================
+class BroadcastNotification(models.Model):
+    """
+    One notification addressed to everyone who wishlisted a product (e.g. a
+    promotion going live). It is written once; each customer gets their own
+    Notification copy from the deliver_broadcasts job or the next time they
+    read their notifications (see store.notifications.deliver_broadcasts).
+    """
+    broadcastID = models.AutoField(primary_key=True)
+    productID = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='broadcasts')
+    promotionID = models.ForeignKey(
+        Promotion, on_delete=models.CASCADE, null=True, blank=True, related_name='broadcasts'
+    )
+    notificationType = models.CharField(max_length=30, default='wishlist_promo')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    link = models.CharField(max_length=255, blank=True)
+    createdTime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'broadcast_notification'
+
+    def __str__(self):
+        return f"Broadcast #{self.broadcastID} ({self.productID_id}): {self.title}"
+
+
 # ======================= NOTIFICATION MODEL =======================
 class Notification(models.Model):
     """
@@ -419,16 +591,69 @@ class Notification(models.Model):
     link = models.CharField(max_length=255, blank=True)
     isRead = models.BooleanField(default=False)
     createdTime = models.DateTimeField(auto_now_add=True)
+    # Unread notifications with the same groupKey are merged into one row
+    # (see store.notifications); count is how many events the row stands for,
+    # or with groupItems, how many distinct things (e.g. order item IDs)
+    groupKey = models.CharField(max_length=100, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    groupItems = models.JSONField(default=list, blank=True)
+    # Set on a customer's copy of a broadcast; doubles as their read marker for it
+    broadcastID = models.ForeignKey(
+        BroadcastNotification, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries'
+    )
 
     class Meta:
         db_table = 'notification'
         ordering = ['-createdTime']
+        unique_together = ('customerID', 'broadcastID')
+        indexes = [
+            # Newest-first lists, "latest ID" lookups and since-cursors
+            models.Index(fields=['customerID', '-notificationID'], name='notif_customer_id'),
+            models.Index(fields=['vendorID', '-notificationID'], name='notif_vendor_id'),
+            # Unread counts
+            models.Index(fields=['customerID', 'isRead'], name='notif_customer_read'),
+            models.Index(fields=['vendorID', 'isRead'], name='notif_vendor_read'),
+        ]
 
     def __str__(self):
         recipient = self.customerID or self.vendorID
         return f"Notification #{self.notificationID} → {recipient}: {self.title}"
 
 
+# ======================= NOTIFICATION ARCHIVE MODEL =======================
+class NotificationArchive(models.Model):
+    """
+    Read notifications moved out of the notification table once they are
+    old (see `manage.py archive_notifications`). Rows keep their original
+    notificationID, so history pages can continue from one table into the other.
+    """
+    notificationID = models.IntegerField(primary_key=True)
+    customerID = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications'
+    )
+    vendorID = models.ForeignKey(
+        Vendor, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications'
+    )
+    notificationType = models.CharField(max_length=30, choices=Notification.TYPE_CHOICES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    link = models.CharField(max_length=255, blank=True)
+    isRead = models.BooleanField(default=True)
+    createdTime = models.DateTimeField()
+    count = models.PositiveIntegerField(default=1)
+    archivedTime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'notification_archive'
+        indexes = [
+            models.Index(fields=['customerID', '-notificationID'], name='notif_archive_customer_id'),
+            models.Index(fields=['vendorID', '-notificationID'], name='notif_archive_vendor_id'),
+        ]
+
+    def __str__(self):
+        return f"Archived notification #{self.notificationID}: {self.title}"
+
+
 # ======================= SEARCH QUERY MODEL =======================
 class SearchQuery(models.Model):
     """
@@ -449,3 +674,71 @@ class SearchQuery(models.Model):
 
     def __str__(self):
         return f"Search: \"{self.query}\" ({self.resultCount} results) at {self.searchedAt}"
+
+
+# ======================= JOB MODEL =======================
+class Job(models.Model):
+    """
+    A unit of deferred work run by `manage.py run_jobs` (see store.jobs).
+    Queued jobs run in priority order (lower first) once runAt has passed;
+    failures are retried with backoff until maxAttempts is reached.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    jobID = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=100)
+    runAt = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # At most one queued job per key; running and finished jobs don't count
+    dedupeKey = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    maxAttempts = models.PositiveSmallIntegerField(default=5)
+    lastError = models.TextField(blank=True)
+    lockedBy = models.CharField(max_length=100, blank=True)
+    lockedAt = models.DateTimeField(null=True, blank=True)
+    createdTime = models.DateTimeField(auto_now_add=True)
+    finishedTime = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'job'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupeKey'], condition=models.Q(status='queued'), name='job_queued_dedupe_key'
+            ),
+        ]
+        indexes = [
+            # Claiming: due queued jobs by priority
+            models.Index(fields=['status', 'priority', 'runAt'], name='job_status_priority'),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.jobID} {self.name} ({self.status})"
+
+
+# ======================= OUTBOX EVENT MODEL =======================
+class OutboxEvent(models.Model):
+    """
+    A side effect recorded in the same transaction as the change that
+    caused it, and carried out afterwards by the relay (see store.outbox).
+    Dispatched events are deleted; events still here after maxAttempts
+    failures are left for inspection.
+    """
+    eventID = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    lastError = models.TextField(blank=True)
+    createdTime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'outbox_event'
+
+    def __str__(self):
+        return f"Outbox event #{self.eventID} {self.topic}"
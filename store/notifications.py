@@ -0,0 +1,624 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.timesince import timesince
+
+from .models import (
+    BroadcastNotification, Customer, Notification, NotificationArchive, Vendor, WishlistItem
+)
+
+
+# ======================= SENDING =======================
+# Every notification goes through send(), and read-state changes through
+# mark_read()/mark_all_read(), so the recipients' unread counters stay in
+# step in the same transaction and open live streams hear about it once
+# that transaction commits.
+
+RECIPIENT_MODELS = {'customer': Customer, 'vendor': Vendor}
+
+def recipient_key(notification):
+    """('customer', id) or ('vendor', id) for a notification's recipient."""
+    if notification.customerID_id:
+        return ('customer', notification.customerID_id)
+    return ('vendor', notification.vendorID_id)
+
+
+def session_recipient(request):
+    """Recipient key of the logged-in customer/vendor, or None."""
+    user_type = request.session.get('user_type')
+    if user_type == 'customer' and request.customer_id:
+        return ('customer', request.customer_id)
+    if user_type == 'vendor' and request.vendor_id:
+        return ('vendor', request.vendor_id)
+    return None
+
+
+def for_recipient(key):
+    """Queryset of one recipient's notifications."""
+    kind, pk = key
+    if kind == 'customer':
+        return Notification.objects.filter(customerID_id=pk)
+    return Notification.objects.filter(vendorID_id=pk)
+
+
+def state(key):
+    """
+    (ID of the recipient's newest notification or 0, unread counter), read
+    with one query: the recipient row plus an indexed newest-ID subquery.
+    """
+    kind, pk = key
+    newest = Notification.objects.filter(**{f'{kind}ID': OuterRef('pk')}).order_by('-notificationID')
+    return RECIPIENT_MODELS[kind].objects.filter(pk=pk).annotate(
+        latest=Coalesce(Subquery(newest.values('notificationID')[:1]), 0)
+    ).values_list('latest', 'unreadNotifications').first() or (0, 0)
+
+
+def send(notifications):
+    """
+    Save unsaved Notification rows with one INSERT, merging grouped ones
+    with each other and with their recipients' recent unread rows (see
+    _coalesce). Returns the rows written.
+    """
+    counts = defaultdict(int)
+    with transaction.atomic():
+        notifications, removed = _coalesce(list(notifications))
+        notifications = Notification.objects.bulk_create(notifications)
+        for notification in notifications:
+            if not notification.isRead:
+                counts[recipient_key(notification)] += 1
+        for key, merged in removed.items():
+            counts[key] -= merged
+        _adjust_unread(counts)
+    changed({recipient_key(notification) for notification in notifications} | set(removed))
+    return notifications
+
+
+def mark_read(notification):
+    """Mark one notification read; returns False if it already was."""
+    key = recipient_key(notification)
+    with transaction.atomic():
+        updated = Notification.objects.filter(pk=notification.pk, isRead=False).update(isRead=True)
+        _adjust_unread({key: -updated})
+    notification.isRead = True
+    if updated:
+        changed([key])
+    return bool(updated)
+
+
+def mark_all_read(key):
+    """Mark all of a recipient's notifications read; returns how many changed."""
+    with transaction.atomic():
+        updated = for_recipient(key).filter(isRead=False).update(isRead=True)
+        _adjust_unread({key: -updated})
+    if updated:
+        changed([key])
+    return updated
+
+
+def unread_count(key):
+    """The recipient's maintained unread counter (a primary-key fetch)."""
+    kind, pk = key
+    return RECIPIENT_MODELS[kind].objects.filter(pk=pk).values_list(
+        'unreadNotifications', flat=True
+    ).first() or 0
+
+
+def _adjust_unread(deltas):
+    """Add {recipient key: delta} to the unread counters, one UPDATE per recipient type."""
+    for kind, model in RECIPIENT_MODELS.items():
+        amounts = {pk: delta for (k, pk), delta in deltas.items() if k == kind and delta}
+        if amounts:
+            model.objects.filter(pk__in=amounts).update(unreadNotifications=F('unreadNotifications') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in amounts.items()],
+                default=Value(0), output_field=IntegerField()
+            ))
+
+
+def repair_unread_counts(kind, batch_size=500):
+    """
+    Recompute one recipient type's unread counters from their notifications,
+    batch_size rows per UPDATE. Returns the number of counters that were wrong.
+    """
+    model = RECIPIENT_MODELS[kind]
+    actual = Coalesce(Subquery(
+        Notification.objects.filter(**{f'{kind}ID': OuterRef('pk'), 'isRead': False})
+        .order_by().values(f'{kind}ID').annotate(total=Count('pk')).values('total')
+    ), 0)
+    fixed = 0
+    last_pk = 0
+    while True:
+        pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return fixed
+        with transaction.atomic():
+            fixed += model.objects.filter(pk__in=pks).annotate(actual=actual).exclude(
+                unreadNotifications=F('actual')
+            ).update(unreadNotifications=actual)
+        last_pk = pks[-1]
+
+
+# ======================= COALESCING =======================
+# A notification with a groupKey merges with the recipient's unread one
+# with the same key from the last NOTIFICATION_COALESCE_WINDOW seconds:
+# the older row is deleted and the new row carries the combined count. A
+# burst of updates is then one row and one badge increment, and the
+# merged row still gets a new ID for streams and ?since= cursors.
+# Rows that list groupItems (order status changes list their order items)
+# count the distinct items instead of the events, so moving the same item
+# twice still reads "1 item".
+# Keys are "<kind>:<arg>:...", and GROUP_TEXT renders a merged row's title
+# and message from the count and the key's parts.
+#
+# With NOTIFICATION_DIGEST_WINDOW set, NOTIFICATION_DIGEST_TYPES are
+# grouped per recipient and type instead: one rolling digest row per
+# window that counts everything of that type and shows the latest.
+
+GROUP_TEXT = {
+    # order_status:<order ID>:<status>
+    'order_status': ('Order Status: {2}', '{count} items in order #{1} are now {2}.'),
+    # new_order
+    'new_order': ('New Orders Received', '{count} new orders have been placed.'),
+}
+DIGEST_PREFIX = 'digest:'
+
+
+def _coalesce(notifications):
+    """
+    Merge grouped notifications with each other and with matching unread
+    rows already saved, which are locked and deleted. Call inside a
+    transaction. Returns (rows to insert, {recipient key: rows deleted}).
+    """
+    window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 600)
+    digest_window = getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 0)
+    digest_types = getattr(settings, 'NOTIFICATION_DIGEST_TYPES', ())
+
+    rows, groups, merged = [], {}, set()
+    for notification in notifications:
+        if digest_window and notification.notificationType in digest_types:
+            notification.groupKey = f'{DIGEST_PREFIX}{notification.notificationType}'
+        if not notification.groupKey or notification.isRead:
+            rows.append(notification)
+            continue
+        group = (recipient_key(notification), notification.groupKey)
+        if group in groups:
+            _absorb(notification, groups[group].count, groups[group].groupItems)
+            merged.add(group)
+        groups[group] = notification
+
+    removed = defaultdict(int)
+    if groups and (window or digest_window):
+        now = timezone.now()
+        condition = Q()
+        for (kind, pk), group_key in groups:
+            seconds = digest_window if group_key.startswith(DIGEST_PREFIX) else window
+            condition |= Q(**{f'{kind}ID_id': pk}, groupKey=group_key,
+                           createdTime__gte=now - timedelta(seconds=seconds))
+        existing = list(Notification.objects.select_for_update().filter(condition, isRead=False).values_list(
+            'notificationID', 'customerID_id', 'vendorID_id', 'groupKey', 'count', 'groupItems'
+        ))
+        for _, customer_id, vendor_id, group_key, count, items in existing:
+            key = ('customer', customer_id) if customer_id else ('vendor', vendor_id)
+            _absorb(groups[(key, group_key)], count, items)
+            merged.add((key, group_key))
+            removed[key] += 1
+        Notification.objects.filter(pk__in=[row[0] for row in existing]).delete()
+
+    for group in merged:
+        _group_text(groups[group])
+    return rows + list(groups.values()), dict(removed)
+
+
+def _absorb(notification, count, items):
+    """Fold an older row's count and groupItems into notification."""
+    if notification.groupItems and items:
+        notification.groupItems = sorted(set(notification.groupItems) | set(items))
+        notification.count = len(notification.groupItems)
+    else:
+        notification.count += count
+
+
+def _group_text(notification):
+    """Retitle a merged notification for its count."""
+    if notification.groupKey.startswith(DIGEST_PREFIX):
+        notification.title = f'{notification.get_notificationType_display()} ({notification.count})'
+        notification.message = f'Latest: {notification.message}'
+        return
+    if notification.count == 1:
+        return  # one distinct item: its own text already says it
+    parts = notification.groupKey.split(':')
+    text = GROUP_TEXT.get(parts[0])
+    if text:
+        notification.title, notification.message = (
+            template.format(*parts, count=notification.count) for template in text
+        )
+
+
+def changed(keys):
+    """Wake the recipients' open streams once the current transaction commits."""
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(lambda: hub.publish(keys))
+
+
+# ======================= BROADCASTS =======================
+# A broadcast reaches everyone who wishlisted a product with one row,
+# instead of one Notification per wishlister written inside the vendor's
+# request. deliver_broadcasts() joins broadcasts newer than
+# Customer.lastBroadcastID through the customer's wishlist and copies the
+# matches into their notifications. The copy carries their read state, so
+# counters, ETags and archiving need no special cases. The notification
+# views and stream call it for the customer reading them, and the
+# `deliver_broadcasts` job does it for everyone with a match pending.
+#
+# IDs are handed out at INSERT but become visible at COMMIT, so a lower ID
+# can appear after a higher one. The marker therefore only moves past
+# broadcasts older than BROADCAST_SETTLE_SECONDS, which have committed by
+# then; newer ones wait for the next delivery.
+
+LATEST_BROADCAST_KEY = 'store:broadcast-latest'
+LATEST_BROADCAST_TTL = 30  # seconds another process may take to notice a broadcast
+
+
+def broadcast(product, title, message, link='', promotion=None, notification_type='wishlist_promo'):
+    """Notify everyone who has product wishlisted; writes a single row."""
+    row = BroadcastNotification.objects.create(
+        productID=product, promotionID=promotion, notificationType=notification_type,
+        title=title, message=message, link=link
+    )
+    transaction.on_commit(lambda: _announce_broadcast(row.productID_id))
+    return row
+
+
+def _announce_broadcast(product_id):
+    cache.delete(LATEST_BROADCAST_KEY)
+    hub.publish_broadcast(product_id)
+
+
+def latest_broadcast_id():
+    """Newest broadcast ID, cached for LATEST_BROADCAST_TTL seconds."""
+    latest = cache.get(LATEST_BROADCAST_KEY)
+    if latest is None:
+        latest = BroadcastNotification.objects.order_by('-broadcastID').values_list(
+            'broadcastID', flat=True
+        ).first() or 0
+        cache.set(LATEST_BROADCAST_KEY, latest, LATEST_BROADCAST_TTL)
+    return latest
+
+
+def settled_broadcast_id(after=0):
+    """Newest broadcast ID past `after` that is old enough to have committed (0 if none)."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'BROADCAST_SETTLE_SECONDS', 30))
+    return BroadcastNotification.objects.filter(
+        broadcastID__gt=after, createdTime__lte=cutoff
+    ).order_by('-broadcastID').values_list('broadcastID', flat=True).first() or 0
+
+
+def deliver_broadcasts(key):
+    """
+    Copy settled broadcasts a customer has not received yet into their
+    notifications. Broadcasts for products they wishlisted only afterwards,
+    or whose promotion is no longer running, are skipped. With nothing
+    pending this is a cache read plus, once any broadcast exists, a
+    primary-key fetch. Returns the number delivered.
+    """
+    kind, customer_id = key
+    if kind != 'customer':
+        return 0
+    latest = latest_broadcast_id()
+    if not latest:
+        return 0
+    seen = Customer.objects.filter(pk=customer_id).values_list('lastBroadcastID', flat=True).first()
+    if seen is None or seen >= latest:
+        return 0
+    settled = settled_broadcast_id(after=seen)
+    if not settled:
+        return 0
+
+    now = timezone.now()
+    wishlisted = WishlistItem.objects.filter(
+        customerID_id=customer_id, productID=OuterRef('productID'), addedDate__lte=OuterRef('createdTime')
+    )
+    pending = BroadcastNotification.objects.filter(
+        Q(promotionID__isnull=True)
+        | Q(promotionID__status='active', promotionID__startDate__lte=now, promotionID__endDate__gte=now),
+        Exists(wishlisted),
+        broadcastID__gt=seen,
+        broadcastID__lte=settled,
+    ).order_by('broadcastID')
+
+    with transaction.atomic():
+        # Claim the range; if another request moved the marker first, it delivers
+        if not Customer.objects.filter(pk=customer_id, lastBroadcastID=seen).update(lastBroadcastID=settled):
+            return 0
+        return len(send(
+            Notification(
+                customerID_id=customer_id,
+                broadcastID=row,
+                notificationType=row.notificationType,
+                title=row.title,
+                message=row.message,
+                link=row.link,
+            )
+            for row in pending
+        ))
+
+
+def deliver_pending_broadcasts(batch_size=500):
+    """
+    Run deliver_broadcasts() for every customer with a settled broadcast
+    waiting on their wishlist, batch_size customers per query. Customers
+    without a match keep their marker until they next read notifications.
+    Returns the number delivered.
+    """
+    settled = settled_broadcast_id()
+    if not settled:
+        return 0
+    waiting = WishlistItem.objects.filter(
+        customerID=OuterRef('pk'),
+        productID__broadcasts__broadcastID__gt=OuterRef('lastBroadcastID'),
+        productID__broadcasts__broadcastID__lte=settled,
+    )
+    delivered = 0
+    last_pk = 0
+    while True:
+        customer_ids = list(
+            Customer.objects.filter(Exists(waiting), pk__gt=last_pk, lastBroadcastID__lt=settled)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not customer_ids:
+            return delivered
+        for customer_id in customer_ids:
+            delivered += deliver_broadcasts(('customer', customer_id))
+        last_pk = customer_ids[-1]
+
+
+# ======================= HISTORY & ARCHIVE =======================
+# Old read notifications move to NotificationArchive in bounded batches so
+# the notification table and its indexes only hold recent or unread rows.
+# IDs are kept, so the history page pages through both tables by ID.
+
+ARCHIVE_FIELDS = ['notificationID', 'customerID_id', 'vendorID_id', 'notificationType',
+                  'title', 'message', 'link', 'isRead', 'createdTime', 'count']
+
+
+def history_page(key, before=None, page_size=30):
+    """
+    One page of a recipient's notifications, newest first, across the live
+    and archive tables. before is the last ID of the previous page.
+    Returns (notifications, next_cursor); next_cursor is None on the last page.
+    """
+    kind, pk = key
+    archived = NotificationArchive.objects.filter(**{f'{kind}ID_id': pk})
+    pages = [for_recipient(key), archived]
+    if before is not None:
+        pages = [qs.filter(notificationID__lt=before) for qs in pages]
+    rows = sorted(
+        (row for qs in pages for row in qs.order_by('-notificationID')[:page_size + 1]),
+        key=lambda row: row.notificationID, reverse=True
+    )
+    if len(rows) > page_size:
+        return rows[:page_size], rows[page_size - 1].notificationID
+    return rows, None
+
+
+def archive_read(before, batch_size=1000):
+    """
+    Move read notifications created before `before` into the archive,
+    batch_size per transaction. Returns the number moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.select_for_update(skip_locked=True)
+                .filter(isRead=True, createdTime__lt=before)
+                .order_by('notificationID')[:batch_size]
+            )
+            if not batch:
+                return moved
+            NotificationArchive.objects.bulk_create([
+                NotificationArchive(**{field: getattr(n, field) for field in ARCHIVE_FIELDS})
+                for n in batch
+            ], ignore_conflicts=True)
+            Notification.objects.filter(pk__in=[n.pk for n in batch]).delete()
+        moved += len(batch)
+
+
+# ======================= ETAGS =======================
+# A recipient's dropdown only changes when a notification arrives (the
+# latest ID moves) or one is read (the unread counter drops; it only rises
+# with a new notification), so "<latest ID>.<unread count>" is a complete
+# validator. Both come from the database, so every process agrees on it.
+
+def etag(latest, unread):
+    return f'"{latest}.{unread}"'
+
+
+def etag_parts(value):
+    """(latest ID, unread count) from an ETag/If-None-Match value, or None."""
+    try:
+        latest, unread = value.strip().removeprefix('W/').strip('"').split('.')
+        return int(latest), int(unread)
+    except ValueError:
+        return None
+
+
+def serialize(notification):
+    """Dropdown/stream representation of a notification."""
+    return {
+        'id': notification.notificationID,
+        'type': notification.notificationType,
+        'title': notification.title,
+        'message': notification.message,
+        'link': notification.link,
+        'is_read': notification.isRead,
+        'count': notification.count,
+        'time_ago': timesince(notification.createdTime) + ' ago',
+    }
+
+
+# ======================= LIVE STREAM HUB =======================
+# Open streams wait on an asyncio.Event per connection; publish() sets the
+# events of the affected recipients from whichever thread committed. An
+# idle stream is just a parked coroutine, so idle tabs cost no queries.
+# publish() only reaches streams in the same process. When several
+# processes serve the site, set NOTIFICATION_STREAM_POLL_INTERVAL: each
+# process then runs one poller that looks for new notification IDs and
+# wakes its own subscribers, one query per interval however many tabs
+# are open. Read-state changes made in another process are not polled;
+# the tab that made them already updated its own badge.
+
+class StreamHub:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._poller = None
+
+    def subscribe(self, key):
+        """Register the running coroutine's stream for key; returns its Event."""
+        event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add((loop, event))
+        interval = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 0)
+        if interval and (self._poller is None or self._poller.done()):
+            self._poller = loop.create_task(self._poll(interval))
+        return event
+
+    def unsubscribe(self, key, event):
+        with self._lock:
+            streams = self._subscribers.get(key, set())
+            streams.difference_update({entry for entry in streams if entry[1] is event})
+            if not streams:
+                self._subscribers.pop(key, None)
+
+    def publish_broadcast(self, product_id):
+        """Wake the open streams of customers who have product_id wishlisted."""
+        with self._lock:
+            customer_ids = [pk for kind, pk in self._subscribers if kind == 'customer']
+        if customer_ids:
+            self.publish(_wishlisters(product_id, customer_ids))
+
+    def publish(self, keys):
+        """Wake every open stream for the given recipient keys (any thread)."""
+        with self._lock:
+            targets = [entry for key in keys for entry in self._subscribers.get(key, ())]
+        for loop, event in targets:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    async def _poll(self, interval):
+        last_id = await sync_to_async(_latest_notification_id)()
+        last_broadcast_id = await sync_to_async(latest_broadcast_id)()
+        while True:
+            await asyncio.sleep(interval)
+            with self._lock:
+                if not self._subscribers:
+                    return
+                customer_ids = [pk for kind, pk in self._subscribers if kind == 'customer']
+            last_id, keys = await sync_to_async(_recipients_since)(last_id)
+            last_broadcast_id, wishlisters = await sync_to_async(_broadcast_recipients_since)(
+                last_broadcast_id, customer_ids
+            )
+            self.publish(keys | wishlisters)
+
+
+def _latest_notification_id():
+    return Notification.objects.order_by('-notificationID').values_list('notificationID', flat=True).first() or 0
+
+
+def _recipients_since(last_id):
+    rows = list(Notification.objects.filter(notificationID__gt=last_id).order_by().values_list(
+        'notificationID', 'customerID_id', 'vendorID_id'
+    ))
+    keys = {('customer', cid) if cid else ('vendor', vid) for _, cid, vid in rows}
+    return max([last_id, *(row[0] for row in rows)]), keys
+
+
+def _wishlisters(product_ids, customer_ids):
+    """Recipient keys of those customer_ids who wishlisted any of product_ids."""
+    if not isinstance(product_ids, (list, set, tuple)):
+        product_ids = [product_ids]
+    return {
+        ('customer', cid) for cid in WishlistItem.objects.filter(
+            productID_id__in=product_ids, customerID_id__in=customer_ids
+        ).values_list('customerID_id', flat=True)
+    }
+
+
+def _broadcast_recipients_since(last_id, customer_ids):
+    rows = list(BroadcastNotification.objects.filter(broadcastID__gt=last_id).values_list('broadcastID', 'productID_id'))
+    if not rows:
+        return last_id, set()
+    cache.delete(LATEST_BROADCAST_KEY)  # let this process see them right away
+    keys = _wishlisters({product_id for _, product_id in rows}, customer_ids) if customer_ids else set()
+    return max(row[0] for row in rows), keys
+
+
+hub = StreamHub()
+
+
+# ======================= EVENT STREAM =======================
+
+STREAM_KEEPALIVE = 25      # seconds between comment lines on an idle stream
+STREAM_MAX_AGE = 60 * 10   # close after this long; EventSource reconnects
+STREAM_RETRY_MS = 5000     # reconnect delay sent to the browser
+STREAM_BATCH = 50          # notifications read per wake-up
+
+
+def _changes(key, last_id):
+    """New notifications after last_id (oldest first) and the unread count."""
+    deliver_broadcasts(key)
+    notifications = list(
+        for_recipient(key).filter(notificationID__gt=last_id).order_by('notificationID')[:STREAM_BATCH]
+    )
+    return [serialize(n) for n in notifications], unread_count(key)
+
+
+def _event(name, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {name}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(key, last_id):
+    """
+    Server-sent events for one recipient: a `notification` event per new
+    notification (its id is the SSE id, so reconnects resume after it) and
+    an `unread` event with the count whenever it may have changed.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_AGE
+    event = hub.subscribe(key)
+    try:
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        event.set()  # send anything missed since last_id, plus the count
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            event.clear()
+            notifications, unread = await sync_to_async(_changes)(key, last_id)
+            for notification in notifications:
+                last_id = notification['id']
+                yield _event('notification', notification, event_id=last_id)
+            yield _event('unread', {'unread': unread})
+            if len(notifications) == STREAM_BATCH:
+                event.set()  # more to catch up on
+    finally:
+        hub.unsubscribe(key, event)
@@ -0,0 +1,360 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When
+
+from . import inventory, outbox, sales
+from .models import (
+    CartItem, CheckoutKey, Notification, Order, OrderItem, OrderStatus, Product, RefundRequest,
+    StockReservation
+)
+
+
+class OutOfStockError(Exception):
+    """Raised when checkout lines can no longer be covered by stock."""
+
+    def __init__(self, product_names=()):
+        self.product_names = list(product_names)
+        super().__init__(f"Not enough stock for: {', '.join(self.product_names)}")
+
+
+# ======================= CHECKOUT =======================
+# Checkout forms carry an idempotency key (or the client sends an
+# Idempotency-Key header). The key row is the first thing written in the
+# order transaction, so a concurrent duplicate blocks on the unique index
+# and then fails, rather than racing a read-then-write check.
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+
+def clean_idempotency_key(value):
+    """Return a usable key from client input, or None."""
+    value = (value or '').strip()
+    if not value or len(value) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None
+    return value
+
+
+def find_checkout(customer_id, key):
+    """Return the CheckoutKey a customer already used, or None."""
+    if not key:
+        return None
+    return CheckoutKey.objects.filter(customerID_id=customer_id, key=key).first()
+
+
+def place_order(customer, cart_items, shipping_address, idempotency_key=None):
+    """
+    Turn priced cart lines (see cart.priced_cart_items) into an order.
+    Runs as one transaction with a fixed number of statements regardless of
+    how many lines are checked out: bulk inserts for items, statuses,
+    inventory movements and the vendor notifications' outbox events, an
+    increment of each store's daily sales row, and a single conditional
+    UPDATE for stock that only succeeds if every product still has enough.
+    Checkout holds placed by inventory.reserve are converted in the same
+    statement. Raises OutOfStockError (and rolls everything back) otherwise.
+
+    Returns (order, created). If idempotency_key was already used by this
+    customer nothing is written and the original order is returned with
+    created=False (order may be None if it has since been deleted).
+    """
+    total_amount = sum(item.subtotal_with_promo for item in cart_items)
+    quantities = {item.productID_id: item.quantity for item in cart_items}
+
+    try:
+        with transaction.atomic():
+            checkout_key = None
+            if idempotency_key:
+                try:
+                    with transaction.atomic():
+                        checkout_key = CheckoutKey.objects.create(customerID=customer, key=idempotency_key)
+                except IntegrityError:
+                    # Another submission with this key committed first
+                    existing = find_checkout(customer.customerID, idempotency_key)
+                    return (existing.orderID if existing else None), False
+
+            order = _create_order(customer, cart_items, shipping_address, total_amount, quantities)
+            if checkout_key:
+                checkout_key.orderID = order
+                checkout_key.save(update_fields=['orderID'])
+    except OutOfStockError:
+        # The transaction has rolled back, so these are the real stock levels;
+        # name the lines _decrement_stock's condition rejects
+        available = {
+            pid: stock - reserved
+            for pid, stock, reserved in Product.objects.filter(pk__in=quantities).values_list(
+                'productID', 'stockQuantity', 'reservedQuantity'
+            )
+        }
+        held = dict(StockReservation.objects.filter(
+            customerID=customer, productID__in=quantities
+        ).values_list('productID', 'quantity'))
+        raise OutOfStockError(
+            item.productID.productName for item in cart_items
+            if available.get(item.productID_id, 0) + held.get(item.productID_id, 0) < item.quantity
+        ) from None
+    return order, True
+
+
+def _create_order(customer, cart_items, shipping_address, total_amount, quantities):
+    with transaction.atomic():
+        # Stock first, so a sold-out line fails before anything is inserted
+        holds = inventory.own_holds(customer.customerID, quantities)
+        _decrement_stock(quantities, {pid: hold.quantity for pid, hold in holds.items()})
+        StockReservation.objects.filter(pk__in=[hold.pk for hold in holds.values()]).delete()
+
+        order = Order.objects.create(
+            customerID=customer,
+            shippingAddress=shipping_address,
+            totalAmount=total_amount
+        )
+        inventory.log_movements(
+            {product_id: -quantity for product_id, quantity in quantities.items()},
+            'sale', f'order:{order.orderID}'
+        )
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                orderID=order,
+                productID=item.productID,
+                quantity=item.quantity,
+                paidPrice=item.effective_price,
+                currentStatus='Processing',
+                currentStatusAt=order.orderDate
+            )
+            for item in cart_items
+        ])
+        sales.record_sale(order_items, order.orderDate)
+        OrderStatus.objects.bulk_create([
+            OrderStatus(orderItemID=order_item, status='Processing')
+            for order_item in order_items
+        ])
+
+        # Only delete the checked-out items from cart; unselected items remain
+        CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+
+        # Notify each vendor once about the new order
+        vendor_ids = {item.productID.storeID.vendorID_id for item in cart_items}
+        outbox.notify(
+            Notification(
+                vendorID_id=vendor_id,
+                notificationType='new_order',
+                title='New Order Received',
+                message=f'Order #{order.orderID} has been placed by {customer.firstName} {customer.lastName}.',
+                link='/vendor/orders/',
+                groupKey='new_order'
+            )
+            for vendor_id in sorted(vendor_ids)
+        )
+
+    return order
+
+
+def _decrement_stock(quantities, holds):
+    """
+    Subtract {product_id: quantity} from stock in one statement (the caller
+    logs the sale movements once the order exists), converting
+    the buyer's {product_id: held quantity} reservations at the same time:
+    UPDATE product SET stockQuantity = stockQuantity - CASE ... END,
+                       reservedQuantity = reservedQuantity - CASE ... END
+    WHERE (productID = a AND stockQuantity - reservedQuantity + held_a >= qa) OR ...
+    If any product falls short, no row for it matches and OutOfStockError is
+    raised so the surrounding transaction rolls back.
+    """
+    condition = Q()
+    for product_id, quantity in quantities.items():
+        held = holds.get(product_id, 0)
+        condition |= Q(pk=product_id, stockQuantity__gte=F('reservedQuantity') - held + quantity)
+
+    changes = {
+        'stockQuantity': F('stockQuantity') - Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()]
+        )
+    }
+    if holds:
+        changes['reservedQuantity'] = F('reservedQuantity') - Case(
+            *[When(pk=product_id, then=Value(held)) for product_id, held in holds.items()],
+            default=Value(0)
+        )
+    updated = Product.objects.filter(condition).update(**changes)
+    if updated != len(quantities):
+        raise OutOfStockError()
+
+
+# ======================= STATUS CHANGES =======================
+
+def record_status(order_items, status, from_statuses=None, where=None):
+    """
+    Move order items to status in one transaction: an OrderStatus history
+    row per item plus OrderItem.currentStatus/currentStatusAt, so the
+    current status can be read (and filtered on) without the history.
+    The affected orders' aggregateStatus is recomputed in the same
+    transaction, with the order rows locked so concurrent changes to
+    sibling items cannot leave a stale roll-up.
+    With from_statuses, only items currently in one of those statuses are
+    moved; the check and the change happen under a row lock, so two
+    concurrent requests cannot both move the same item. where (a filter
+    on OrderItem) narrows the items moved the same way.
+    Returns the OrderStatus rows created (empty if nothing moved).
+    """
+    items = {item.pk: item for item in order_items}
+    order_ids = sorted({item.orderID_id for item in items.values()})
+    with transaction.atomic():
+        # Lock parent orders first (in pk order) to serialise roll-ups
+        list(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk').values_list('pk'))
+        if from_statuses is not None or where is not None:
+            movable = OrderItem.objects.select_for_update().filter(pk__in=items)
+            if from_statuses is not None:
+                movable = movable.filter(currentStatus__in=from_statuses)
+            if where is not None:
+                movable = movable.filter(where)
+            items = {pk: items[pk] for pk in movable.values_list('pk', flat=True)}
+        if not items:
+            return []
+
+        records = OrderStatus.objects.bulk_create([
+            OrderStatus(orderItemID=item, status=status) for item in items.values()
+        ])
+        now = records[-1].updatedDate
+        OrderItem.objects.filter(pk__in=items).update(currentStatus=status, currentStatusAt=now)
+        refresh_aggregate_status(order_ids)
+    for item in items.values():
+        item.currentStatus = status
+        item.currentStatusAt = now
+    return records
+
+
+def change_item_status(order_items, status):
+    """
+    Vendor status change for a set of order items, in one transaction.
+    Items that are already cancelled, or that have a refund request
+    awaiting an answer (respond_refund decides those), are left alone.
+    Moved items get their
+    history rows (see record_status), cancellations go to the sales ledger,
+    and each affected order's customer gets one notification covering all
+    of its moved items. Returns the OrderStatus rows created.
+    """
+    editable = [choice for choice, _ in OrderItem.STATUS_CHOICES if choice != 'Cancelled']
+    with transaction.atomic():
+        records = record_status(order_items, status, from_statuses=editable, where=~Exists(
+            RefundRequest.objects.filter(orderItemID=OuterRef('pk'), status='pending')
+        ))
+        moved_ids = {record.orderItemID_id for record in records}
+        moved = [item for item in order_items if item.pk in moved_ids]
+        if status == 'Cancelled':
+            sales.record_cancellation(moved)
+
+        by_order = defaultdict(list)
+        for item in moved:
+            by_order[item.orderID].append(item)
+        outbox.notify(
+            _status_notification(order, items, status) for order, items in by_order.items()
+        )
+    return records
+
+
+def _status_notification(order, items, status):
+    if len(items) == 1:
+        message = f'Your order item "{items[0].productID.productName}" status changed to {status}.'
+    else:
+        names = ', '.join(f'"{item.productID.productName}"' for item in items)
+        message = f'{len(items)} items in order #{order.orderID} changed to {status}: {names}.'
+    return Notification(
+        customerID_id=order.customerID_id,
+        notificationType='order_status',
+        title=f'Order Status: {status}',
+        message=message,
+        link=f'/orders/{order.orderID}/',
+        groupKey=f'order_status:{order.orderID}:{status}',
+        count=len(items),
+        groupItems=[item.pk for item in items]
+    )
+
+
+def aggregate_status(item_statuses):
+    """
+    Order-level status for a collection of item statuses.
+    If all non-cancelled items share a status, that status; if every item
+    is cancelled, Cancelled; otherwise Mixed.
+    """
+    active = {status for status in item_statuses if status != 'Cancelled'}
+    if not active:
+        return 'Cancelled'
+    if len(active) == 1:
+        return active.pop()
+    return 'Mixed'
+
+
+def refresh_aggregate_status(order_ids):
+    """Recompute Order.aggregateStatus for order_ids in one UPDATE."""
+    statuses = defaultdict(set)
+    for order_id, status in OrderItem.objects.filter(
+        orderID__in=order_ids
+    ).values_list('orderID', 'currentStatus').distinct():
+        statuses[order_id].add(status)
+    if not statuses:
+        return
+    Order.objects.filter(pk__in=statuses).update(aggregateStatus=Case(
+        *[When(pk=order_id, then=Value(aggregate_status(s))) for order_id, s in statuses.items()]
+    ))
+
+
+# ======================= VENDOR ORDER CONSOLE =======================
+
+VENDOR_ORDERS_PAGE_SIZE = 20
+
+
+def vendor_order_page(store, status=None, date_from=None, date_to=None,
+                      pending_refund=False, before=None, page_size=VENDOR_ORDERS_PAGE_SIZE):
+    """
+    One page of orders containing a store's products, newest first.
+    Filters apply to the store's items in SQL: status (currentStatus),
+    an orderDate range [date_from, date_to) and pending refunds only.
+    before is an (orderDate, orderID) keyset cursor from a previous page.
+    Returns (orders_data, next_cursor) where orders_data is a list of
+    {'order', 'items'} and each item carries pending_refund (an unsaved
+    RefundRequest built from annotations, or None).
+    """
+    store_items = OrderItem.objects.filter(productID__storeID=store)
+    if status:
+        store_items = store_items.filter(currentStatus=status)
+    if pending_refund:
+        store_items = store_items.filter(refund_requests__status='pending')
+
+    orders = Order.objects.filter(
+        Exists(store_items.filter(orderID=OuterRef('pk')))
+    ).select_related('customerID').order_by('-orderDate', '-orderID')
+    if date_from:
+        orders = orders.filter(orderDate__gte=date_from)
+    if date_to:
+        orders = orders.filter(orderDate__lt=date_to)
+    if before:
+        before_date, before_id = before
+        orders = orders.filter(Q(orderDate__lt=before_date) | Q(orderDate=before_date, orderID__lt=before_id))
+
+    orders = list(orders[:page_size + 1])
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = (orders[-1].orderDate, orders[-1].orderID)
+
+    pending = RefundRequest.objects.filter(
+        orderItemID=OuterRef('pk'), status='pending'
+    ).order_by('requestDate')
+    items = store_items.filter(orderID__in=orders).select_related('productID').annotate(
+        pending_refund_id=Subquery(pending.values('refundRequestID')[:1]),
+        pending_refund_reason=Subquery(pending.values('reason')[:1]),
+        pending_refund_date=Subquery(pending.values('requestDate')[:1]),
+    ).order_by('orderItemID')
+
+    orders_data = {order.orderID: {'order': order, 'items': []} for order in orders}
+    for item in items:
+        item.pending_refund = None
+        if item.pending_refund_id:
+            item.pending_refund = RefundRequest(
+                refundRequestID=item.pending_refund_id,
+                orderItemID=item,
+                reason=item.pending_refund_reason,
+                requestDate=item.pending_refund_date,
+                status='pending',
+            )
+        orders_data[item.orderID_id]['items'].append(item)
+    return list(orders_data.values()), next_cursor
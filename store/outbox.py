@@ -0,0 +1,134 @@
+import logging
+import traceback
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import notifications
+from .models import Notification, OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+# ======================= OUTBOX =======================
+# Side effects of a business change (notifications, and the unread
+# counters and live-stream wakeups that come with them) are written as
+# OutboxEvent rows inside the change's own transaction: they exist if and
+# only if the change committed. relay() then claims pending events in
+# batches and hands each topic's payloads to its handler in one call, so
+# a batch of events costs one INSERT and one counter UPDATE downstream.
+# The handler's writes and the event's deletion commit together, so an
+# event is dispatched once unless the relay dies between the two.
+#
+# With OUTBOX_RELAY_INLINE the request relays its own events right after
+# commit; otherwise `manage.py relay_outbox` (or the job worker) does.
+
+HANDLERS = {}
+
+RELAY_BATCH_SIZE = 500
+
+
+def handler(topic):
+    """Register func(payloads) as the handler for a topic."""
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+    return register
+
+
+def publish(topic, payloads):
+    """Record events for topic in the current transaction; returns them."""
+    if topic not in HANDLERS:
+        raise ValueError(f'Unknown outbox topic: {topic}')
+    events = OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, payload=payload) for payload in payloads
+    ])
+    if events and getattr(settings, 'OUTBOX_RELAY_INLINE', True):
+        event_ids = [event.pk for event in events]
+        transaction.on_commit(lambda: relay(event_ids=event_ids))
+    return events
+
+
+def relay(batch_size=RELAY_BATCH_SIZE, event_ids=None):
+    """
+    Dispatch pending events, oldest first, batch_size per transaction;
+    limited to event_ids when given. Rows another relay is working on are
+    skipped. A topic whose batch fails is retried event by event so one
+    bad event cannot hold back the rest; failures count towards
+    OUTBOX_MAX_ATTEMPTS. Returns the number of events dispatched.
+    """
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+    dispatched = 0
+    failed_ids = set()
+    while True:
+        with transaction.atomic():
+            pending = OutboxEvent.objects.select_for_update(skip_locked=True).filter(
+                attempts__lt=max_attempts
+            ).exclude(pk__in=failed_ids)
+            if event_ids is not None:
+                pending = pending.filter(pk__in=event_ids)
+            batch = list(pending.order_by('eventID')[:batch_size])
+            if not batch:
+                return dispatched
+
+            by_topic = defaultdict(list)
+            for event in batch:
+                by_topic[event.topic].append(event)
+            done, errors = [], {}
+            for topic, events in by_topic.items():
+                error = _dispatch(topic, events)
+                if error is None:
+                    done += events
+                    continue
+                if len(events) == 1:
+                    errors[events[0].pk] = error
+                    continue
+                for event in events:
+                    error = _dispatch(topic, [event])
+                    if error is None:
+                        done.append(event)
+                    else:
+                        errors[event.pk] = error
+
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in done]).delete()
+            for event_id, error in errors.items():
+                OutboxEvent.objects.filter(pk=event_id).update(attempts=F('attempts') + 1, lastError=error)
+        dispatched += len(done)
+        failed_ids.update(errors)
+
+
+def _dispatch(topic, events):
+    """Run a topic's handler on events inside a savepoint; returns the traceback if it failed."""
+    try:
+        with transaction.atomic():
+            func = HANDLERS.get(topic)
+            if func is None:
+                raise LookupError(f'Unknown outbox topic: {topic}')
+            func([event.payload for event in events])
+    except Exception:
+        logger.exception('Outbox %s dispatch of %s event(s) failed', topic, len(events))
+        return traceback.format_exc()
+    return None
+
+
+# ======================= NOTIFICATIONS =======================
+
+NOTIFICATION_FIELDS = (
+    'customerID_id', 'vendorID_id', 'notificationType', 'title', 'message', 'link', 'groupKey', 'count',
+    'groupItems'
+)
+
+
+def notify(notification_rows):
+    """Queue unsaved Notification rows; the relay sends them with notifications.send()."""
+    return publish('notification', [
+        {name: getattr(row, name) for name in NOTIFICATION_FIELDS} for row in notification_rows
+    ])
+
+
+@handler('notification')
+def _send_notifications(payloads):
+    notifications.send(Notification(**payload) for payload in payloads)
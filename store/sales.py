@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, RefundRequest, StoreSalesDaily
+
+
+# ======================= SALES LEDGER =======================
+# StoreSalesDaily keeps running per-store, per-day totals so dashboards
+# read a handful of rows instead of every OrderItem. Each event adds to
+# the row for (store, day) with F() increments; rebuild() recomputes
+# everything from orders if the two ever drift.
+
+AMOUNT_FIELDS = {
+    'sale': ('grossAmount', 'unitsSold'),
+    'cancellation': ('cancelledAmount', 'unitsCancelled'),
+    'refund': ('refundedAmount', 'unitsRefunded'),
+}
+
+
+def _add(kind, order_items, when=None):
+    """Add the order items' value and units to their stores' row for the day."""
+    amount_field, units_field = AMOUNT_FIELDS[kind]
+    day = timezone.localdate(when or timezone.now())
+    amounts = defaultdict(Decimal)
+    units = defaultdict(int)
+    for item in order_items:
+        store_id = item.productID.storeID_id
+        amounts[store_id] += item.paidPrice * item.quantity
+        units[store_id] += item.quantity
+    if not amounts:
+        return
+
+    with transaction.atomic():
+        # Make sure the rows exist, then increment them in one UPDATE
+        StoreSalesDaily.objects.bulk_create(
+            [StoreSalesDaily(storeID_id=store_id, day=day) for store_id in amounts],
+            ignore_conflicts=True
+        )
+        StoreSalesDaily.objects.filter(storeID__in=amounts, day=day).update(**{
+            amount_field: F(amount_field) + Case(
+                *[When(storeID=store_id, then=Value(amount)) for store_id, amount in amounts.items()],
+                default=Value(Decimal('0')), output_field=DecimalField()
+            ),
+            units_field: F(units_field) + Case(
+                *[When(storeID=store_id, then=Value(count)) for store_id, count in units.items()],
+                default=Value(0), output_field=IntegerField()
+            ),
+        })
+
+
+def record_sale(order_items, when=None):
+    _add('sale', order_items, when)
+
+
+def record_cancellation(order_items, when=None):
+    _add('cancellation', order_items, when)
+
+
+def record_refund(order_items, when=None):
+    _add('refund', order_items, when)
+
+
+def rebuild(store_ids=None):
+    """
+    Recompute StoreSalesDaily from orders, refunds and item statuses.
+    Limited to store_ids when given. Returns the number of rows written.
+    """
+    items = OrderItem.objects.all()
+    refunds = RefundRequest.objects.filter(status='approved')
+    if store_ids is not None:
+        items = items.filter(productID__storeID__in=store_ids)
+        refunds = refunds.filter(orderItemID__productID__storeID__in=store_ids)
+    value = Sum(F('paidPrice') * F('quantity'))
+
+    rows = {}
+
+    def add(kind, grouped):
+        amount_field, units_field = AMOUNT_FIELDS[kind]
+        for entry in grouped:
+            key = (entry['store'], entry['day'])
+            row = rows.setdefault(key, StoreSalesDaily(storeID_id=key[0], day=key[1]))
+            setattr(row, amount_field, entry['amount'])
+            setattr(row, units_field, entry['units'])
+
+    add('sale', items.values(
+        store=F('productID__storeID'), day=TruncDate('orderID__orderDate')
+    ).annotate(amount=value, units=Sum('quantity')).order_by())
+    # Cancelled items count as refunds instead when a refund was approved
+    add('cancellation', items.filter(currentStatus='Cancelled').exclude(
+        refund_requests__status='approved'
+    ).values(
+        store=F('productID__storeID'), day=TruncDate('currentStatusAt')
+    ).annotate(amount=value, units=Sum('quantity')).order_by())
+    add('refund', refunds.values(
+        store=F('orderItemID__productID__storeID'), day=TruncDate('responseDate')
+    ).annotate(
+        amount=Sum(F('orderItemID__paidPrice') * F('orderItemID__quantity')),
+        units=Sum('orderItemID__quantity')
+    ).order_by())
+
+    with transaction.atomic():
+        existing = StoreSalesDaily.objects.all()
+        if store_ids is not None:
+            existing = existing.filter(storeID__in=store_ids)
+        existing.delete()
+        StoreSalesDaily.objects.bulk_create(rows.values(), batch_size=500)
+    return len(rows)
+
+
+def sales_summary(store, days=30):
+    """
+    Lifetime totals plus a day-by-day series for the last `days` days.
+    Returns (totals, series); totals has gross, cancelled, refunded, net
+    and units; series is a list of {'day', 'net', 'units'} with gaps filled.
+    """
+    totals = StoreSalesDaily.objects.filter(storeID=store).aggregate(
+        gross=Sum('grossAmount'), cancelled=Sum('cancelledAmount'),
+        refunded=Sum('refundedAmount'), units=Sum('unitsSold'),
+        units_cancelled=Sum('unitsCancelled'), units_refunded=Sum('unitsRefunded'),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['net'] = Decimal(totals['gross']) - totals['cancelled'] - totals['refunded']
+
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    by_day = {
+        row.day: row
+        for row in StoreSalesDaily.objects.filter(storeID=store, day__gte=start)
+    }
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day)
+        series.append({
+            'day': day,
+            'net': row.net_amount() if row else Decimal('0.00'),
+            'units': row.unitsSold if row else 0,
+        })
+    return totals, series
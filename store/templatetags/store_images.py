@@ -0,0 +1,38 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from store import images
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, variants, sizes='100vw', loading='lazy', **attrs):
+    """
+    <picture> for an image field and its variants (see store.images): a
+    WebP source, and an <img> with the JPEG srcset that falls back to the
+    original. Extra keyword arguments (alt, class, style, ...) become <img>
+    attributes; pass loading="eager" for an image above the fold. Usage:
+        {% responsive_image media.mediaURL media.variants sizes="300px" alt=product.productName %}
+    """
+    if not image:
+        return ''
+    attributes = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    webp = images.srcset(variants, 'webp')
+    jpeg = images.srcset(variants, 'jpeg')
+    if not webp and not jpeg:
+        return format_html('<img src="{}" loading="{}"{}>', image.url, loading, attributes)
+    return format_html(
+        '<picture class="responsive-image">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" loading="{}"{}>'
+        '</picture>',
+        webp, sizes, image.url, jpeg, sizes, loading, attributes
+    )
+
+
+@register.simple_tag
+def image_srcset(variants, image_format):
+    """The srcset of one variant format ('webp' or 'jpeg'), e.g. for a data attribute."""
+    return images.srcset(variants, image_format)
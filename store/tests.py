@@ -1,3 +1,849 @@
-from django.test import TestCase
+import csv
+import json
+import posixpath
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from . import cart, images, inventory, jobs, notifications, ordering, outbox, sales
+from .inventory import log_movements
+from .models import (
+    BroadcastNotification, CartItem, Customer, InventoryMovement, Job, Notification,
+    NotificationArchive, Order, OrderItem, OutboxEvent, Product, ProductMedia, RefundRequest,
+    StockReservation, Store, StoreMedia, StoreSalesDaily, Vendor, WishlistItem
+)
+
+
+def make_store(stock=5, price='20.00'):
+    """A vendor with a store and one product, its opening stock in the ledger."""
+    vendor = Vendor.objects.create(vendorName='Test Vendor', email='vendor@example.com', password='x')
+    store = Store.objects.create(vendorID=vendor, storeName='Test Records')
+    product = Product.objects.create(
+        storeID=store, productName='Test Pressing', description='', price=Decimal(price), stockQuantity=stock
+    )
+    log_movements({product.productID: stock}, 'opening', 'tests')
+    return vendor, product
+
+
+def make_customer(email='buyer@example.com', password='secret123'):
+    customer = Customer(firstName='Test', lastName='Buyer', email=email)
+    customer.set_password(password)
+    customer.save()
+    return customer
+
+
+def logged_in(**session_data):
+    client = Client()
+    session = client.session
+    session.update(session_data)
+    session.save()
+    return client
+
+
+def checkout(client, customer, product, quantity=1):
+    """Add to cart, open checkout and place the order; returns the order response."""
+    client.post(f'/cart/add/{product.productID}/', {'quantity': quantity})
+    item_ids = list(CartItem.objects.filter(customerID=customer, productID=product).values_list('pk', flat=True))
+    client.get('/checkout/', {'items': item_ids})
+    return client.post('/checkout/', {
+        'items': item_ids,
+        'shipping_address': '1 Test Lane',
+        'idempotency_key': f'test-{customer.pk}',
+    })
+
+
+# ======================= SESSIONS =======================
+
+TWO_WORKER_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-a'},
+    'worker-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-b'},
+}
+
+
+@override_settings(CACHES=TWO_WORKER_CACHES)
+class SessionTests(TestCase):
+    """Two server processes, each with its own per-process cache."""
+
+    def session(self, alias, session_key=None):
+        with override_settings(SESSION_CACHE_ALIAS=alias):
+            return import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+
+    def test_flushed_session_is_rejected_by_another_process(self):
+        if settings.SHARED_CACHE:
+            self.skipTest('sessions may be cached when the cache is shared')
+        first = self.session('default')
+        first['customer_id'] = 1
+        first.save()
+        key = first.session_key
+        self.assertEqual(self.session('worker-b', key).get('customer_id'), 1)
+
+        first.flush()  # logout handled by the first process
+        self.assertIsNone(self.session('worker-b', key).get('customer_id'))
+
+
+# ======================= CHECKOUT & STOCK =======================
+
+class StockInvariantTests(TransactionTestCase):
+    """The invariants `manage.py stress_checkout` checks, on a small run."""
+
+    def test_stress_checkout_keeps_stock_invariants(self):
+        # Raises CommandError on any violation
+        call_command('stress_checkout', buyers=6, stock=3, concurrency=1, stdout=StringIO())
+
+    def test_checkout_sells_at_most_the_stock(self):
+        _, product = make_store(stock=2)
+        for n in range(4):
+            customer = make_customer(email=f'buyer{n}@example.com')
+            checkout(logged_in(customer_id=customer.pk, user_type='customer'), customer, product)
+
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(productID=product).aggregate(total=Sum('quantity'))['total']
+        ledger = InventoryMovement.objects.filter(productID=product).aggregate(total=Sum('delta'))['total']
+        self.assertEqual(sold, 2)
+        self.assertEqual(product.stockQuantity, 0)
+        self.assertEqual(product.reservedQuantity, 0)
+        self.assertEqual(ledger, product.stockQuantity)
+
+
+class ReconcileInventoryTests(TestCase):
+
+    def setUp(self):
+        _, self.product = make_store(stock=5)
+        Product.objects.filter(pk=self.product.pk).update(stockQuantity=7)  # e.g. a recount
+
+    def ledger(self):
+        return InventoryMovement.objects.filter(productID=self.product).aggregate(total=Sum('delta'))['total']
+
+    def test_fix_corrects_the_ledger_by_default(self):
+        call_command('reconcile_inventory', fix=True, stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stockQuantity, self.ledger()), (7, 7))
+        self.assertEqual(InventoryMovement.objects.get(productID=self.product, reason='adjustment').delta, 2)
+
+    def test_reset_stock_is_opt_in(self):
+        call_command('reconcile_inventory', fix=True, reset_stock=True, stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stockQuantity, self.ledger()), (5, 5))
+
+
+class ReservationTests(TestCase):
+
+    def setUp(self):
+        _, self.product = make_store(stock=2)
+        self.holder, self.buyer = make_customer('holder@example.com'), make_customer()
+
+    def reserved(self):
+        self.product.refresh_from_db()
+        return self.product.reservedQuantity
+
+    def test_hold_blocks_others_until_it_expires(self):
+        self.assertEqual(inventory.reserve(self.holder.pk, {self.product.pk: 2}), [])
+        self.assertEqual(inventory.reserve(self.buyer.pk, {self.product.pk: 1}), [self.product.pk])
+        self.assertEqual(inventory.release_expired_reservations(), 0)
+
+        StockReservation.objects.update(expiresAt=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(inventory.release_expired_reservations(), 1)
+        self.assertEqual(self.reserved(), 0)
+        self.assertEqual(inventory.reserve(self.buyer.pk, {self.product.pk: 1}), [])
+        self.assertEqual(self.reserved(), 1)
+
+    def test_reserving_again_replaces_the_customers_hold(self):
+        inventory.reserve(self.buyer.pk, {self.product.pk: 1})
+        self.assertEqual(inventory.reserve(self.buyer.pk, {self.product.pk: 2}), [])
+        self.assertEqual(self.reserved(), 2)
+        self.assertEqual(StockReservation.objects.get(customerID=self.buyer).quantity, 2)
+
+
+class IdempotentCheckoutTests(TestCase):
+
+    def test_resubmitted_checkout_returns_the_first_order(self):
+        _, product = make_store(stock=5)
+        customer = make_customer()
+        client = logged_in(customer_id=customer.pk, user_type='customer')
+        client.post(f'/cart/add/{product.productID}/', {'quantity': 2})
+        form = {
+            'items': list(CartItem.objects.filter(customerID=customer).values_list('pk', flat=True)),
+            'shipping_address': '1 Test Lane',
+            'idempotency_key': 'double-click',
+        }
+        first = client.post('/checkout/', form)
+        second = client.post('/checkout/', form)
+
+        order = Order.objects.get(customerID=customer)
+        self.assertRedirects(first, f'/orders/{order.pk}/', fetch_redirect_response=False)
+        self.assertRedirects(second, f'/orders/{order.pk}/', fetch_redirect_response=False)
+        product.refresh_from_db()
+        self.assertEqual(product.stockQuantity, 3)
+
+    def test_key_is_per_customer(self):
+        _, product = make_store(stock=5)
+        orders = []
+        for email in ('first@example.com', 'second@example.com'):
+            customer = make_customer(email)
+            cart.add_item(customer.pk, product.pk, 1)
+            items, _ = cart.priced_cart_items(customer.pk)
+            order, created = ordering.place_order(customer, items, '1 Test Lane', idempotency_key='same')
+            self.assertTrue(created)
+            orders.append(order)
+            self.assertEqual(ordering.place_order(customer, items, '1 Test Lane', idempotency_key='same'),
+                             (order, False))
+        self.assertNotEqual(*orders)
+
+
+class OutOfStockTests(TestCase):
+
+    def test_another_customers_hold_is_named_as_the_shortage(self):
+        _, product = make_store(stock=2)
+        holder, buyer = make_customer('holder@example.com'), make_customer()
+        self.assertTrue(cart.add_item(buyer.pk, product.pk, 1))  # added before the hold
+        self.assertEqual(inventory.reserve(holder.pk, {product.pk: 2}), [])
+        items, _ = cart.priced_cart_items(buyer.pk)
+
+        with self.assertRaises(ordering.OutOfStockError) as raised:
+            ordering.place_order(buyer, items, '1 Test Lane')
+        self.assertEqual(raised.exception.product_names, ['Test Pressing'])
+
+    def test_own_hold_counts_towards_the_stock(self):
+        _, product = make_store(stock=2)
+        buyer = make_customer()
+        cart.add_item(buyer.pk, product.pk, 2)
+        inventory.reserve(buyer.pk, {product.pk: 2})
+        items, _ = cart.priced_cart_items(buyer.pk)
+        order, created = ordering.place_order(buyer, items, '1 Test Lane')
+        self.assertTrue(created)
+        product.refresh_from_db()
+        self.assertEqual((product.stockQuantity, product.reservedQuantity), (0, 0))
+
+
+# ======================= REFUNDS =======================
+
+class RefundTests(TestCase):
+
+    def setUp(self):
+        self.vendor, self.product = make_store(stock=5)
+        customer = make_customer()
+        checkout(logged_in(customer_id=customer.pk, user_type='customer'), customer, self.product, quantity=2)
+        self.item = OrderItem.objects.get(productID=self.product)
+        self.refund = RefundRequest.objects.create(orderItemID=self.item, reason='Warped')
+        self.vendor_client = logged_in(vendor_id=self.vendor.pk, user_type='vendor')
+
+    def respond(self, action):
+        return self.vendor_client.post(
+            f'/vendor/refund-request/{self.refund.pk}/respond/', {'action': action}
+        )
+
+    def test_approving_twice_restocks_and_records_once(self):
+        self.assertEqual(self.respond('approve').status_code, 200)
+        self.assertEqual(self.respond('approve').status_code, 400)
+        self.assertEqual(self.respond('reject').status_code, 400)
+
+        self.product.refresh_from_db()
+        self.refund.refresh_from_db()
+        self.assertEqual(self.refund.status, 'approved')
+        self.assertEqual(self.product.stockQuantity, 5)
+        self.assertEqual(InventoryMovement.objects.filter(reference=f'refund:{self.refund.pk}').count(), 1)
+
+        recorded = StoreSalesDaily.objects.aggregate(total=Sum('refundedAmount'))['total']
+        self.assertEqual(recorded, self.item.paidPrice * 2)
+        sales.rebuild()
+        self.assertEqual(StoreSalesDaily.objects.aggregate(total=Sum('refundedAmount'))['total'], recorded)
+
+    def test_item_cancelled_while_pending_cannot_be_approved(self):
+        ordering.record_status([self.item], 'Cancelled')
+        sales.record_cancellation([self.item])
+        inventory.change_stock({self.product.pk: 2}, 'cancellation', f'order_item:{self.item.pk}')
+
+        self.assertEqual(self.respond('approve').status_code, 400)
+        self.refund.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.refund.status, 'pending')
+        self.assertEqual(self.product.stockQuantity, 5)
+        self.assertFalse(InventoryMovement.objects.filter(reference=f'refund:{self.refund.pk}').exists())
+        recorded = list(StoreSalesDaily.objects.values_list('cancelledAmount', 'refundedAmount'))
+        sales.rebuild()
+        self.assertEqual(list(StoreSalesDaily.objects.values_list('cancelledAmount', 'refundedAmount')), recorded)
+
+    def test_rejected_refund_cannot_be_approved(self):
+        self.assertEqual(self.respond('reject').status_code, 200)
+        self.assertEqual(self.respond('approve').status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stockQuantity, 3)
+
+
+# ======================= VENDOR ORDERS =======================
+
+class BulkStatusTests(TestCase):
+
+    def setUp(self):
+        self.vendor, self.product = make_store(stock=5)
+        for n in range(3):
+            customer = make_customer(email=f'buyer{n}@example.com')
+            checkout(logged_in(customer_id=customer.pk, user_type='customer'), customer, self.product)
+        self.items = list(OrderItem.objects.filter(productID=self.product).order_by('pk'))
+        self.vendor_client = logged_in(vendor_id=self.vendor.pk, user_type='vendor')
+
+    def bulk(self, ids, status):
+        return self.vendor_client.post(
+            '/vendor/order-items/update-status/', json.dumps({'ids': ids, 'status': status}),
+            content_type='application/json'
+        )
+
+    def test_cancelled_and_refund_pending_items_are_skipped(self):
+        moving, cancelled, refunding = self.items
+        ordering.change_item_status([cancelled], 'Cancelled')
+        RefundRequest.objects.create(orderItemID=refunding, reason='Warped')
+
+        response = self.bulk([moving.pk, cancelled.pk, refunding.pk, 999999], 'Shipping')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']],
+                         ['updated', 'cancelled', 'refund_pending', 'not_found'])
+        self.assertEqual(
+            dict(OrderItem.objects.filter(productID=self.product).values_list('pk', 'currentStatus')),
+            {moving.pk: 'Shipping', cancelled.pk: 'Cancelled', refunding.pk: 'Processing'}
+        )
+
+    def test_item_with_pending_refund_cannot_be_cancelled_by_the_vendor(self):
+        item = self.items[0]
+        RefundRequest.objects.create(orderItemID=item, reason='Warped')
+        response = self.vendor_client.post(f'/vendor/order-item/{item.pk}/update-status/', {'status': 'Cancelled'})
+        self.assertEqual(response.status_code, 400)
+        item.refresh_from_db()
+        self.assertEqual(item.currentStatus, 'Processing')
+        self.assertFalse(StoreSalesDaily.objects.filter(unitsCancelled__gt=0).exists())
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.vendor, product = make_store(stock=5)
+        customer = make_customer()
+        Customer.objects.filter(pk=customer.pk).update(firstName='=HYPERLINK("http://x")')
+        cart.add_item(customer.pk, product.pk, 1)
+        items, _ = cart.priced_cart_items(customer.pk)
+        ordering.place_order(customer, items, '@SUM(A1:A9)')
+        self.vendor_client = logged_in(vendor_id=self.vendor.pk, user_type='vendor')
+
+    def export(self, dataset, export_format):
+        response = self.vendor_client.get(f'/vendor/export/{dataset}/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_neutralises_formulas_in_text_cells(self):
+        [row] = list(csv.DictReader(StringIO(self.export('orders', 'csv'))))
+        self.assertEqual(row['customer_name'], "'" + '=HYPERLINK("http://x") Buyer')
+        self.assertEqual(row['shipping_address'], "'@SUM(A1:A9)")
+        self.assertEqual(row['paid_price'], '20.00')
+
+    def test_numbers_and_jsonl_are_left_as_they_are(self):
+        ordering.change_item_status(list(OrderItem.objects.all()), 'Cancelled')
+        [row] = list(csv.DictReader(StringIO(self.export('sales', 'csv'))))
+        self.assertEqual(row['net'], '0.00')
+        self.assertEqual(row['cancelled'], '20.00')
+        [line] = self.export('orders', 'jsonl').splitlines()
+        self.assertEqual(json.loads(line)['shipping_address'], '@SUM(A1:A9)')
+
+
+# ======================= NOTIFICATIONS =======================
+
+class UnreadCounterTests(TestCase):
+
+    def setUp(self):
+        self.vendor, _ = make_store()
+        self.customers = [make_customer(f'buyer{n}@example.com') for n in range(2)]
+
+    def notify(self, **recipient):
+        [notification] = notifications.send([Notification(
+            notificationType='refund_response', title='Update', message='Update', **recipient
+        )])
+        return notification
+
+    def unread(self, recipient):
+        recipient.refresh_from_db(fields=['unreadNotifications'])
+        return recipient.unreadNotifications
+
+    def test_counters_follow_sends_and_reads(self):
+        customer = self.customers[0]
+        first, _ = self.notify(customerID=customer), self.notify(customerID=customer)
+        self.notify(vendorID=self.vendor)
+        self.assertEqual((self.unread(customer), self.unread(self.vendor)), (2, 1))
+
+        self.assertTrue(notifications.mark_read(first))
+        self.assertFalse(notifications.mark_read(first))
+        self.assertEqual(self.unread(customer), 1)
+        self.assertEqual(notifications.mark_all_read(('customer', customer.pk)), 1)
+        self.assertEqual((self.unread(customer), self.unread(self.vendor)), (0, 1))
+
+    def test_repair_fixes_only_drifted_counters(self):
+        for customer in self.customers:
+            self.notify(customerID=customer)
+        Customer.objects.filter(pk=self.customers[1].pk).update(unreadNotifications=7)
+
+        self.assertEqual(notifications.repair_unread_counts('customer', batch_size=1), 1)
+        self.assertEqual([self.unread(customer) for customer in self.customers], [1, 1])
+        self.assertEqual(notifications.repair_unread_counts('customer'), 0)
+
+
+class NotificationArchiveTests(TestCase):
+
+    def setUp(self):
+        customer = make_customer()
+        self.key = ('customer', customer.pk)
+        self.ids = [notification.pk for notification in notifications.send(
+            Notification(customerID=customer, notificationType='refund_response', title=f'#{n}', message='')
+            for n in range(5)
+        )]
+        Notification.objects.filter(pk__in=self.ids[:3]).update(isRead=True)
+        Notification.objects.update(createdTime=timezone.now() - timedelta(days=120))
+
+    def test_read_notifications_move_in_batches(self):
+        self.assertEqual(notifications.archive_read(timezone.now() - timedelta(days=90), batch_size=2), 3)
+        self.assertEqual(sorted(NotificationArchive.objects.values_list('notificationID', flat=True)), self.ids[:3])
+        self.assertEqual(sorted(Notification.objects.values_list('notificationID', flat=True)), self.ids[3:])
+        self.assertEqual(notifications.archive_read(timezone.now()), 0)
+
+    def test_history_pages_through_live_and_archived_rows(self):
+        notifications.archive_read(timezone.now())
+        pages, before = [], None
+        while True:
+            rows, before = notifications.history_page(self.key, before, page_size=2)
+            pages.append([row.notificationID for row in rows])
+            if before is None:
+                break
+        newest_first = self.ids[::-1]
+        self.assertEqual(pages, [newest_first[:2], newest_first[2:4], newest_first[4:]])
+
+
+class BroadcastTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        _, self.product = make_store()
+        self.fan, self.other = make_customer('fan@example.com'), make_customer()
+        WishlistItem.objects.create(
+            customerID=self.fan, productID=self.product,
+            originalPrice=self.product.price, priceAtAddedTime=self.product.price
+        )
+        WishlistItem.objects.update(addedDate=timezone.now() - timedelta(hours=1))
+
+    def broadcast(self, age=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            row = notifications.broadcast(self.product, 'On sale', 'Test Pressing is on sale')
+        BroadcastNotification.objects.filter(pk=row.pk).update(createdTime=timezone.now() - timedelta(seconds=age))
+        return row
+
+    def delivered(self, customer):
+        return list(Notification.objects.filter(customerID=customer).values_list('broadcastID', flat=True))
+
+    def test_broadcast_waits_for_the_settle_window(self):
+        row = self.broadcast()
+        self.assertEqual(notifications.deliver_broadcasts(('customer', self.fan.pk)), 0)
+        self.fan.refresh_from_db()
+        self.assertEqual(self.fan.lastBroadcastID, 0)
+
+        BroadcastNotification.objects.filter(pk=row.pk).update(
+            createdTime=timezone.now() - timedelta(seconds=settings.BROADCAST_SETTLE_SECONDS + 1)
+        )
+        self.assertEqual(notifications.deliver_broadcasts(('customer', self.fan.pk)), 1)
+        self.assertEqual(notifications.deliver_broadcasts(('customer', self.fan.pk)), 0)
+        self.assertEqual(notifications.deliver_broadcasts(('customer', self.other.pk)), 0)
+        self.assertEqual((self.delivered(self.fan), self.delivered(self.other)), ([row.pk], []))
+
+    def test_job_delivers_to_wishlisters_only(self):
+        row = self.broadcast(age=settings.BROADCAST_SETTLE_SECONDS + 1)
+        self.assertEqual(notifications.deliver_pending_broadcasts(batch_size=1), 1)
+        self.assertEqual(notifications.deliver_pending_broadcasts(), 0)
+        self.assertEqual((self.delivered(self.fan), self.delivered(self.other)), ([row.pk], []))
+
+    def test_later_wishlisters_do_not_get_earlier_broadcasts(self):
+        self.broadcast(age=settings.BROADCAST_SETTLE_SECONDS + 1)
+        WishlistItem.objects.create(
+            customerID=self.other, productID=self.product,
+            originalPrice=self.product.price, priceAtAddedTime=self.product.price
+        )
+        self.assertEqual(notifications.deliver_broadcasts(('customer', self.other.pk)), 0)
+        self.other.refresh_from_db()
+        self.assertGreater(self.other.lastBroadcastID, 0)
+
+
+class NotificationCoalescingTests(TestCase):
+
+    def setUp(self):
+        _, product = make_store(stock=5)
+        other = Product.objects.create(
+            storeID=product.storeID, productName='Second Pressing', description='', price=product.price, stockQuantity=5
+        )
+        log_movements({other.pk: 5}, 'opening', 'tests')
+        self.customer = make_customer()
+        for pk in (product.pk, other.pk):
+            cart.add_item(self.customer.pk, pk, 1)
+        items, _ = cart.priced_cart_items(self.customer.pk)
+        self.order, _ = ordering.place_order(self.customer, items, '1 Test Lane')
+        self.items = list(self.order.items.order_by('pk'))
+        outbox.relay()
+
+    def status_notifications(self):
+        outbox.relay()
+        return list(Notification.objects.filter(customerID=self.customer, notificationType='order_status'))
+
+    def test_moving_the_same_item_twice_counts_it_once(self):
+        ordering.change_item_status([self.items[0]], 'Shipping')
+        ordering.change_item_status([self.items[0]], 'Shipping')
+        [notification] = self.status_notifications()
+        self.assertEqual(notification.count, 1)
+        self.assertIn('status changed to Shipping', notification.message)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.unreadNotifications, 1)
+
+    def test_distinct_items_in_one_order_are_summed(self):
+        first, second = self.items
+        ordering.change_item_status([first], 'Shipping')
+        ordering.change_item_status([second, first], 'Shipping')
+        [notification] = self.status_notifications()
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.message, f'2 items in order #{self.order.pk} are now Shipping.')
+
+    def test_read_or_old_rows_are_not_merged(self):
+        first, second = self.items
+        ordering.change_item_status([first], 'Shipping')
+        [read] = self.status_notifications()
+        notifications.mark_read(read)
+        ordering.change_item_status([second], 'Shipping')
+        outbox.relay()
+        window = timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW + 1)
+        Notification.objects.update(createdTime=timezone.now() - window)
+        ordering.change_item_status([first], 'Shipping')
+        self.assertEqual([n.count for n in self.status_notifications()], [1, 1, 1])
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=3600)
+    def test_digest_rolls_a_type_into_one_row(self):
+        first, second = self.items
+        ordering.change_item_status([first], 'Shipping')
+        ordering.change_item_status([second], 'Delivered')
+        [digest] = self.status_notifications()
+        self.assertEqual(digest.groupKey, 'digest:order_status')
+        self.assertEqual(digest.count, 2)
+        self.assertEqual(digest.title, 'Order Status Changed (2)')
+        self.assertIn('Latest: ', digest.message)
+        self.assertIn('Delivered', digest.message)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.unreadNotifications, 1)
+
+
+class NotificationPollingTests(TestCase):
+
+    def setUp(self):
+        self.customer = make_customer()
+        self.key = ('customer', self.customer.pk)
+        self.client = logged_in(customer_id=self.customer.pk, user_type='customer')
+        self.first = self.send('First')
+
+    def send(self, title):
+        [notification] = notifications.send([Notification(
+            customerID=self.customer, notificationType='refund_response', title=title, message=title
+        )])
+        return notification
+
+    def poll(self, etag='', **params):
+        return self.client.get('/notifications/json/', params, HTTP_IF_NONE_MATCH=etag)
+
+    def test_state_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(notifications.state(self.key), (self.first.pk, 1))
+
+    def test_unchanged_etag_gets_304(self):
+        etag = self.poll()['ETag']
+        self.assertEqual(etag, notifications.etag(self.first.pk, 1))
+        self.assertEqual(self.poll(etag).status_code, 304)
+        self.send('Second')
+        self.assertEqual(self.poll(etag).status_code, 200)
+
+    def test_since_returns_only_new_notifications(self):
+        etag = self.poll()['ETag']
+        second = self.send('Second')
+        data = self.poll(etag, since=self.first.pk).json()
+        self.assertTrue(data['delta'])
+        self.assertEqual([n['id'] for n in data['notifications']], [second.pk])
+        self.assertEqual((data['latest'], data['unread']), (second.pk, 2))
+
+    def test_reading_an_older_notification_forces_a_full_list(self):
+        etag = self.poll()['ETag']
+        second = self.send('Second')
+        notifications.mark_read(self.first)
+        data = self.poll(etag, since=self.first.pk).json()
+        self.assertFalse(data['delta'])
+        self.assertEqual([n['id'] for n in data['notifications']], [second.pk, self.first.pk])
+        self.assertEqual(data['unread'], 1)
+
+
+class NotificationStreamTests(TestCase):
+
+    def setUp(self):
+        self.customer = make_customer()
+        self.key = ('customer', self.customer.pk)
+        self.first = self.send('First')
+        self.cookies = logged_in(customer_id=self.customer.pk, user_type='customer').cookies
+
+    def send(self, title):
+        [notification] = notifications.send([Notification(
+            customerID=self.customer, notificationType='refund_response', title=title, message=title
+        )])
+        return notification
+
+    async def read_events(self, stream, count):
+        """The next count notification/unread events from an SSE stream."""
+        events = []
+        while len(events) < count:
+            chunk = await anext(stream)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith(('id:', 'event:')):
+                events.append(chunk)
+        return events
+
+    async def test_new_stream_starts_after_the_newest_notification(self):
+        client = AsyncClient()
+        client.cookies = self.cookies
+        response = await client.get('/notifications/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        [unread] = await self.read_events(stream, 1)
+        await stream.aclose()
+        self.assertEqual(unread, 'event: unread\ndata: {"unread": 1}\n\n')
+
+    async def test_stream_resumes_after_last_id_and_wakes_on_publish(self):
+        stream = notifications.event_stream(self.key, 0)
+        missed, unread = await self.read_events(stream, 2)
+        self.assertTrue(missed.startswith(f'id: {self.first.pk}\nevent: notification\n'))
+        self.assertIn('"unread": 1', unread)
+
+        second = await sync_to_async(self.send)('Second')
+        notifications.hub.publish([self.key])  # what send() does once its transaction commits
+        new, unread = await self.read_events(stream, 2)
+        await stream.aclose()
+        self.assertTrue(new.startswith(f'id: {second.pk}\nevent: notification\n'))
+        self.assertIn('"unread": 2', unread)
+        self.assertNotIn(self.key, notifications.hub._subscribers)
+
+    def test_wsgi_and_visitors_get_no_content(self):
+        self.assertEqual(Client().get('/notifications/stream/').status_code, 204)
+        self.client.cookies = self.cookies
+        self.assertEqual(self.client.get('/notifications/stream/').status_code, 204)
+
+
+# ======================= OUTBOX =======================
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.received = []
+
+        @outbox.handler('test_topic')
+        def receive(payloads):
+            if any(payload.get('bad') for payload in payloads):
+                raise ValueError('bad payload')
+            self.received += [payload['n'] for payload in payloads]
+
+    def tearDown(self):
+        outbox.HANDLERS.pop('test_topic', None)
+
+    def test_events_commit_with_the_change_and_relay_after_it(self):
+        customer = make_customer()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            outbox.notify([Notification(customerID=customer, notificationType='refund_response', title='x')])
+            raise RuntimeError('change rolled back')
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.notify([Notification(customerID=customer, notificationType='refund_response', title='x')])
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Notification.objects.filter(customerID=customer).count(), 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_bad_event_does_not_hold_back_the_rest(self):
+        outbox.publish('test_topic', [{'n': 1}, {'n': 2, 'bad': True}, {'n': 3}])
+        with self.assertLogs('store.outbox', 'ERROR'):
+            self.assertEqual(outbox.relay(), 2)
+        self.assertEqual(self.received, [1, 3])
+        bad = OutboxEvent.objects.get()
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn('bad payload', bad.lastError)
+
+        with self.assertLogs('store.outbox', 'ERROR'):
+            self.assertEqual(outbox.relay(), 0)
+        self.assertEqual(outbox.relay(), 0)  # out of attempts, so no longer claimed
+        self.assertEqual(OutboxEvent.objects.get().attempts, 2)
+
+
+# ======================= JOBS =======================
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        @jobs.task('test_record')
+        def record(value):
+            self.calls.append(value)
+
+        @jobs.task('test_fail')
+        def fail():
+            raise RuntimeError('boom')
+
+    def tearDown(self):
+        for name in ('test_record', 'test_fail'):
+            jobs.TASKS.pop(name, None)
+
+    def test_dedupe_key_queues_one_job(self):
+        self.assertIsNotNone(jobs.enqueue('test_record', {'value': 1}, dedupe_key='k'))
+        self.assertIsNone(jobs.enqueue('test_record', {'value': 2}, dedupe_key='k'))
+        self.assertEqual(Job.objects.filter(dedupeKey='k').count(), 1)
+
+        job_ids = jobs.claim(10)
+        self.assertEqual(jobs.run(job_ids[0]), 'done')
+        self.assertEqual(self.calls, [1])
+        # Once the first has run, the key is free again
+        self.assertIsNotNone(jobs.enqueue('test_record', {'value': 3}, dedupe_key='k'))
+
+    def test_failed_job_backs_off_then_gives_up(self):
+        job = jobs.enqueue('test_fail', max_attempts=2)
+
+        with self.assertLogs('store.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim(10)[0]), 'queued')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.runAt, timezone.now())
+        self.assertIn('boom', job.lastError)
+        self.assertEqual(jobs.claim(10), [])  # not due yet
+
+        Job.objects.filter(pk=job.pk).update(runAt=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('store.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim(10)[0]), 'failed')
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finishedTime)
+
+
+# ======================= IMAGES =======================
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANT_WIDTHS=(16, 32)))
+        self.vendor, self.product = make_store()
+        self.media = StoreMedia.objects.create(storeID=self.product.storeID, image=self.upload('store_photos/shop.jpg'))
+
+    def upload(self, name):
+        buffer = BytesIO()
+        PILImage.new('RGB', (64, 48), 'red').save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def variant_files(self):
+        return sorted(default_storage.listdir('store_photos/variants')[1])
+
+    def test_pool_and_fallback_job_record_one_set_of_variants(self):
+        pool_copy, job_copy = (StoreMedia.objects.get(pk=self.media.pk) for _ in range(2))
+        source = images._pending(pool_copy)
+        func, args = images._render_call(pool_copy)
+        images._record(pool_copy, source, func(*args))
+        images._record(job_copy, source, func(*args))  # read before the pool's write landed
+
+        self.media.refresh_from_db()
+        self.assertEqual(self.media.variants, pool_copy.variants)
+        self.assertEqual(job_copy.variants, {})
+        recorded = sorted(posixpath.basename(name) for by_width in self.media.variants.values()
+                          for name in by_width.values())
+        self.assertEqual(self.variant_files(), recorded)
+
+    def test_rebuild_replaces_the_old_files(self):
+        images.build_variants(self.media)
+        first = self.variant_files()
+        images.build_variants(self.media)
+        self.assertEqual(len(self.variant_files()), len(first))
+        self.assertEqual(len(first), 4)  # webp and jpeg at two widths
+
+
+    def test_product_page_serves_variants_once_built(self):
+        photo = ProductMedia.objects.create(
+            productID=self.product, mediaURL=self.upload('product_images/cover.jpg'), isPrimary=True
+        )
+        page = self.client.get(f'/products/{self.product.pk}/').content.decode()
+        self.assertIn(f'<img src="{photo.mediaURL.url}"', page)
+        self.assertNotIn('<picture', page)
+
+        images.build_variants(photo)
+        page = self.client.get(f'/products/{self.product.pk}/').content.decode()
+        self.assertIn('<source type="image/webp" srcset="', page)
+        self.assertIn(f'{default_storage.url(photo.variants["webp"]["32"])} 32w', page)
+
+    def test_fallback_job_renders_what_the_pool_did_not(self):
+        with self.captureOnCommitCallbacks(execute=False):  # no pool: the job has to do it
+            images.process_later(self.media)
+            images.process_later(self.media)
+        job = Job.objects.get(name='process_image')
+        self.assertGreater(job.runAt, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(runAt=timezone.now())
+        self.assertEqual(jobs.run(jobs.claim(10)[0]), 'done')
+        self.media.refresh_from_db()
+        self.assertEqual(len(self.variant_files()), 4)
+        self.assertIsNone(images._pending(self.media))
+
+    def test_undecodable_upload_keeps_the_original(self):
+        name = default_storage.save('store_photos/broken.jpg', ContentFile(b'not an image'))
+        broken = StoreMedia.objects.create(storeID=self.product.storeID, image=name)
+        with self.assertLogs('store.images', 'WARNING'):
+            images.process_image(broken._meta.label_lower, broken.pk)
+        broken.refresh_from_db()
+        self.assertEqual(broken.variants, {})
+        self.assertTrue(default_storage.exists(broken.image.name))
+
+
+# ======================= CART =======================
+
+class AnonymousCartMergeTests(TestCase):
+
+    def setUp(self):
+        _, self.product = make_store(stock=3)
+        self.customer = make_customer()
+
+    def login_with_cart(self, lines):
+        client = Client()
+        response = HttpResponse()
+        cart.write_anonymous_cart(response, lines)
+        client.cookies[cart.ANONYMOUS_CART_COOKIE] = response.cookies[cart.ANONYMOUS_CART_COOKIE].value
+        return client.post('/customer/login/', {'email': self.customer.email, 'password': 'secret123'})
+
+    def test_stale_product_is_dropped_and_quantity_capped(self):
+        response = self.login_with_cart({self.product.pk: 10, 999999: 1})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(CartItem.objects.filter(customerID=self.customer).values_list('productID', 'quantity')),
+            [(self.product.pk, 3)]
+        )
+
+    def test_merge_adds_to_existing_line_within_stock(self):
+        cart.add_item(self.customer.pk, self.product.pk, 2)
+        self.assertEqual(cart.merge_anonymous_cart(self.customer.pk, {self.product.pk: 2}), 1)
+        self.assertEqual(CartItem.objects.get(customerID=self.customer).quantity, 3)
+
+    def test_vendor_cannot_add_to_cart(self):
+        client = logged_in(vendor_id=self.product.storeID.vendorID_id, user_type='vendor')
+        response = client.post(f'/cart/add/{self.product.pk}/', {'quantity': 1})
+        self.assertRedirects(response, '/customer/login/', fetch_redirect_response=False)
+        self.assertNotIn(cart.ANONYMOUS_CART_COOKIE, response.cookies)
@@ -21,6 +21,7 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:cart_item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/update/<int:cart_item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart/batch/', views.batch_update_cart, name='batch_update_cart'),
 
     # Orders
     path('checkout/', views.checkout, name='checkout'),
@@ -56,6 +57,8 @@ urlpatterns = [
     path('vendor/promotion/<int:promotion_id>/toggle-status/', views.toggle_promotion_status, name='toggle_promotion_status'),
     path('vendor/orders/', views.vendor_orders, name='vendor_orders'),
     path('vendor/order-item/<int:order_item_id>/update-status/', views.update_order_status, name='update_order_status'),
+    path('vendor/order-items/update-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
+    path('vendor/export/<str:dataset>/', views.vendor_export, name='vendor_export'),
     path('vendor/refund-request/<int:refund_id>/respond/', views.respond_refund, name='respond_refund'),
 
     # Shop Pages
@@ -67,6 +70,7 @@ urlpatterns = [
     # Notifications
     path('notifications/', views.notifications_page, name='notifications_page'),
     path('notifications/json/', views.notifications_json, name='notifications_json'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
 ]
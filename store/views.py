@@ -1,15 +1,21 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q, Avg, Sum, Count
+from django.db.models import Q, Avg, Sum, Count, Prefetch
 from django.views.decorators.http import require_POST, require_GET
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
 from decimal import Decimal
-from io import BytesIO
 from PIL import Image
 import json
+import uuid
 
+from . import cart, exports, images, inventory, notifications, ordering, outbox, sales
+from .middleware import invalidate_identity
 from .models import (
     Customer, Vendor, Store, Product, ProductMedia, CartItem, Order, OrderItem,
     OrderStatus, Review, WishlistItem, Promotion, ClickHistory, StoreMedia, RefundRequest,
@@ -17,38 +23,6 @@ from .models import (
 )
 
 
-def _expire_past_promotions():
-    """Auto-expire promotions whose endDate has passed but status is still 'active'."""
-    Promotion.objects.filter(
-        status='active',
-        endDate__lt=timezone.now()
-    ).update(status='expired')
-
-
-# ======================= HELPERS =======================
-
-REVIEW_PHOTO_SIZE = (800, 800)  # max width × height; aspect ratio preserved
-
-def _resize_review_photo(upload):
-    """Resize an uploaded review photo to fit within REVIEW_PHOTO_SIZE, return InMemoryUploadedFile."""
-    img = Image.open(upload)
-    if img.mode not in ('RGB', 'RGBA'):
-        img = img.convert('RGB')
-    elif img.mode == 'RGBA':
-        bg = Image.new('RGB', img.size, (255, 255, 255))
-        bg.paste(img, mask=img.split()[3])
-        img = bg
-    img.thumbnail(REVIEW_PHOTO_SIZE, Image.LANCZOS)
-    buf = BytesIO()
-    img.save(buf, format='JPEG', quality=85, optimize=True)
-    buf.seek(0)
-    return InMemoryUploadedFile(
-        buf, 'ImageField',
-        upload.name.rsplit('.', 1)[0] + '.jpg',
-        'image/jpeg', buf.getbuffer().nbytes, None
-    )
-
-
 # ======================= AUTHENTICATION VIEWS =======================
 
 def customer_register(request):
@@ -110,7 +84,15 @@ def customer_login(request):
                 request.session['customer_name'] = f"{customer.firstName} {customer.lastName}"
                 request.session['user_type'] = 'customer'
                 messages.success(request, f"Welcome back, {customer.firstName}!")
-                return redirect('product_list')
+
+                # Carry over anything added to the cart before logging in
+                anonymous_lines = cart.read_anonymous_cart(request)
+                if not anonymous_lines:
+                    return redirect('product_list')
+                cart.merge_anonymous_cart(customer.customerID, anonymous_lines)
+                response = redirect('view_cart')
+                cart.write_anonymous_cart(response, {})
+                return response
             else:
                 messages.error(request, "Invalid password.")
         except Customer.DoesNotExist:
@@ -203,7 +185,6 @@ def logout(request):
 
 def home(request):
     """Home page with featured products."""
-    _expire_past_promotions()
     all_products = list(
         Product.objects.filter(availability=True)
         .select_related('storeID')
@@ -235,7 +216,6 @@ def home(request):
 
 def product_list(request):
     """Display all products with search and filtering."""
-    _expire_past_promotions()
     products = Product.objects.filter(availability=True).select_related('storeID').prefetch_related('promotions').annotate(
         avg_rating=Avg('reviews__rating')
     )
@@ -248,14 +228,8 @@ def product_list(request):
             Q(description__icontains=search_query)
         )
         # Log search query for analytics
-        customer = None
-        if 'customer_id' in request.session:
-            try:
-                customer = Customer.objects.get(customerID=request.session['customer_id'])
-            except Customer.DoesNotExist:
-                pass
         SearchQuery.objects.create(
-            customerID=customer,
+            customerID_id=request.customer_id,
             query=search_query,
             resultCount=products.count()
         )
@@ -312,7 +286,6 @@ def product_list(request):
 
 def shop_detail(request, store_id):
     """Public shop page — store info, gallery, and searchable product listing."""
-    _expire_past_promotions()
     store = get_object_or_404(Store, storeID=store_id)
     search_query = request.GET.get('search', '').strip()
 
@@ -328,14 +301,8 @@ def shop_detail(request, store_id):
             Q(description__icontains=search_query)
         )
         # Log search query for analytics
-        customer = None
-        if 'customer_id' in request.session:
-            try:
-                customer = Customer.objects.get(customerID=request.session['customer_id'])
-            except Customer.DoesNotExist:
-                pass
         SearchQuery.objects.create(
-            customerID=customer,
+            customerID_id=request.customer_id,
             query=search_query,
             resultCount=products.count()
         )
@@ -365,17 +332,11 @@ def shop_detail(request, store_id):
 
 def product_detail(request, product_id):
     """Display product details, reviews, and promotions."""
-    _expire_past_promotions()
     product = get_object_or_404(Product, productID=product_id)
 
     # Record click history if customer is logged in
-    if 'customer_id' in request.session:
-        customer_id = request.session['customer_id']
-        try:
-            customer = Customer.objects.get(customerID=customer_id)
-            ClickHistory.objects.create(customerID=customer, productID=product)
-        except Customer.DoesNotExist:
-            pass
+    if request.customer_id:
+        ClickHistory.objects.create(customerID_id=request.customer_id, productID=product)
 
     # Get product media
     media = product.media.all()
@@ -403,19 +364,15 @@ def product_detail(request, product_id):
     # Check if product is in user's wishlist and if customer has purchased the product
     in_wishlist = False
     has_purchased = False
-    if 'customer_id' in request.session:
-        try:
-            customer = Customer.objects.get(customerID=request.session['customer_id'])
-            in_wishlist = WishlistItem.objects.filter(
-                customerID=customer, productID=product
-            ).exists()
-            # Check if customer has purchased this product
-            has_purchased = OrderItem.objects.filter(
-                orderID__customerID=customer,
-                productID=product
-            ).exists()
-        except Customer.DoesNotExist:
-            pass
+    if request.customer_id:
+        in_wishlist = WishlistItem.objects.filter(
+            customerID_id=request.customer_id, productID=product
+        ).exists()
+        # Check if customer has purchased this product
+        has_purchased = OrderItem.objects.filter(
+            orderID__customerID_id=request.customer_id,
+            productID=product
+        ).exists()
 
     context = {
         'product': product,
@@ -436,9 +393,9 @@ def product_detail(request, product_id):
 
 @require_POST
 def add_to_cart(request, product_id):
-    """Add product to cart."""
-    if 'customer_id' not in request.session:
-        messages.error(request, "Please log in to add items to cart.")
+    """Add product to cart (cookie cart for visitors who are not logged in)."""
+    if request.vendor_id and not request.customer_id:
+        messages.error(request, "Please log in as a customer to add items to cart.")
         return redirect('customer_login')
 
     product = get_object_or_404(Product, productID=product_id)
@@ -448,23 +405,22 @@ def add_to_cart(request, product_id):
         messages.error(request, "Invalid quantity.")
         return redirect('product_detail', product_id=product_id)
 
-    if quantity > product.stockQuantity:
-        messages.error(request, f"Only {product.stockQuantity} items available.")
-        return redirect('product_detail', product_id=product_id)
+    if not request.customer_id:
+        lines = cart.read_anonymous_cart(request)
+        if cart.add_anonymous_item(lines, product, quantity):
+            messages.success(request, f"Added {product.productName} to cart.")
+        else:
+            messages.error(request, f"Only {product.available_quantity()} items available.")
+        response = redirect('product_detail', product_id=product_id)
+        cart.write_anonymous_cart(response, lines)
+        return response
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
-        cart_item, created = CartItem.objects.get_or_create(
-            customerID=customer,
-            productID=product,
-            defaults={'quantity': quantity}
-        )
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-
-        messages.success(request, f"Added {product.productName} to cart.")
-    except Customer.DoesNotExist:
+        if cart.add_item(request.customer_id, product.productID, quantity):
+            messages.success(request, f"Added {product.productName} to cart.")
+        else:
+            messages.error(request, f"Only {product.available_quantity()} items available.")
+    except IntegrityError:
         messages.error(request, "User not found.")
 
     return redirect('product_detail', product_id=product_id)
@@ -472,100 +428,126 @@ def add_to_cart(request, product_id):
 
 def view_cart(request):
     """View shopping cart."""
-    if 'customer_id' not in request.session:
-        messages.error(request, "Please log in to view your cart.")
-        return redirect('customer_login')
-
-    try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
-        cart_items = CartItem.objects.filter(customerID=customer).select_related('productID').prefetch_related('productID__promotions')
-        _expire_past_promotions()
-        
-        total_price = Decimal('0.00')
-        for item in cart_items:
-            product = item.productID
-            # Check for active promotion
-            price = product.price
-            has_promo = False
-            for promo in product.promotions.filter(status='active'):
-                if promo.is_active():
-                    discount = promo.get_discount_amount(price)
-                    price -= discount
-                    has_promo = True
-                    break
-            
-            # Add computed subtotal properties
-            item.effective_price = price
-            item.subtotal = product.price * item.quantity
-            item.subtotal_with_promo = price * item.quantity
-            
-            total_price += price * item.quantity
-
-        context = {
-            'cart_items': cart_items,
-            'total_price': total_price,
-        }
-    except Customer.DoesNotExist:
-        context = {'cart_items': [], 'total_price': 0}
+    if request.customer_id:
+        cart_items, total_price = cart.priced_cart_items(request.customer_id)
+    else:
+        cart_items, total_price = cart.priced_anonymous_items(cart.read_anonymous_cart(request))
 
+    context = {
+        'cart_items': cart_items,
+        'total_price': total_price,
+    }
     return render(request, 'store/cart.html', context)
 
 
 @require_POST
 def remove_from_cart(request, cart_item_id):
-    """Remove item from cart."""
-    if 'customer_id' not in request.session:
-        return redirect('customer_login')
-
-    try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
-        cart_item = get_object_or_404(CartItem, pk=cart_item_id, customerID=customer)
-        product_name = cart_item.productID.productName
-        cart_item.delete()
-        messages.success(request, f"Removed {product_name} from cart.")
-    except Customer.DoesNotExist:
-        messages.error(request, "User not found.")
+    """Remove item from cart (for the cookie cart, cart_item_id is the product ID)."""
+    if not request.customer_id:
+        lines = cart.read_anonymous_cart(request)
+        lines.pop(cart_item_id, None)
+        response = redirect('view_cart')
+        cart.write_anonymous_cart(response, lines)
+        return response
+
+    if cart.remove_items(request.customer_id, [cart_item_id]):
+        messages.success(request, "Removed item from cart.")
+    else:
+        messages.error(request, "Cart item not found.")
 
     return redirect('view_cart')
 
 
 @require_POST
 def update_cart_item(request, cart_item_id):
-    """Update quantity of item in cart."""
-    if 'customer_id' not in request.session:
-        return redirect('customer_login')
-
-    try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
-        cart_item = get_object_or_404(CartItem, pk=cart_item_id, customerID=customer)
-        quantity = int(request.POST.get('quantity', 1))
-
-        if quantity < 1:
-            cart_item.delete()
-        elif quantity > cart_item.productID.stockQuantity:
-            messages.error(request, f"Only {cart_item.productID.stockQuantity} items available.")
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-            messages.success(request, "Cart updated.")
+    """Update quantity of item in cart (for the cookie cart, cart_item_id is the product ID)."""
+    quantity = int(request.POST.get('quantity', 1))
+    if not request.customer_id:
+        lines = cart.read_anonymous_cart(request)
+        results = cart.apply_anonymous_batch(lines, {cart_item_id: quantity}, [])
+        if results[0]['status'] == 'insufficient_stock':
+            messages.error(request, "Not enough stock for that quantity.")
+        response = redirect('view_cart')
+        cart.write_anonymous_cart(response, lines)
+        return response
 
-    except Customer.DoesNotExist:
-        messages.error(request, "User not found.")
+    if quantity < 1:
+        cart.remove_items(request.customer_id, [cart_item_id])
+        return redirect('view_cart')
+
+    result = cart.set_quantity(request.customer_id, cart_item_id, quantity)
+    if result == 'updated':
+        messages.success(request, "Cart updated.")
+    elif result == 'insufficient_stock':
+        messages.error(request, "Not enough stock for that quantity.")
+    else:
+        messages.error(request, "Cart item not found.")
 
     return redirect('view_cart')
 
 
+@require_POST
+def batch_update_cart(request):
+    """Apply several cart quantity changes/removals at once and return fresh totals (AJAX).
+
+    Body: {"updates": [{"id": <cart item id>, "quantity": <n>}, ...], "remove": [<cart item id>, ...]}
+    For the cookie cart the IDs are product IDs.
+    """
+    try:
+        payload = json.loads(request.body or '{}')
+        updates = {int(u['id']): int(u['quantity']) for u in payload.get('updates', [])}
+        removals = [int(i) for i in payload.get('remove', [])]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+
+    if request.customer_id:
+        results = cart.apply_batch(request.customer_id, updates, removals)
+        cart_items, total_price = cart.priced_cart_items(request.customer_id)
+    else:
+        lines = cart.read_anonymous_cart(request)
+        results = cart.apply_anonymous_batch(lines, updates, removals)
+        cart_items, total_price = cart.priced_anonymous_items(lines)
+
+    response = JsonResponse({
+        'success': True,
+        'results': results,
+        'items': [
+            {
+                'id': item.pk,
+                'quantity': item.quantity,
+                'effective_price': str(item.effective_price),
+                'subtotal': str(item.subtotal_with_promo),
+            }
+            for item in cart_items
+        ],
+        'total': str(total_price),
+        'count': len(cart_items),
+    })
+    if not request.customer_id:
+        cart.write_anonymous_cart(response, lines)
+    return response
+
+
 # ======================= ORDER VIEWS =======================
 
 def checkout(request):
     """Checkout page — only selected cart items are checked out."""
-    _expire_past_promotions()
     if 'customer_id' not in request.session:
         messages.error(request, "Please log in to checkout.")
         return redirect('customer_login')
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
+
+        # A resubmitted checkout (double click, proxy retry) returns the
+        # order its key already produced without touching the cart or stock
+        idempotency_key = ordering.clean_idempotency_key(
+            request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        )
+        if request.method == 'POST':
+            previous = ordering.find_checkout(request.customer_id, idempotency_key)
+            if previous:
+                return _redirect_to_checked_out_order(request, previous.orderID_id)
 
         # Get selected item IDs from query string (GET) or form (POST)
         selected_ids = request.GET.getlist('items') or request.POST.getlist('items')
@@ -575,33 +557,20 @@ def checkout(request):
             messages.error(request, "No items selected for checkout.")
             return redirect('view_cart')
 
-        cart_items = CartItem.objects.filter(
-            customerID=customer, pk__in=selected_ids
-        ).select_related('productID').prefetch_related('productID__promotions')
+        cart_items, total_amount = cart.priced_cart_items(customer.customerID, selected_ids)
 
-        if not cart_items.exists():
+        if not cart_items:
             messages.error(request, "Selected items not found in your cart.")
             return redirect('view_cart')
 
-        # Calculate total
-        total_amount = Decimal('0.00')
-        order_data = []
-        for item in cart_items:
-            product = item.productID
-            price = product.price
-            # Apply promotion if available
-            for promo in product.promotions.filter(status='active'):
-                if promo.is_active():
-                    discount = promo.get_discount_amount(price)
-                    price -= discount
-                    break
-            subtotal = price * item.quantity
-            total_amount += subtotal
-            order_data.append({
+        order_data = [
+            {
                 'cart_item': item,
-                'final_price': price,
-                'subtotal': subtotal
-            })
+                'final_price': item.effective_price,
+                'subtotal': item.subtotal_with_promo
+            }
+            for item in cart_items
+        ]
 
         if request.method == 'POST':
             shipping_address = request.POST.get('shipping_address', '').strip()
@@ -612,59 +581,38 @@ def checkout(request):
                     'total_amount': total_amount,
                     'customer': customer,
                     'selected_ids': selected_ids,
+                    'idempotency_key': idempotency_key or uuid.uuid4().hex,
                 })
 
-            # Create order
-            order = Order.objects.create(
-                customerID=customer,
-                shippingAddress=shipping_address,
-                totalAmount=total_amount
-            )
-
-            # Create order items
-            for data in order_data:
-                item = data['cart_item']
-                OrderItem.objects.create(
-                    orderID=order,
-                    productID=item.productID,
-                    quantity=item.quantity,
-                    paidPrice=data['final_price']
-                )
-                # Create initial status
-                order_item = OrderItem.objects.filter(orderID=order, productID=item.productID).last()
-                OrderStatus.objects.create(
-                    orderItemID=order_item,
-                    status='Processing'
+            try:
+                order, created = ordering.place_order(
+                    customer, cart_items, shipping_address, idempotency_key=idempotency_key
                 )
-                # Reduce stock
-                item.productID.stockQuantity -= item.quantity
-                item.productID.save()
-
-            # Only delete the checked-out items from cart; unselected items remain
-            cart_items.delete()
-
-            # Notify vendors about the new order
-            vendor_ids_seen = set()
-            for data in order_data:
-                vid = data['cart_item'].productID.storeID.vendorID_id
-                if vid not in vendor_ids_seen:
-                    vendor_ids_seen.add(vid)
-                    Notification.objects.create(
-                        vendorID_id=vid,
-                        notificationType='new_order',
-                        title='New Order Received',
-                        message=f'Order #{order.orderID} has been placed by {customer.firstName} {customer.lastName}.',
-                        link=f'/vendor/orders/'
-                    )
+            except ordering.OutOfStockError as e:
+                messages.error(request, f"Sorry, not enough stock left for: {', '.join(e.product_names)}.")
+                return redirect('view_cart')
+            if not created:
+                return _redirect_to_checked_out_order(request, order.orderID if order else None)
 
             messages.success(request, f"Order created successfully! Order ID: {order.orderID}")
             return redirect('order_detail', order_id=order.orderID)
 
+        # Hold the stock while the customer fills in the form
+        short = inventory.reserve(
+            customer.customerID, {item.productID_id: item.quantity for item in cart_items}
+        )
+        if short:
+            names = ', '.join(item.productID.productName for item in cart_items if item.productID_id in short)
+            messages.error(request, f"Sorry, not enough stock available for: {names}.")
+            return redirect('view_cart')
+
         context = {
             'cart_items': order_data,
             'total_amount': total_amount,
             'customer': customer,
             'selected_ids': selected_ids,
+            'idempotency_key': uuid.uuid4().hex,
+            'reserved_minutes': int(inventory.reservation_ttl().total_seconds() // 60),
         }
         return render(request, 'store/checkout.html', context)
 
@@ -673,29 +621,13 @@ def checkout(request):
         return redirect('customer_login')
 
 
-def _get_order_aggregate_status(order):
-    """Compute an aggregate display status for an order with multiple items.
-    If ALL items share the same status, show that status.
-    If ALL items are Cancelled, show Cancelled.
-    If items have different non-cancelled statuses, show Mixed.
-    """
-    statuses = set()
-    all_cancelled = True
-    for item in order.items.all():
-        latest = item.statuses.order_by('-updatedDate').first()
-        if not latest:
-            continue
-        s = latest.status
-        if s != 'Cancelled':
-            all_cancelled = False
-            statuses.add(s)
-    if all_cancelled:
-        return 'Cancelled'
-    if len(statuses) == 1:
-        return statuses.pop()
-    if len(statuses) > 1:
-        return 'Mixed'
-    return 'Processing'
+def _redirect_to_checked_out_order(request, order_id):
+    """Send a repeated checkout submission to the order it already placed."""
+    if order_id is None:
+        messages.info(request, "This checkout was already submitted.")
+        return redirect('order_history')
+    messages.info(request, f"Your order was already placed. Order ID: {order_id}")
+    return redirect('order_detail', order_id=order_id)
 
 
 def order_detail(request, order_id):
@@ -705,26 +637,25 @@ def order_detail(request, order_id):
         return redirect('customer_login')
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         order = get_object_or_404(Order, orderID=order_id, customerID=customer)
-        order_items = order.items.all().prefetch_related('statuses', 'refund_requests')
+        order_items = order.items.all().prefetch_related(
+            Prefetch('statuses', queryset=OrderStatus.objects.order_by('updatedDate', 'statusID')),
+            Prefetch('refund_requests', queryset=RefundRequest.objects.filter(status='pending'),
+                     to_attr='pending_refunds'),
+        )
         
         # Add subtotal and cancellable flag to each order item
         for item in order_items:
             item.subtotal = item.paidPrice * item.quantity
-            latest_status = item.statuses.order_by('-updatedDate').first()
-            item.latest_status_obj = latest_status
             # Item can be cancelled if status is Processing or Holding
-            item.can_cancel = latest_status and latest_status.status in ['Processing', 'Holding']
+            item.can_cancel = item.currentStatus in ['Processing', 'Holding']
             # Item can request refund if Shipping or Completed
-            item.can_request_refund = latest_status and latest_status.status in ['Shipping', 'Completed']
+            item.can_request_refund = item.currentStatus in ['Shipping', 'Completed']
             # Check for existing pending refund
-            item.has_pending_refund = item.refund_requests.filter(status='pending').exists()
+            item.has_pending_refund = bool(item.pending_refunds)
             # Full status history for timeline
-            item.status_history = item.statuses.order_by('updatedDate')
-
-        # Aggregate order-level status
-        order.aggregate_status = _get_order_aggregate_status(order)
+            item.status_history = item.statuses.all()
 
         context = {
             'order': order,
@@ -742,36 +673,27 @@ def order_history(request):
         messages.error(request, "Please log in.")
         return redirect('customer_login')
 
-    try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
-        orders = list(
-            customer.orders.all()
-            .prefetch_related('items__statuses')
-            .order_by('-orderDate')
-        )
+    # Status is stored on the order, so filtering and paging happen in SQL
+    orders = Order.objects.filter(customerID_id=request.customer_id).annotate(
+        item_count=Count('items')
+    ).order_by('-orderDate', '-orderID')
 
-        # Compute aggregate status for each order
-        for order in orders:
-            order.aggregate_status = _get_order_aggregate_status(order)
+    # Filter by status if provided
+    status_filter = request.GET.get('status', '').strip()
+    if status_filter:
+        orders = orders.filter(aggregateStatus=status_filter)
 
-        # Filter by status if provided
-        status_filter = request.GET.get('status', '').strip()
-        if status_filter:
-            orders = [o for o in orders if o.aggregate_status == status_filter]
-        
-        # Get available status choices for the filter dropdown
-        from store.models import OrderStatus
-        status_choices = list(OrderStatus.STATUS_CHOICES) + [('Mixed', 'Mixed')]
+    from django.core.paginator import Paginator
+    paginator = Paginator(orders, 10)  # 10 orders per page
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-        context = {
-            'orders': orders,
-            'status_choices': status_choices,
-            'current_status': status_filter
-        }
-        return render(request, 'store/order_history.html', context)
-    except Customer.DoesNotExist:
-        messages.error(request, "User not found.")
-        return redirect('customer_login')
+    context = {
+        'orders': page_obj,
+        'page_obj': page_obj,
+        'status_choices': Order.STATUS_CHOICES,
+        'current_status': status_filter
+    }
+    return render(request, 'store/order_history.html', context)
 
 
 @require_POST
@@ -781,40 +703,37 @@ def cancel_order_item(request, order_item_id):
         return JsonResponse({'error': 'Please log in'}, status=401)
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         order_item = get_object_or_404(
             OrderItem,
             orderItemID=order_item_id,
             orderID__customerID=customer
         )
         
-        # Check current status
-        latest_status = order_item.statuses.last()
-        if not latest_status:
-            return JsonResponse({'error': 'Order item has no status'}, status=400)
-        
-        # Can only cancel if status is Processing or Holding
-        if latest_status.status not in ['Processing', 'Holding']:
-            return JsonResponse({
-                'error': f'Cannot cancel item with status: {latest_status.status}'
-            }, status=400)
-        
-        # Create new Cancelled status
-        cancelled_status = OrderStatus.objects.create(
-            orderItemID=order_item,
-            status='Cancelled'
-        )
-        
-        # Create cancellation record
-        CancelledItem.objects.create(
-            statusID=cancelled_status,
-            cancelledReason='customer_request'
-        )
-        
-        # Restore product stock
-        product = order_item.productID
-        product.stockQuantity += order_item.quantity
-        product.save()
+        with transaction.atomic():
+            # Can only cancel if status is Processing or Holding; checked
+            # together with the change so a double click cancels once
+            cancelled = ordering.record_status(
+                [order_item], 'Cancelled', from_statuses=['Processing', 'Holding']
+            )
+            if not cancelled:
+                order_item.refresh_from_db(fields=['currentStatus'])
+                return JsonResponse({
+                    'error': f'Cannot cancel item with status: {order_item.currentStatus}'
+                }, status=400)
+
+            # Create cancellation record
+            CancelledItem.objects.create(
+                statusID=cancelled[0],
+                cancelledReason='customer_request'
+            )
+            sales.record_cancellation([order_item])
+
+            # Restore product stock
+            inventory.change_stock(
+                {order_item.productID_id: order_item.quantity},
+                'cancellation', f'order_item:{order_item.orderItemID}'
+            )
         
         return JsonResponse({
             'success': True,
@@ -836,15 +755,14 @@ def request_refund(request, order_item_id):
         return JsonResponse({'error': 'Please log in'}, status=401)
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         order_item = get_object_or_404(
             OrderItem,
             orderItemID=order_item_id,
             orderID__customerID=customer
         )
 
-        latest_status = order_item.statuses.last()
-        if not latest_status or latest_status.status not in ['Shipping', 'Completed']:
+        if order_item.currentStatus not in ['Shipping', 'Completed']:
             return JsonResponse({'error': 'Refund can only be requested for shipped or completed items'}, status=400)
 
         if order_item.refund_requests.filter(status='pending').exists():
@@ -854,17 +772,17 @@ def request_refund(request, order_item_id):
         if not reason:
             return JsonResponse({'error': 'Please provide a reason'}, status=400)
 
-        RefundRequest.objects.create(orderItemID=order_item, reason=reason)
+        with transaction.atomic():
+            RefundRequest.objects.create(orderItemID=order_item, reason=reason)
 
-        # Notify the vendor about the refund request
-        vendor = order_item.productID.storeID.vendorID
-        Notification.objects.create(
-            vendorID=vendor,
-            notificationType='refund_request',
-            title='Refund Request Received',
-            message=f'{customer.firstName} {customer.lastName} requested a refund for "{order_item.productID.productName}".',
-            link='/vendor/orders/'
-        )
+            # Notify the vendor about the refund request
+            outbox.notify([Notification(
+                vendorID_id=order_item.productID.storeID.vendorID_id,
+                notificationType='refund_request',
+                title='Refund Request Received',
+                message=f'{customer.firstName} {customer.lastName} requested a refund for "{order_item.productID.productName}".',
+                link='/vendor/orders/'
+            )])
 
         return JsonResponse({'success': True, 'message': 'Refund request submitted successfully'})
     except Customer.DoesNotExist:
@@ -880,7 +798,7 @@ def add_review(request, product_id):
 
     product = get_object_or_404(Product, productID=product_id)
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         
         # Check if customer has purchased this product
         has_purchased = OrderItem.objects.filter(
@@ -900,13 +818,23 @@ def add_review(request, product_id):
         photo = request.FILES.get('photo')
         kwargs = {'rating': rating, 'comment': comment}
         if photo:
-            kwargs['photo'] = _resize_review_photo(photo)
-
-        review = Review.objects.create(
-            customerID=customer,
-            productID=product,
-            **kwargs
-        )
+            # Only the header is read here; resizing happens in the image pool
+            try:
+                Image.open(photo)
+            except (OSError, Image.DecompressionBombError):
+                return JsonResponse({'error': 'Please upload a valid image'}, status=400)
+            photo.seek(0)
+            kwargs['photo'] = photo
+            kwargs['photoPending'] = True
+
+        with transaction.atomic():
+            review = Review.objects.create(
+                customerID=customer,
+                productID=product,
+                **kwargs
+            )
+            if photo:
+                images.process_later(review)
 
         return JsonResponse({
             'success': True,
@@ -923,7 +851,7 @@ def delete_review(request, review_id):
     if 'customer_id' not in request.session:
         return JsonResponse({'error': 'Please log in'}, status=401)
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         review = get_object_or_404(Review, reviewID=review_id, customerID=customer)
         # Remove stored photo file from disk
         if review.photo:
@@ -947,7 +875,7 @@ def toggle_wishlist(request, product_id):
 
     product = get_object_or_404(Product, productID=product_id)
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
 
         # Check for active promotion
         active_promo = None
@@ -992,13 +920,12 @@ def toggle_wishlist(request, product_id):
 
 def view_wishlist(request):
     """View customer's wishlist."""
-    _expire_past_promotions()
     if 'customer_id' not in request.session:
         messages.error(request, "Please log in to view your wishlist.")
         return redirect('customer_login')
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         wishlist_items = list(
             customer.wishlist_items.all()
             .select_related('productID')
@@ -1041,7 +968,7 @@ def view_click_history(request):
         return redirect('customer_login')
 
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        customer = request.customer
         # Get click history ordered by most recent first, deduplicated per product
         all_history = customer.click_history.all().select_related('productID').order_by('-viewedDate')
         seen = set()
@@ -1064,7 +991,8 @@ def customer_profile(request):
         messages.error(request, "Please log in to view your profile.")
         return redirect('customer_login')
     try:
-        customer = Customer.objects.get(customerID=request.session['customer_id'])
+        # Edits are saved over a fresh row rather than the cached identity
+        customer = Customer.objects.get(customerID=request.customer_id)
     except Customer.DoesNotExist:
         messages.error(request, "User not found.")
         return redirect('customer_login')
@@ -1094,8 +1022,10 @@ def customer_profile(request):
         customer.lastName = last_name
         customer.phoneNumber = phone
         customer.shippingAddress = shipping_address
-        customer.save()
+        # Only the edited columns; unreadNotifications is maintained elsewhere
+        customer.save(update_fields=['firstName', 'lastName', 'phoneNumber', 'shippingAddress', 'password'])
 
+        invalidate_identity('customer', customer.customerID)
         request.session['customer_name'] = f"{first_name} {last_name}"
         messages.success(request, 'Profile updated successfully!')
         return redirect('customer_profile')
@@ -1112,8 +1042,8 @@ def vendor_dashboard(request):
         return redirect('vendor_login')
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        store = vendor.store
+        vendor = request.vendor
+        store = request.store
         products = store.products.all().annotate(
             wishlist_count=Count('wishlistitem')
         )
@@ -1131,18 +1061,8 @@ def vendor_dashboard(request):
                     Q(description__icontains=vendor_search)
                 )
         
-        # Calculate total sales from orders (excluding cancelled items)
-        from django.db.models import F
-        order_items = OrderItem.objects.filter(
-            productID__storeID=store
-        ).prefetch_related('statuses')
-        
-        total_sales = Decimal('0.00')
-        for item in order_items:
-            latest_status = item.statuses.last()
-            # Only count non-cancelled items
-            if latest_status and latest_status.status != 'Cancelled':
-                total_sales += item.paidPrice * item.quantity
+        # Sales totals and the last 30 days, read from the daily roll-up
+        sales_totals, sales_series = sales.sales_summary(store, days=30)
 
         # Product insights: most wishlisted products
         top_wishlisted = store.products.annotate(
@@ -1171,7 +1091,10 @@ def vendor_dashboard(request):
             'store': store,
             'products': products,
             'total_products': store.products.count(),
-            'total_sales': total_sales,
+            'total_sales': sales_totals['net'],
+            'sales_totals': sales_totals,
+            'sales_series': sales_series,
+            'sales_chart_max': max(point['net'] for point in sales_series),
             'shop_photos': store.shop_photos.all(),
             'vendor_search': vendor_search,
             'top_wishlisted': top_wishlisted,
@@ -1190,7 +1113,7 @@ def upload_vendor_profile(request):
     if 'vendor_id' not in request.session:
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
+        vendor = Vendor.objects.get(vendorID=request.vendor_id)
         image = request.FILES.get('profile_image')
         if not image:
             return JsonResponse({'error': 'No image provided'}, status=400)
@@ -1201,8 +1124,13 @@ def upload_vendor_profile(request):
                     os.remove(vendor.profileImage.path)
             except Exception:
                 pass
+        images.delete_variants(vendor.profileImageVariants)
         vendor.profileImage = image
-        vendor.save()
+        vendor.profileImageVariants = {}
+        with transaction.atomic():
+            vendor.save(update_fields=['profileImage', 'profileImageVariants'])
+            images.process_later(vendor)
+        invalidate_identity('vendor', vendor.vendorID)
         return JsonResponse({'success': True, 'url': vendor.profileImage.url})
     except Vendor.DoesNotExist:
         return JsonResponse({'error': 'Vendor not found'}, status=404)
@@ -1214,13 +1142,14 @@ def upload_store_photo(request):
     if 'vendor_id' not in request.session:
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        store = vendor.store
+        store = request.store
         image = request.FILES.get('photo')
         caption = request.POST.get('caption', '').strip()
         if not image:
             return JsonResponse({'error': 'No image provided'}, status=400)
-        photo = StoreMedia.objects.create(storeID=store, image=image, caption=caption)
+        with transaction.atomic():
+            photo = StoreMedia.objects.create(storeID=store, image=image, caption=caption)
+            images.process_later(photo)
         return JsonResponse({'success': True, 'id': photo.storeMediaID, 'url': photo.image.url, 'caption': photo.caption})
     except Vendor.DoesNotExist:
         return JsonResponse({'error': 'Vendor not found'}, status=404)
@@ -1232,14 +1161,14 @@ def delete_store_photo(request, photo_id):
     if 'vendor_id' not in request.session:
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        photo = get_object_or_404(StoreMedia, storeMediaID=photo_id, storeID=vendor.store)
+        photo = get_object_or_404(StoreMedia, storeMediaID=photo_id, storeID=request.store)
         try:
             import os
             if os.path.isfile(photo.image.path):
                 os.remove(photo.image.path)
         except Exception:
             pass
+        images.delete_variants(photo.variants)
         photo.delete()
         return JsonResponse({'success': True})
     except Vendor.DoesNotExist:
@@ -1253,8 +1182,7 @@ def add_product(request):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        store = vendor.store
+        store = request.store
 
         product_name = request.POST.get('productName', '').strip()
         description = request.POST.get('description', '').strip()
@@ -1264,14 +1192,18 @@ def add_product(request):
         if not product_name or not price or not stock:
             return JsonResponse({'error': 'All fields are required'}, status=400)
 
-        product = Product.objects.create(
-            storeID=store,
-            productName=product_name,
-            description=description,
-            price=Decimal(price),
-            stockQuantity=int(stock),
-            availability=True
-        )
+        with transaction.atomic():
+            product = Product.objects.create(
+                storeID=store,
+                productName=product_name,
+                description=description,
+                price=Decimal(price),
+                stockQuantity=int(stock),
+                availability=True
+            )
+            inventory.log_movements(
+                {product.productID: product.stockQuantity}, 'opening', f'vendor:{request.vendor_id}'
+            )
 
         return JsonResponse({
             'success': True,
@@ -1286,21 +1218,23 @@ def add_product(request):
 
 def edit_product(request, product_id):
     """Edit product details (vendor only)."""
-    _expire_past_promotions()
     if 'vendor_id' not in request.session:
         messages.error(request, "Please log in as a vendor.")
         return redirect('vendor_login')
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        product = get_object_or_404(Product, productID=product_id, storeID=vendor.store)
+        product = get_object_or_404(Product, productID=product_id, storeID=request.store)
 
         if request.method == 'POST':
             product.productName = request.POST.get('productName', product.productName)
             product.description = request.POST.get('description', product.description)
             product.price = Decimal(request.POST.get('price', product.price))
-            product.stockQuantity = int(request.POST.get('stockQuantity', product.stockQuantity))
-            product.save()
+            stock = int(request.POST.get('stockQuantity', product.stockQuantity))
+            with transaction.atomic():
+                # Stock is written separately so a concurrent sale is not overwritten
+                product.save(update_fields=['productName', 'description', 'price', 'updatedTime'])
+                if stock != product.stockQuantity:
+                    inventory.set_stock(product.productID, stock, reference=f'vendor:{request.vendor_id}')
 
             messages.success(request, "Product updated successfully!")
             return redirect('vendor_dashboard')
@@ -1331,8 +1265,7 @@ def upload_product_image(request, product_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        product = get_object_or_404(Product, productID=product_id, storeID=vendor.store)
+        product = get_object_or_404(Product, productID=product_id, storeID=request.store)
 
         if 'image' not in request.FILES:
             return JsonResponse({'error': 'No image provided'}, status=400)
@@ -1343,12 +1276,14 @@ def upload_product_image(request, product_id):
         if is_primary:
             product.media.filter(isPrimary=True).update(isPrimary=False)
 
-        media = ProductMedia.objects.create(
-            productID=product,
-            mediaURL=request.FILES['image'],
-            isPrimary=is_primary,
-            sortedOrder=product.media.count()
-        )
+        with transaction.atomic():
+            media = ProductMedia.objects.create(
+                productID=product,
+                mediaURL=request.FILES['image'],
+                isPrimary=is_primary,
+                sortedOrder=product.media.count()
+            )
+            images.process_later(media)
 
         return JsonResponse({
             'success': True,
@@ -1368,11 +1303,10 @@ def set_primary_image(request, media_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
         media = get_object_or_404(
             ProductMedia,
             mediaID=media_id,
-            productID__storeID=vendor.store
+            productID__storeID=request.store
         )
         
         # Unset all other primary images for this product
@@ -1399,14 +1333,14 @@ def delete_product_image(request, media_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
         media = get_object_or_404(
             ProductMedia,
             mediaID=media_id,
-            productID__storeID=vendor.store
+            productID__storeID=request.store
         )
         
-        # Delete the image file and database record
+        # Delete the image files and database record
+        images.delete_variants(media.variants)
         media.mediaURL.delete()
         media.delete()
         
@@ -1427,12 +1361,11 @@ def toggle_product_availability(request, product_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        product = get_object_or_404(Product, productID=product_id, storeID=vendor.store)
+        product = get_object_or_404(Product, productID=product_id, storeID=request.store)
         
-        # Toggle availability
+        # Toggle availability; a narrow save so concurrent stock changes aren't overwritten
         product.availability = not product.availability
-        product.save()
+        product.save(update_fields=['availability', 'updatedTime'])
         
         status_text = 'enabled' if product.availability else 'disabled'
         
@@ -1456,8 +1389,7 @@ def add_promotion(request, product_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        product = get_object_or_404(Product, productID=product_id, storeID=vendor.store)
+        product = get_object_or_404(Product, productID=product_id, storeID=request.store)
         
         discount_rate = request.POST.get('discount_rate', '').strip()
         start_date = request.POST.get('start_date', '').strip()
@@ -1495,23 +1427,15 @@ def add_promotion(request, product_id):
             status='active'
         )
 
-        # If promotion is already active, notify wishlist customers
+        # If promotion is already active, notify wishlist customers (one broadcast row)
         if promotion.is_active():
-            wishlist_customer_ids = WishlistItem.objects.filter(
-                productID=product
-            ).values_list('customerID_id', flat=True)
-            notifications = [
-                Notification(
-                    customerID_id=cid,
-                    notificationType='wishlist_promo',
-                    title='Wishlist Item On Sale!',
-                    message=f'"{product.productName}" is now {discount_rate}% off!',
-                    link=f'/products/{product.productID}/'
-                )
-                for cid in wishlist_customer_ids
-            ]
-            if notifications:
-                Notification.objects.bulk_create(notifications)
+            notifications.broadcast(
+                product,
+                title='Wishlist Item On Sale!',
+                message=f'"{product.productName}" is now {discount_rate}% off!',
+                link=f'/products/{product.productID}/',
+                promotion=promotion,
+            )
 
         return JsonResponse({
             'success': True,
@@ -1531,11 +1455,10 @@ def delete_promotion(request, promotion_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
         promotion = get_object_or_404(
             Promotion,
             promotionID=promotion_id,
-            productID__storeID=vendor.store
+            productID__storeID=request.store
         )
         
         promotion.delete()
@@ -1557,11 +1480,10 @@ def toggle_promotion_status(request, promotion_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
         promotion = get_object_or_404(
             Promotion,
             promotionID=promotion_id,
-            productID__storeID=vendor.store
+            productID__storeID=request.store
         )
         
         # Toggle between active and inactive
@@ -1571,21 +1493,13 @@ def toggle_promotion_status(request, promotion_id):
         # If promotion just became active, notify customers who have this product wishlisted
         if promotion.status == 'active' and promotion.is_active():
             product = promotion.productID
-            wishlist_customer_ids = WishlistItem.objects.filter(
-                productID=product
-            ).values_list('customerID_id', flat=True)
-            notifications = [
-                Notification(
-                    customerID_id=cid,
-                    notificationType='wishlist_promo',
-                    title='Wishlist Item On Sale!',
-                    message=f'"{product.productName}" is now {promotion.discountRate}% off!',
-                    link=f'/products/{product.productID}/'
-                )
-                for cid in wishlist_customer_ids
-            ]
-            if notifications:
-                Notification.objects.bulk_create(notifications)
+            notifications.broadcast(
+                product,
+                title='Wishlist Item On Sale!',
+                message=f'"{product.productName}" is now {promotion.discountRate}% off!',
+                link=f'/products/{product.productID}/',
+                promotion=promotion,
+            )
 
         return JsonResponse({
             'success': True,
@@ -1605,9 +1519,8 @@ def respond_refund(request, refund_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
         refund = get_object_or_404(RefundRequest, refundRequestID=refund_id,
-                                   orderItemID__productID__storeID=vendor.store)
+                                   orderItemID__productID__storeID=request.store)
         action = request.POST.get('action')
         if action not in ['approve', 'reject']:
             return JsonResponse({'error': 'Invalid action'}, status=400)
@@ -1616,29 +1529,42 @@ def respond_refund(request, refund_id):
         refund.status = 'approved' if action == 'approve' else 'rejected'
         refund.vendorNote = vendor_note
         refund.responseDate = timezone.now()
-        refund.save()
-
-        if action == 'approve':
-            order_item = refund.orderItemID
-            OrderStatus.objects.create(orderItemID=order_item, status='Cancelled')
-            product = order_item.productID
-            product.stockQuantity += order_item.quantity
-            product.save()
-            message = 'Refund approved and item cancelled'
-        else:
-            message = 'Refund request rejected'
-
-        # Notify the customer about the refund decision
-        customer = refund.orderItemID.orderID.customerID
-        status_word = 'approved' if action == 'approve' else 'rejected'
-        note_text = f' Note: "{vendor_note}"' if vendor_note else ''
-        Notification.objects.create(
-            customerID=customer,
-            notificationType='refund_response',
-            title=f'Refund {status_word.title()}',
-            message=f'Your refund request for "{refund.orderItemID.productID.productName}" has been {status_word}.{note_text}',
-            link=f'/orders/{refund.orderItemID.orderID.orderID}/'
-        )
+        with transaction.atomic():
+            # Claim the request: only the response that moves it out of
+            # pending restocks, cancels and records the refund
+            claimed = RefundRequest.objects.filter(pk=refund.pk, status='pending').update(
+                status=refund.status, vendorNote=vendor_note, responseDate=refund.responseDate
+            )
+            if not claimed:
+                return JsonResponse({'error': 'This refund request has already been answered'}, status=400)
+
+            if action == 'approve':
+                order_item = refund.orderItemID
+                # An item cancelled since the request was made has already
+                # been restocked and taken off sales; approving would count it twice
+                editable = [choice for choice, _ in OrderItem.STATUS_CHOICES if choice != 'Cancelled']
+                if not ordering.record_status([order_item], 'Cancelled', from_statuses=editable):
+                    transaction.set_rollback(True)
+                    return JsonResponse({'error': 'This item has already been cancelled'}, status=400)
+                inventory.change_stock(
+                    {order_item.productID_id: order_item.quantity},
+                    'refund', f'refund:{refund.refundRequestID}'
+                )
+                sales.record_refund([order_item], refund.responseDate)
+                message = 'Refund approved and item cancelled'
+            else:
+                message = 'Refund request rejected'
+
+            # Notify the customer about the refund decision
+            status_word = 'approved' if action == 'approve' else 'rejected'
+            note_text = f' Note: "{vendor_note}"' if vendor_note else ''
+            outbox.notify([Notification(
+                customerID_id=refund.orderItemID.orderID.customerID_id,
+                notificationType='refund_response',
+                title=f'Refund {status_word.title()}',
+                message=f'Your refund request for "{refund.orderItemID.productID.productName}" has been {status_word}.{note_text}',
+                link=f'/orders/{refund.orderItemID.orderID.orderID}/'
+            )])
 
         return JsonResponse({'success': True, 'message': message})
     except Vendor.DoesNotExist:
@@ -1649,6 +1575,21 @@ def respond_refund(request, refund_id):
 
 # ======================= VENDOR ORDER MANAGEMENT =======================
 
+def _parse_day(value):
+    """Parse a YYYY-MM-DD query parameter; None if missing or invalid."""
+    try:
+        return parse_date(value.strip())
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    """Aware datetime for midnight at the start of a date (None passes through)."""
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
 def vendor_orders(request):
     """View all orders containing vendor's products."""
     if 'vendor_id' not in request.session:
@@ -1656,44 +1597,65 @@ def vendor_orders(request):
         return redirect('vendor_login')
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        store = vendor.store
-        
-        # Get all order items for products in this vendor's store
-        order_items = OrderItem.objects.filter(
-            productID__storeID=store
-        ).select_related(
-            'orderID', 'orderID__customerID', 'productID'
-        ).prefetch_related('statuses').order_by('-orderID__orderDate')
-        
-        # Group order items by order for better display
-        orders_dict = {}
-        for item in order_items:
-            order = item.orderID
-            if order.orderID not in orders_dict:
-                orders_dict[order.orderID] = {
-                    'order': order,
-                    'items': []
-                }
-            # Add latest status to item
-            item.latest_status = item.statuses.last()
-            # Vendors cannot update status if item is cancelled by customer
-            item.can_update_status = item.latest_status.status != 'Cancelled' if item.latest_status else True
-            # Computed subtotal for display
-            item.subtotal = item.paidPrice * item.quantity
-            # Pending refund request from customer
-            item.pending_refund = item.refund_requests.filter(status='pending').first()
-            orders_dict[order.orderID]['items'].append(item)
-        
-        # Convert to list and sort by order date
-        orders_data = sorted(orders_dict.values(), 
-                           key=lambda x: x['order'].orderDate, 
-                           reverse=True)
-        
+        vendor = request.vendor
+        store = request.store
+
+        # Filters (all applied in SQL)
+        status_filter = request.GET.get('status', '').strip()
+        if status_filter not in dict(OrderItem.STATUS_CHOICES):
+            status_filter = ''
+        date_from = _parse_day(request.GET.get('date_from', ''))
+        date_to = _parse_day(request.GET.get('date_to', ''))
+        pending_only = request.GET.get('pending_refund') == '1'
+
+        # Keyset cursor "<orderDate ISO>_<orderID>" from the previous page
+        before = None
+        cursor = request.GET.get('before', '')
+        if cursor:
+            try:
+                cursor_date, cursor_id = cursor.rsplit('_', 1)
+                before = (datetime.fromisoformat(cursor_date), int(cursor_id))
+            except ValueError:
+                before = None
+
+        orders_data, next_cursor = ordering.vendor_order_page(
+            store,
+            status=status_filter,
+            date_from=_start_of_day(date_from),
+            date_to=_start_of_day(date_to + timedelta(days=1)) if date_to else None,
+            pending_refund=pending_only,
+            before=before,
+        )
+        for order_data in orders_data:
+            for item in order_data['items']:
+                # Vendors cannot update status if item is cancelled by customer
+                item.can_update_status = item.currentStatus != 'Cancelled'
+                # Computed subtotal for display
+                item.subtotal = item.paidPrice * item.quantity
+
+        next_query = None
+        if next_cursor:
+            params = request.GET.copy()
+            params['before'] = f'{next_cursor[0].isoformat()}_{next_cursor[1]}'
+            next_query = params.urlencode()
+        first_query = None
+        if cursor:
+            params = request.GET.copy()
+            params.pop('before')
+            first_query = params.urlencode()
+
         context = {
             'vendor': vendor,
             'store': store,
             'orders_data': orders_data,
+            'status_choices': OrderItem.STATUS_CHOICES,
+            'current_status': status_filter,
+            'date_from': date_from,
+            'date_to': date_to,
+            'pending_only': pending_only,
+            'is_filtered': bool(status_filter or date_from or date_to or pending_only),
+            'next_query': next_query,
+            'first_query': first_query,
         }
         return render(request, 'store/vendor_orders.html', context)
     except Vendor.DoesNotExist:
@@ -1708,8 +1670,7 @@ def update_order_status(request, order_item_id):
         return JsonResponse({'error': 'Please log in as vendor'}, status=401)
 
     try:
-        vendor = Vendor.objects.get(vendorID=request.session['vendor_id'])
-        store = vendor.store
+        store = request.store
         
         # Get the order item and verify it belongs to this vendor's store
         order_item = get_object_or_404(
@@ -1725,21 +1686,14 @@ def update_order_status(request, order_item_id):
         if new_status not in valid_statuses:
             return JsonResponse({'error': 'Invalid status'}, status=400)
         
-        # Create new status record
-        status_record = OrderStatus.objects.create(
-            orderItemID=order_item,
-            status=new_status
-        )
-
-        # Notify the customer about the status change
-        customer = order_item.orderID.customerID
-        Notification.objects.create(
-            customerID=customer,
-            notificationType='order_status',
-            title=f'Order Status: {new_status}',
-            message=f'Your order item "{order_item.productID.productName}" status changed to {new_status}.',
-            link=f'/orders/{order_item.orderID.orderID}/'
-        )
+        # Create new status record and notify the customer; cancelled items
+        # stay cancelled and items awaiting a refund decision stay put
+        changed = ordering.change_item_status([order_item], new_status)
+        if not changed:
+            if order_item.refund_requests.filter(status='pending').exists():
+                return JsonResponse({'error': 'This item has a pending refund request'}, status=400)
+            return JsonResponse({'error': 'This item has been cancelled'}, status=400)
+        status_record = changed[0]
 
         return JsonResponse({
             'success': True,
@@ -1753,46 +1707,197 @@ def update_order_status(request, order_item_id):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+BULK_STATUS_MAX_ITEMS = 500
+
+
+@require_POST
+def bulk_update_order_status(request):
+    """Move several order items to one status at once (vendor only, AJAX).
+
+    Body: {"ids": [<order item id>, ...], "status": "<status>"}
+    Returns a result per ID: updated, cancelled (already cancelled, left alone),
+    refund_pending (a refund request awaits an answer, left alone) or
+    not_found (not an item of this vendor's store).
+    """
+    if 'vendor_id' not in request.session:
+        return JsonResponse({'error': 'Please log in as vendor'}, status=401)
+
+    try:
+        payload = json.loads(request.body or '{}')
+        item_ids = list(dict.fromkeys(int(i) for i in payload.get('ids', [])))
+        new_status = str(payload.get('status', '')).strip()
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+
+    valid_statuses = [choice[0] for choice in OrderStatus.STATUS_CHOICES]
+    if new_status not in valid_statuses:
+        return JsonResponse({'error': 'Invalid status'}, status=400)
+    if not item_ids:
+        return JsonResponse({'error': 'No items selected'}, status=400)
+    if len(item_ids) > BULK_STATUS_MAX_ITEMS:
+        return JsonResponse({'error': f'At most {BULK_STATUS_MAX_ITEMS} items per request'}, status=400)
+
+    try:
+        order_items = list(OrderItem.objects.filter(
+            pk__in=item_ids, productID__storeID=request.store
+        ).select_related('productID', 'orderID'))
+    except Vendor.DoesNotExist:
+        return JsonResponse({'error': 'Vendor not found'}, status=400)
+
+    changed = {record.orderItemID_id: record for record in ordering.change_item_status(order_items, new_status)}
+    found = {item.pk for item in order_items}
+    refund_pending = set(RefundRequest.objects.filter(
+        orderItemID__in=found - changed.keys(), status='pending'
+    ).values_list('orderItemID', flat=True))
+    results = []
+    for item_id in item_ids:
+        if item_id in changed:
+            results.append({
+                'id': item_id,
+                'status': 'updated',
+                'updated_date': changed[item_id].updatedDate.strftime('%b %d, %Y %H:%M'),
+            })
+        elif item_id in refund_pending:
+            results.append({'id': item_id, 'status': 'refund_pending'})
+        else:
+            results.append({'id': item_id, 'status': 'cancelled' if item_id in found else 'not_found'})
+
+    return JsonResponse({
+        'success': True,
+        'message': f'{len(changed)} of {len(item_ids)} item(s) updated to {new_status}',
+        'results': results,
+    })
+
+
+EXPORT_DATASETS = {
+    'orders': (exports.ORDER_COLUMNS, exports.order_rows),
+    'sales': (exports.SALES_COLUMNS, exports.sales_rows),
+}
+EXPORT_FORMATS = {
+    'csv': (exports.stream_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (exports.stream_jsonl, 'application/x-ndjson'),
+}
+
+
+@require_GET
+def vendor_export(request, dataset):
+    """Stream the vendor's orders or daily sales as CSV or JSONL.
+
+    Query: format=csv|jsonl, date_from / date_to (YYYY-MM-DD, inclusive).
+    Rows are read in chunks and written as they arrive, so memory use does
+    not grow with the size of the export.
+    """
+    if 'vendor_id' not in request.session:
+        messages.error(request, "Please log in as a vendor.")
+        return redirect('vendor_login')
+    if dataset not in EXPORT_DATASETS:
+        return HttpResponse('Unknown export', status=404)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse('Unknown format', status=400)
+
+    try:
+        store = request.store
+        store_id = store.storeID
+    except Vendor.DoesNotExist:
+        messages.error(request, "Vendor not found.")
+        return redirect('vendor_login')
+
+    date_from = _parse_day(request.GET.get('date_from', ''))
+    date_to = _parse_day(request.GET.get('date_to', ''))
+    columns, read_rows = EXPORT_DATASETS[dataset]
+    if dataset == 'orders':
+        rows = read_rows(store, _start_of_day(date_from),
+                         _start_of_day(date_to + timedelta(days=1)) if date_to else None)
+    else:
+        rows = read_rows(store, date_from, date_to)
+
+    stream, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(columns, rows), content_type=content_type)
+    span = '_'.join(f'{day:%Y%m%d}' for day in (date_from, date_to) if day)
+    filename = f"store{store_id}_{dataset}{'_' + span if span else ''}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let proxies pass chunks straight through instead of buffering the file
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ======================= NOTIFICATION VIEWS =======================
 
+NOTIFICATIONS_PAGE_SIZE = 30
+
+
 def notifications_page(request):
-    """Display notification list for the logged-in customer or vendor."""
-    if request.session.get('user_type') == 'customer' and 'customer_id' in request.session:
-        notifs = Notification.objects.filter(customerID_id=request.session['customer_id'])
-    elif request.session.get('user_type') == 'vendor' and 'vendor_id' in request.session:
-        notifs = Notification.objects.filter(vendorID_id=request.session['vendor_id'])
-    else:
+    """Display notification list for the logged-in customer or vendor, newest first.
+
+    Keyset-paginated with ?before=<notification ID>; older pages continue
+    into archived notifications.
+    """
+    key = notifications.session_recipient(request)
+    if key is None:
         messages.error(request, 'Please log in to view notifications.')
         return redirect('home')
 
-    return render(request, 'store/notifications.html', {'notifications': notifs})
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        before = None
+    notifications.deliver_broadcasts(key)
+    notifs, next_cursor = notifications.history_page(key, before, NOTIFICATIONS_PAGE_SIZE)
+
+    return render(request, 'store/notifications.html', {
+        'notifications': notifs,
+        'unread_count': notifications.unread_count(key),
+        'next_cursor': next_cursor,
+        'is_first_page': before is None,
+    })
 
 
 def notifications_json(request):
-    """Return recent notifications as JSON for the dropdown."""
-    from django.utils.timesince import timesince
-    user_type = request.session.get('user_type')
-    if user_type == 'customer' and request.session.get('customer_id'):
-        qs = Notification.objects.filter(customerID_id=request.session['customer_id'])
-    elif user_type == 'vendor' and request.session.get('vendor_id'):
-        qs = Notification.objects.filter(vendorID_id=request.session['vendor_id'])
-    else:
+    """Return recent notifications as JSON for the dropdown.
+
+    Responses carry an ETag built from the latest notification ID and the
+    unread counter; a request whose If-None-Match still matches gets 304
+    after one query (notifications.state). With ?since=<id> and an ETag from before
+    only new notifications arrived (no older one was read or merged away),
+    just the newer notifications are returned ("delta": true) for the
+    client to prepend.
+    """
+    key = notifications.session_recipient(request)
+    if key is None:
         return JsonResponse({'notifications': [], 'unread': 0})
 
-    notifs = qs.order_by('-createdTime')[:20]
-    data = []
-    for n in notifs:
-        data.append({
-            'id': n.notificationID,
-            'type': n.notificationType,
-            'title': n.title,
-            'message': n.message,
-            'link': n.link,
-            'is_read': n.isRead,
-            'time_ago': timesince(n.createdTime) + ' ago',
+    latest, unread = notifications.state(key)
+    client_etag = request.headers.get('If-None-Match', '')
+    if client_etag == notifications.etag(latest, unread):
+        return HttpResponseNotModified(headers={
+            'ETag': client_etag, 'Cache-Control': 'private, no-cache'
         })
-    unread = qs.filter(isRead=False).count()
-    return JsonResponse({'notifications': data, 'unread': unread})
+    if notifications.deliver_broadcasts(key):
+        latest, unread = notifications.state(key)
+    headers = {'ETag': notifications.etag(latest, unread), 'Cache-Control': 'private, no-cache'}
+
+    qs = notifications.for_recipient(key)
+    client_state = notifications.etag_parts(client_etag)
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
+    delta = False
+    if since is not None and client_state is not None:
+        # Unread rows up to since only ever go away; if none did, the client's copy is current
+        newer_unread = qs.filter(notificationID__gt=since, isRead=False).count()
+        delta = unread - newer_unread == client_state[1]
+    if delta:
+        qs = qs.filter(notificationID__gt=since)
+
+    notifs = qs.order_by('-notificationID')[:20]
+    return JsonResponse({
+        'notifications': [notifications.serialize(n) for n in notifs],
+        'unread': unread,
+        'latest': latest,
+        'delta': delta,
+    }, headers=headers)
 
 
 @require_POST
@@ -1806,19 +1911,41 @@ def mark_notification_read(request, notification_id):
             (notif.vendorID_id and notif.vendorID_id == vid)):
         return JsonResponse({'error': 'Not authorized'}, status=403)
 
-    notif.isRead = True
-    notif.save()
+    notifications.mark_read(notif)
     return JsonResponse({'success': True})
 
 
 @require_POST
 def mark_all_notifications_read(request):
     """Mark all notifications as read for the logged-in user."""
-    if request.session.get('user_type') == 'customer' and 'customer_id' in request.session:
-        Notification.objects.filter(customerID_id=request.session['customer_id'], isRead=False).update(isRead=True)
-    elif request.session.get('user_type') == 'vendor' and 'vendor_id' in request.session:
-        Notification.objects.filter(vendorID_id=request.session['vendor_id'], isRead=False).update(isRead=True)
-    else:
+    key = notifications.session_recipient(request)
+    if key is None:
         return JsonResponse({'error': 'Not logged in'}, status=401)
+    notifications.mark_all_read(key)
     return JsonResponse({'success': True})
 
+
+async def notification_stream(request):
+    """Server-sent events with new notifications and unread counts.
+
+    Needs the ASGI entry point (vinyl_config.asgi); under WSGI, and for
+    visitors, it answers 204 so the browser stops reconnecting and the
+    dropdown falls back to fetching notifications_json when opened.
+    Resumes after the Last-Event-ID the browser sends on reconnect.
+    """
+    key = notifications.session_recipient(request)
+    if key is None or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET['last_id'])
+    except (KeyError, ValueError):
+        last_id, _ = await sync_to_async(notifications.state)(key)
+
+    response = StreamingHttpResponse(
+        notifications.event_stream(key, last_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "store.middleware.SessionExpiryRefreshMiddleware",
+    "store.middleware.IdentityMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -71,10 +74,91 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "vinyl_config.wsgi.application"
 
-# Sessions — each browser/device gets its own independent session
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+# Cache — per-process memory by default. Multi-process deployments should
+# point this at a shared cache (e.g. VINYL_CACHE_BACKEND=
+# django.core.cache.backends.redis.RedisCache) before using the "cache"
+# session engine.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "VINYL_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("VINYL_CACHE_LOCATION", "vinyl-store"),
+    }
+}
+# Whether every server process sees the same cache; the settings below only
+# keep state in the cache when it is.
+SHARED_CACHE = not CACHES["default"]["BACKEND"].endswith("LocMemCache")
+
+# Sessions — each browser/device gets its own independent session.
+# With a shared cache, reads are served from it (cached_db); with the
+# per-process default they go to the database, since a logout or session
+# write in one process would not reach another's cached copy. Either way
+# the session row is only written when the session changes or is within
+# SESSION_REFRESH_THRESHOLD of expiring (see
+# store.middleware.SessionExpiryRefreshMiddleware). Expired rows are removed
+# by `manage.py purge_sessions`.
+SESSION_ENGINE = os.environ.get(
+    "VINYL_SESSION_ENGINE",
+    "django.contrib.sessions.backends.cached_db" if SHARED_CACHE
+    else "django.contrib.sessions.backends.db",
+)
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_THRESHOLD = 21600  # refresh when less than 6 hours remain
+
+# Seconds a logged-in customer/vendor row is cached between requests by
+# store.middleware.IdentityMiddleware (0 disables). Profile edits invalidate it
+# through the cache, so every server process must share that cache: with the
+# per-process LocMem default another process would keep serving the old name
+# or store for up to the timeout. Off unless the cache above is shared.
+IDENTITY_CACHE_TIMEOUT = int(os.environ.get(
+    "VINYL_IDENTITY_CACHE_TIMEOUT", "300" if SHARED_CACHE else "0"
+))
+
+# Live notification stream (store.notifications). New notifications reach
+# open streams in the same process directly; when several server processes
+# run, set this to poll for notifications created elsewhere every N seconds
+# (one query per process per interval). 0 disables polling.
+NOTIFICATION_STREAM_POLL_INTERVAL = int(os.environ.get("VINYL_NOTIFICATION_POLL", "0"))
+
+# Seconds stock stays held for a customer after they open the checkout page.
+# Expired holds are released by `manage.py release_reservations` or the
+# job worker.
+STOCK_RESERVATION_TTL = 900
+
+# Unread notifications of the same kind and target (e.g. status changes
+# of one order) arriving within this many seconds are merged into one
+# row with a count. With the digest window set (VINYL_NOTIFICATION_DIGEST),
+# all unread NOTIFICATION_DIGEST_TYPES a recipient gets within it are
+# merged into one digest row instead. 0 turns either off.
+NOTIFICATION_COALESCE_WINDOW = 600
+NOTIFICATION_DIGEST_WINDOW = int(os.environ.get("VINYL_NOTIFICATION_DIGEST", "0"))
+NOTIFICATION_DIGEST_TYPES = ["order_status"]
+
+# Wishlist broadcasts are copied to customers once they are this many
+# seconds old, so one still committing is never skipped; the job worker
+# delivers them, and the notification pages do for their reader.
+BROADCAST_SETTLE_SECONDS = 30
+
+# Background jobs (store.jobs, run by `manage.py run_jobs`). Failed jobs are
+# retried after JOB_RETRY_BASE_DELAY * 2^(attempt - 1) seconds, capped at
+# JOB_RETRY_MAX_DELAY; jobs running longer than JOB_LOCK_TIMEOUT are assumed
+# lost with their worker and requeued. Finished jobs are kept for
+# JOB_RETENTION_DAYS.
+JOB_RETRY_BASE_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LOCK_TIMEOUT = 600
+JOB_RETENTION_DAYS = 7
+
+# Outbox (store.outbox). Notifications are recorded with the change that
+# causes them and sent by a relay. Inline, each request relays its own
+# events right after it commits; turn it off (VINYL_OUTBOX_INLINE=0) when
+# `manage.py relay_outbox --interval 1` or the job worker runs the relay,
+# so requests skip the notification writes. Events failing
+# OUTBOX_MAX_ATTEMPTS times are kept for inspection in the admin.
+OUTBOX_RELAY_INLINE = os.environ.get("VINYL_OUTBOX_INLINE", "1") == "1"
+OUTBOX_MAX_ATTEMPTS = 5
 
 
 # Database
@@ -84,9 +168,29 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock when a transaction starts, so concurrent
+            # checkouts queue up instead of failing with "database is locked"
+            # when a read transaction tries to upgrade to a write.
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
+# Set VINYL_DB_ENGINE=postgresql to run against PostgreSQL instead, e.g. a
+# local instance for `manage.py stress_checkout`.
+if os.environ.get("VINYL_DB_ENGINE") == "postgresql":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("VINYL_DB_NAME", "vinyl_store"),
+        "USER": os.environ.get("VINYL_DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("VINYL_DB_PASSWORD", ""),
+        "HOST": os.environ.get("VINYL_DB_HOST", "localhost"),
+        "PORT": os.environ.get("VINYL_DB_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.environ.get("VINYL_DB_CONN_MAX_AGE", "60")),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,6 +233,19 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Widths (px) of the WebP/JPEG copies made of uploaded product, shop and
+# profile images (store.images); build them for existing uploads with
+# `manage.py build_image_variants`.
+IMAGE_VARIANT_WIDTHS = (320, 640, 1024)
+
+# Image resizing runs in a pool of IMAGE_POOL_WORKERS processes shared by
+# all uploads, holding at most IMAGE_POOL_MAX_PENDING images; overflow and
+# anything a crashed process dropped is picked up by the job worker after
+# IMAGE_JOB_DELAY seconds.
+IMAGE_POOL_WORKERS = 2
+IMAGE_POOL_MAX_PENDING = 8
+IMAGE_JOB_DELAY = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 